@@ -0,0 +1,196 @@
+import operator
+from collections import Counter
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import F, Q, Min, Max, Sum
+
+from core.answer_statistics import OPTION_TYPES, NUMERIC_TYPES, get_option_frequencies, get_numeric_summaries
+from core.models import AnswerOptionCount, AnswerNumericSummary, StaleAnswerCounters, elements
+
+
+def get_answer_values(answer):
+    """ the counted values of an answer, as stored in the database """
+    if answer.value_field == 'values':
+        return list(answer.values.values_list('value', flat=True))
+    if answer.value is None:
+        return []
+    return [answer.value]
+
+
+def update_option_counts(element_type, element_pk, old_values, new_values):
+    old_counter = Counter(str(v) for v in old_values)
+    new_counter = Counter(str(v) for v in new_values)
+
+    for value, count in (old_counter - new_counter).items():
+        # counters are never created on decrement
+        AnswerOptionCount.objects.filter(element_type=element_type, element_pk=element_pk, value=value) \
+            .update(count=F('count') - count)
+
+    for value, count in (new_counter - old_counter).items():
+        option_count, created = AnswerOptionCount.objects.get_or_create(element_type=element_type,
+                                                                        element_pk=element_pk,
+                                                                        value=value)
+        AnswerOptionCount.objects.filter(pk=option_count.pk).update(count=F('count') + count)
+
+
+def update_numeric_summary(element_type, element_pk, old_values, new_values):
+    if not old_values and not new_values:
+        return
+
+    if new_values:
+        AnswerNumericSummary.objects.get_or_create(element_type=element_type, element_pk=element_pk)
+
+    summary = AnswerNumericSummary.objects.select_for_update() \
+        .filter(element_type=element_type, element_pk=element_pk).first()
+    if summary is None:
+        return
+
+    summary.count += len(new_values) - len(old_values)
+    summary.sum += sum(new_values) - sum(old_values)
+
+    if any(v in (summary.min, summary.max) for v in old_values):
+        # the previous extreme value was removed, read the new extremes from the answers
+        answers = elements.get(element_type).objects.filter(answer_of_id=element_pk, value__isnull=False)
+        extremes = answers.aggregate(min=Min('value'), max=Max('value'))
+        summary.min, summary.max = extremes['min'], extremes['max']
+    else:
+        summary.min = min([summary.min] + new_values) if summary.min is not None else min(new_values)
+        summary.max = max([summary.max] + new_values) if summary.max is not None else max(new_values)
+
+    summary.save()
+
+
+def record_answer_change(answer, old_values, new_values):
+    """ move the counters of the answered element from the old values to the new values,
+    should be called inside the transaction that changes the answer """
+    if answer.answer_of_id is None:
+        return
+
+    if answer.type in OPTION_TYPES:
+        update_option_counts(answer.type, answer.answer_of_id, old_values, new_values)
+    elif answer.type in NUMERIC_TYPES:
+        update_numeric_summary(answer.type, answer.answer_of_id, old_values, new_values)
+
+
+def forget_element_counters(element):
+    """ drop the counters of a deleted template element """
+    if element.type in OPTION_TYPES:
+        AnswerOptionCount.objects.filter(element_type=element.type, element_pk=element.pk).delete()
+    elif element.type in NUMERIC_TYPES:
+        AnswerNumericSummary.objects.filter(element_type=element.type, element_pk=element.pk).delete()
+
+
+def mark_counters_stale(template_pks):
+    """
+    rebuild the counters of the given templates on their next read, one query,
+    used when answers are deleted instead of decrementing the counters answer by answer
+    """
+    StaleAnswerCounters.objects.bulk_create([StaleAnswerCounters(template_pk=pk) for pk in set(template_pks)],
+                                            ignore_conflicts=True)
+
+
+def rebuild_option_counts(element_type, pks):
+    # existing counters are locked and updated in place, a concurrent set value waits for the rebuild
+    # instead of inserting a counter the rebuild inserts again
+    option_counts = {(option_count.element_pk, option_count.value): option_count
+                     for option_count in AnswerOptionCount.objects.select_for_update()
+                     .filter(element_type=element_type, element_pk__in=pks)}
+
+    counts = {(pk, str(frequency['value'])): frequency['count']
+              for pk, frequencies in get_option_frequencies(element_type, pks).items() for frequency in frequencies}
+
+    # values without answers keep their counter at zero
+    for key, option_count in option_counts.items():
+        option_count.count = counts.pop(key, 0)
+    created = [AnswerOptionCount(element_type=element_type, element_pk=pk, value=value, count=count)
+               for (pk, value), count in counts.items()]
+
+    AnswerOptionCount.objects.bulk_update(list(option_counts.values()), ['count'])
+    AnswerOptionCount.objects.bulk_create(created, ignore_conflicts=True)
+
+
+def rebuild_numeric_summaries(element_type, pks):
+    numeric_summaries = {numeric.element_pk: numeric for numeric in AnswerNumericSummary.objects.select_for_update()
+                         .filter(element_type=element_type, element_pk__in=pks)}
+
+    sums = dict(elements.get(element_type).objects.filter(answer_of_id__in=pks, value__isnull=False)
+                .values('answer_of').annotate(sum=Sum('value')).values_list('answer_of', 'sum'))
+
+    created = []
+    for pk, summary in get_numeric_summaries(element_type, pks, quantiles=False).items():
+        numeric = numeric_summaries.get(pk)
+        if numeric is None:
+            numeric = AnswerNumericSummary(element_type=element_type, element_pk=pk)
+            created.append(numeric)
+        numeric.count, numeric.sum = summary['count'], sums.get(pk) or 0
+        numeric.min, numeric.max = summary['min'], summary['max']
+
+    AnswerNumericSummary.objects.bulk_update(list(numeric_summaries.values()), ['count', 'sum', 'min', 'max'])
+    AnswerNumericSummary.objects.bulk_create(created, ignore_conflicts=True)
+
+
+def rebuild_counters(template_elements):
+    """ recompute the counters of the given template elements from their answers """
+    element_pks = {}
+    for element in template_elements:
+        element_pks.setdefault(element.type, []).append(element.pk)
+
+    with transaction.atomic():
+        for element_type, pks in element_pks.items():
+            if element_type in OPTION_TYPES:
+                rebuild_option_counts(element_type, pks)
+            elif element_type in NUMERIC_TYPES:
+                rebuild_numeric_summaries(element_type, pks)
+
+
+def get_template_counter_summary(template, template_elements):
+    """ counter summary of the template, stale counters are rebuilt first """
+    stale = StaleAnswerCounters.objects.filter(template_pk=template.pk)
+    if stale.exists():
+        with transaction.atomic():
+            # the locked marker makes concurrent reads wait for the rebuild and then find the marker gone,
+            # it is deleted first, answers deleted during the rebuild mark the template again
+            marker = stale.select_for_update().first()
+            if marker is not None:
+                marker.delete()
+                rebuild_counters(template_elements)
+
+    return get_counter_summary(template_elements)
+
+
+def get_elements_q(type_pks):
+    """ Q of the counters of the given [(type, element pks)], None when there are none """
+    if not type_pks:
+        return None
+    return reduce(operator.or_, (Q(element_type=element_type, element_pk__in=pks) for element_type, pks in type_pks))
+
+
+def get_counter_summary(template_elements):
+    """ per element counters of the given template elements, read without touching the answers """
+    element_pks = {}
+    for element in template_elements:
+        element_pks.setdefault(element.type, set()).add(element.pk)
+
+    # only the counters of these elements are read
+    option_q = get_elements_q([(t, pks) for t, pks in element_pks.items() if t in OPTION_TYPES])
+    numeric_q = get_elements_q([(t, pks) for t, pks in element_pks.items() if t in NUMERIC_TYPES])
+
+    summary = {}
+    if option_q is not None:
+        for option_count in AnswerOptionCount.objects.filter(option_q, count__gt=0).order_by('-count'):
+            summary.setdefault((option_count.element_type, option_count.element_pk), {'frequencies': []})[
+                'frequencies'].append({'value': option_count.value, 'count': option_count.count})
+
+    if numeric_q is not None:
+        for numeric in AnswerNumericSummary.objects.filter(numeric_q):
+            summary[(numeric.element_type, numeric.element_pk)] = {'count': numeric.count, 'sum': numeric.sum,
+                                                                   'min': numeric.min, 'max': numeric.max,
+                                                                   'mean': numeric.mean}
+
+    empty = {t: {'frequencies': []} for t in OPTION_TYPES}
+    empty.update({t: {'count': 0, 'sum': 0, 'min': None, 'max': None, 'mean': None} for t in NUMERIC_TYPES})
+
+    return [dict(type=element.type, pk=element.pk, uid=element.uid, title=element.title,
+                 **summary.get((element.type, element.pk), empty[element.type]))
+            for element in template_elements if element.type in empty]
@@ -0,0 +1,131 @@
+import json
+import re
+
+from django.conf import settings
+from django.db import models, transaction, NotSupportedError
+from django.db.models import F, Func, Value
+from rest_framework.utils.encoders import JSONEncoder
+
+from core import element_query
+from core.element_query import all_elements, TABLES
+from core.models import Form
+
+# answer storage layouts, see settings.ANSWER_STORAGE
+ROWS = "rows"
+DOCUMENT = "document"
+
+# select12 -> ("select", 12)
+uid_pattern = re.compile(r'^(\D+)(\d+)$')
+
+
+def get_answer_storage():
+    return getattr(settings, 'ANSWER_STORAGE', ROWS)
+
+
+def is_document_storage():
+    return get_answer_storage() == DOCUMENT
+
+
+def get_uid(element_type, element_pk):
+    return "%s%d" % (element_type, int(element_pk))
+
+
+def parse_uid(uid):
+    element_type, element_pk = uid_pattern.match(uid).groups()
+    return element_type, int(element_pk)
+
+
+def to_document_value(value):
+    """ the value as it is rendered in responses, dates and times become iso strings """
+    return json.loads(json.dumps(value, cls=JSONEncoder))
+
+
+def get_answer_value(answer):
+    """ document value of the given answer element, files are stored by name """
+    _Element = type(answer)
+    if _Element.value_field == 'values':
+        relation = _Element.values.field
+        return [{'pk': pk, 'value': value} for pk, value in _Element.values.through.objects
+                .filter(**{relation.m2m_column_name(): answer.pk}).order_by('pk')
+                .values_list(relation.m2m_reverse_name(), 'charfield__value')]
+
+    value = answer.value
+    return to_document_value(value.name if hasattr(value, 'name') else value)
+
+
+class DocumentKeyUpdate(Func):
+    """
+    the answers document with one key set or removed, computed by the database,
+    concurrent updates of other keys of the same document are never overwritten
+    """
+    output_field = models.JSONField()
+
+    def __init__(self, uid, value=None, remove=False):
+        self.remove = remove
+        expressions = [F('answers'), Value(uid)]
+        if not remove:
+            expressions.append(Value(json.dumps(value)))
+        super(DocumentKeyUpdate, self).__init__(*expressions)
+
+    def compile_with(self, compiler, set_template, remove_template):
+        sql_parts, params = [], []
+        for expression in self.source_expressions:
+            sql, expression_params = compiler.compile(expression)
+            sql_parts.append(sql)
+            params.extend(expression_params)
+        return (remove_template if self.remove else set_template) % tuple(sql_parts), params
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError("answer documents are updated in place on postgresql, sqlite and mysql only")
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.compile_with(compiler, "jsonb_set(%s, ARRAY[%s]::text[], (%s)::jsonb)", "(%s - (%s)::text)")
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.compile_with(compiler, "json_set(%s, '$.' || %s, json(%s))", "json_remove(%s, '$.' || %s)")
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.compile_with(compiler, "JSON_SET(%s, CONCAT('$.', %s), CAST(%s AS JSON))",
+                                 "JSON_REMOVE(%s, CONCAT('$.', %s))")
+
+
+def get_answer_changes(answer, remove=False):
+    """
+    form update kwargs writing the answer into the document of its form,
+    passed to the update that bumps the answers version, empty with the rows storage
+    """
+    if not is_document_storage() or answer.form_id is None or answer.answer_of_id is None:
+        return {}
+
+    uid = get_uid(answer.type, answer.answer_of_id)
+    if remove:
+        return {'answers': DocumentKeyUpdate(uid, remove=True)}
+    return {'answers': DocumentKeyUpdate(uid, get_answer_value(answer))}
+
+
+def get_form_answers(form, **filters):
+    """
+    {(type, template element pk): value or values} of the answers of the given form
+
+    the document storage reads the answers document of the already loaded form without any query,
+    filters only narrow the answer rows, the document always holds every answer
+    """
+    if is_document_storage():
+        return {parse_uid(uid): value for uid, value in form.answers.items()}
+    return element_query.get_form_answers(form, **filters)
+
+
+def build_documents(forms):
+    """ rebuild the answers documents of the given forms from the answer rows, returns the number of forms """
+    forms = list(forms)
+    documents = {form.pk: {} for form in forms}
+    for row in all_elements.using_storage(TABLES).filter(form_id__in=list(documents)).with_values():
+        if row.answer_of_id is not None:
+            documents[row.form_id][get_uid(row.element_type, row.answer_of_id)] = to_document_value(row.answer_value)
+
+    with transaction.atomic():
+        for form in forms:
+            form.answers = documents[form.pk]
+        Form.objects.bulk_update(forms, ['answers'])
+
+    return len(forms)
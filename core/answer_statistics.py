@@ -0,0 +1,115 @@
+from django.db.models import Count, Min, Max, Avg, F
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear, TruncHour
+
+from core.element_types import SELECT, RADIO, CHECKBOX, BOOLEAN, INT, FLOAT, DATE, DATETIME, TIME
+from core.models import elements, CheckboxElement
+
+OPTION_TYPES = [SELECT, RADIO, CHECKBOX, BOOLEAN]
+NUMERIC_TYPES = [INT, FLOAT]
+TEMPORAL_TYPES = [DATE, DATETIME, TIME]
+
+QUANTILES = [0.25, 0.5, 0.75]
+
+histogram_buckets = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+
+def get_answers(element_type, element_pks, forms=None):
+    """ answers of the given template elements, restricted to the given forms queryset """
+    answers = elements.get(element_type).objects.filter(answer_of_id__in=element_pks)
+    if forms is not None:
+        answers = answers.filter(form__in=forms.values('pk'))
+    return answers
+
+
+def get_option_frequencies(element_type, element_pks, forms=None):
+    """ returns {element_pk: [{"value":, "count":}, ...]} with one GROUP BY query """
+    if element_type == CHECKBOX:
+        # checkbox values are stored in the values table
+        rows = CheckboxElement.values.through.objects.filter(
+            checkboxelement__in=get_answers(element_type, element_pks, forms)
+        ).values(answer_of=F('checkboxelement__answer_of_id'), option=F('charfield__value'))
+    else:
+        rows = get_answers(element_type, element_pks, forms).filter(value__isnull=False) \
+            .values('answer_of', option=F('value'))
+
+    frequencies = {pk: [] for pk in element_pks}
+    for row in rows.annotate(count=Count('pk')).order_by('answer_of', '-count'):
+        frequencies[row['answer_of']].append({'value': row['option'], 'count': row['count']})
+    return frequencies
+
+
+def get_numeric_summaries(element_type, element_pks, forms=None, quantiles=True):
+    """ returns {element_pk: {"count":, "min":, "max":, "mean":, "quantiles":}} """
+    answers = get_answers(element_type, element_pks, forms).filter(value__isnull=False)
+
+    summaries = {pk: {'count': 0, 'min': None, 'max': None, 'mean': None, 'quantiles': {}} for pk in element_pks}
+    rows = answers.values('answer_of').annotate(count=Count('pk'), min=Min('value'),
+                                                max=Max('value'), mean=Avg('value')).order_by()
+    for row in rows:
+        summaries[row.pop('answer_of')].update(row)
+
+    if not quantiles:
+        return summaries
+
+    # position of each quantile in the ordered answers of each element
+    positions = {pk: {str(q): round(q * (summary['count'] - 1)) for q in QUANTILES}
+                 for pk, summary in summaries.items() if summary['count']}
+
+    # one ordered query for all the elements, values are streamed and only the quantiles are kept
+    index = dict.fromkeys(positions, 0)
+    for pk, value in answers.order_by('answer_of', 'value').values_list('answer_of', 'value').iterator():
+        for q, position in positions[pk].items():
+            if position == index[pk]:
+                summaries[pk]['quantiles'][q] = value
+        index[pk] += 1
+
+    return summaries
+
+
+def get_histograms(element_type, element_pks, forms=None, bucket='month'):
+    """ returns {element_pk: [{"bucket":, "count":}, ...]}, times are always bucketed by hour """
+    if element_type == TIME:
+        _Trunc = TruncHour
+    else:
+        _Trunc = histogram_buckets.get(bucket, TruncMonth)
+
+    rows = get_answers(element_type, element_pks, forms).filter(value__isnull=False) \
+        .values('answer_of', bucket=_Trunc('value')).annotate(count=Count('pk')).order_by('answer_of', 'bucket')
+
+    histograms = {pk: [] for pk in element_pks}
+    for row in rows:
+        histograms[row['answer_of']].append({'bucket': row['bucket'], 'count': row['count']})
+    return histograms
+
+
+def get_template_statistics(template_elements, forms=None, bucket='month'):
+    """
+    aggregate the answers of the given template elements,
+    queries are grouped per element type instead of per element
+    """
+    element_pks = {}
+    for element in template_elements:
+        element_pks.setdefault(element.type, []).append(element.pk)
+
+    statistics = {}
+    for element_type, pks in element_pks.items():
+        if element_type in OPTION_TYPES:
+            for pk, frequencies in get_option_frequencies(element_type, pks, forms).items():
+                statistics[(element_type, pk)] = {'frequencies': frequencies}
+
+        elif element_type in NUMERIC_TYPES:
+            for pk, summary in get_numeric_summaries(element_type, pks, forms).items():
+                statistics[(element_type, pk)] = summary
+
+        elif element_type in TEMPORAL_TYPES:
+            for pk, histogram in get_histograms(element_type, pks, forms, bucket).items():
+                statistics[(element_type, pk)] = {'histogram': histogram}
+
+    return [dict(type=element.type, pk=element.pk, uid=element.uid, title=element.title,
+                 **statistics[(element.type, element.pk)])
+            for element in template_elements if (element.type, element.pk) in statistics]
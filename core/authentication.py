@@ -0,0 +1,137 @@
+import hashlib
+import hmac
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication, BasicAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.cache_coherence import register
+from core.local_cache import LocalLRUCache
+from core.models import UserProfile
+
+# cache group of authentication results, invalidated when users, profiles or tokens change
+AUTH = "auth"
+
+TOKEN_CACHE_SIZE = getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 4096)
+TOKEN_CACHE_TTL = getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 60)
+
+local_tokens = LocalLRUCache(TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+register(AUTH, local_tokens)
+
+BASIC_CACHE_SIZE = getattr(settings, 'AUTH_BASIC_CACHE_SIZE', 1024)
+BASIC_CACHE_TTL = getattr(settings, 'AUTH_BASIC_CACHE_TTL', 60)
+
+local_credentials = LocalLRUCache(BASIC_CACHE_SIZE, ttl=BASIC_CACHE_TTL)
+register(AUTH, local_credentials)
+
+
+def user_tag(user_pk):
+    """ tag of the cached authentication results of a user """
+    return "user:%d" % user_pk
+
+# random per process, cache keys can not be reproduced outside of this process
+_credentials_salt = settings.SECRET_KEY.encode() + os.urandom(32)
+
+
+def freeze(instance):
+    """ field values of a model instance, cached instead of the instance
+    so requests never share mutable objects """
+    if instance is None:
+        return None
+    return tuple(getattr(instance, field.attname) for field in type(instance)._meta.concrete_fields)
+
+
+def thaw(Model, values):
+    """ rebuild a model instance from frozen values without a query """
+    if values is None:
+        return None
+    return Model.from_db(DEFAULT_DB_ALIAS, [field.attname for field in Model._meta.concrete_fields], values)
+
+
+def freeze_user(user):
+    """ frozen (user, user profile) pair, the profile must already be loaded """
+    try:
+        profile = user.user_profile
+    except UserProfile.DoesNotExist:
+        profile = None
+    return freeze(user), freeze(profile)
+
+
+def thaw_user(frozen_user):
+    user_values, profile_values = frozen_user
+    user = thaw(User, user_values)
+
+    profile = thaw(UserProfile, profile_values)
+    if profile is not None:
+        # sets the cache on both sides of the one to one relation
+        user.user_profile = profile
+    else:
+        UserProfile.user.field.remote_field.set_cached_value(user, None)
+
+    return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that keeps token -> (user, profile) in a process local cache,
+    warm requests are authenticated without any query
+    """
+
+    def authenticate_credentials(self, key):
+        cached = local_tokens.get(key)
+
+        if cached is None:
+            try:
+                token = Token.objects.select_related('user', 'user__user_profile').get(key=key)
+            except Token.DoesNotExist:
+                raise AuthenticationFailed(_('Invalid token.'))
+
+            cached = (freeze_user(token.user), freeze(token))
+            local_tokens.set(key, cached, tags=[user_tag(token.user_id)])
+
+        frozen_user, token_values = cached
+        user = thaw_user(frozen_user)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+
+        token = thaw(Token, token_values)
+        token.user = user
+        return user, token
+
+
+def get_credentials_key(username, password):
+    """ salted fast hash of verified credentials, the password itself is never kept """
+    message = ("%s\0%s" % (username, password)).encode()
+    return hmac.new(_credentials_salt, message, hashlib.sha256).hexdigest()
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    Basic authentication that remembers successful verifications for a short time,
+    repeated requests with the same credentials skip the password hasher
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = get_credentials_key(userid, password)
+        cached = local_credentials.get(key)
+
+        if cached is None:
+            # runs the password hasher, failures are never cached
+            user, auth = super(CachedBasicAuthentication, self).authenticate_credentials(userid, password, request)
+
+            user = User.objects.select_related('user_profile').get(pk=user.pk)
+            cached = freeze_user(user)
+            local_credentials.set(key, cached, tags=[user_tag(user.pk)])
+
+        user = thaw_user(cached)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+
+        return user, None
@@ -0,0 +1,15 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class UserProfileModelBackend(ModelBackend):
+    """ Model backend that loads the user profile with the session user in one query """
+
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related('user_profile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,158 @@
+from django.core.exceptions import ObjectDoesNotExist, ValidationError as DjangoValidationError
+from django.db import transaction, IntegrityError
+from django.http import Http404
+from rest_framework import serializers
+from rest_framework.exceptions import APIException
+from rest_framework.fields import get_error_detail
+from rest_framework.generics import get_object_or_404
+
+from core.bulk import add_options
+from core.models import elements
+from core.serializers.FormSerializers.common_serializers import BulkDataSerializer, DataSerializer, \
+    ElementsSetOrder, FieldsSetOrder
+from core.serializers.FormSerializers.create_serializers import SubFormRawCreateSerializer, \
+    FieldRawCreateSerializer, get_create_serializer, get_condition_update_serializer
+
+# {name: handler(request, operation)}, handlers return the data of the operation result
+batch_operations = {}
+
+
+def register_operation(name):
+    def decorator(handler):
+        batch_operations[name] = handler
+        return handler
+
+    return decorator
+
+
+def get_element_model(operation):
+    _Element = elements.get(operation.get('type'))
+    if _Element is None:
+        raise serializers.ValidationError({'type': "Element with type %s does not exist" % operation.get('type')})
+    return _Element
+
+
+def save_serializer(serializer):
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    return serializer.data
+
+
+@register_operation('sub_form.create')
+def create_sub_form(request, operation):
+    return save_serializer(SubFormRawCreateSerializer(data=operation.get('data'), context={'request': request}))
+
+
+@register_operation('field.create')
+def create_field(request, operation):
+    return save_serializer(FieldRawCreateSerializer(data=operation.get('data'), context={'request': request}))
+
+
+@register_operation('element.create')
+def create_element(request, operation):
+    get_element_model(operation)
+    return save_serializer(get_create_serializer(operation.get('type'))(data=operation.get('data'),
+                                                                        context={'request': request}))
+
+
+@register_operation('element.condition')
+def update_element_condition(request, operation):
+    element = get_object_or_404(get_element_model(operation), pk=operation.get('pk'))
+    return save_serializer(get_condition_update_serializer(operation.get('type'))(
+        instance=element, data=operation.get('data'), partial=True, context={'request': request}))
+
+
+@register_operation('element.add_data')
+def add_element_data(request, operation):
+    _Element = get_element_model(operation)
+    element = get_object_or_404(_Element, pk=operation.get('pk'))
+
+    serializer = BulkDataSerializer(data=operation.get('data'))
+    serializer.is_valid(raise_exception=True)
+
+    data = add_options(_Element, element, serializer.validated_data.get('options'),
+                       serializer.validated_data.get('replace'))
+    return DataSerializer(data, many=True).data
+
+
+@register_operation('element.set_orders')
+def set_element_orders(request, operation):
+    serializer = ElementsSetOrder(data=operation.get('data'))
+    serializer.is_valid(raise_exception=True)
+
+    for element_data in serializer.validated_data.get('elements_data'):
+        element_data.get('element').order = element_data.get('order')
+        element_data.get('element').save()
+
+    return {'detail': "set"}
+
+
+@register_operation('field.set_orders')
+def set_field_orders(request, operation):
+    serializer = FieldsSetOrder(data=operation.get('data'))
+    serializer.is_valid(raise_exception=True)
+
+    for field_data in serializer.validated_data.get('fields_data'):
+        field_data.get('field').order = field_data.get('order')
+        field_data.get('field').save()
+
+    return {'detail': "set"}
+
+
+def resolve_references(value, results):
+    """
+    replace {"$ref": "<id>"} objects with the pk of the result of an earlier operation,
+    an operation is referenced by its "id" or its index in the batch
+    """
+    if isinstance(value, dict):
+        if set(value.keys()) == {'$ref'}:
+            reference = str(value['$ref'])
+            if not isinstance(results.get(reference), dict):
+                raise serializers.ValidationError("unknown reference %s" % reference)
+            return results[reference].get('pk')
+
+        return {key: resolve_references(item, results) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [resolve_references(item, results) for item in value]
+
+    return value
+
+
+def run_batch(request, operations):
+    """
+    run the given operations in order inside one transaction,
+    any failing operation rolls back the whole batch and is reported with its index
+
+    returns the list of operation results
+    """
+    results = {}
+    output = []
+
+    with transaction.atomic():
+        for index, operation in enumerate(operations):
+            try:
+                handler = batch_operations.get(operation.get('op'))
+                if handler is None:
+                    raise serializers.ValidationError({'op': "unknown operation %s" % operation.get('op')})
+
+                result = handler(request, resolve_references(operation, results))
+            except (Http404, ObjectDoesNotExist):
+                raise serializers.ValidationError({'index': index, 'op': operation.get('op'),
+                                                   'errors': "object does not exist"})
+            except APIException as e:
+                raise serializers.ValidationError({'index': index, 'op': operation.get('op'), 'errors': e.detail})
+            except DjangoValidationError as e:
+                raise serializers.ValidationError({'index': index, 'op': operation.get('op'),
+                                                   'errors': get_error_detail(e)})
+            except IntegrityError as e:
+                # the transaction can not be used any more, the batch is rolled back when the error leaves it
+                raise serializers.ValidationError({'index': index, 'op': operation.get('op'), 'errors': str(e)})
+
+            results[str(index)] = result
+            if operation.get('id') is not None:
+                results[str(operation.get('id'))] = result
+
+            output.append({'op': operation.get('op'), 'id': operation.get('id'), 'result': result})
+
+    return output
@@ -0,0 +1,124 @@
+from django.db import connection, transaction
+
+from core.element_storage import sync_elements
+from core.models import Data, CharField, Template, elements
+from core.versions import bump_structure_version
+
+
+def bulk_create_with_pks(_Model, objs):
+    """
+    bulk_create the given objects and make sure their pks are set,
+    must be called inside a transaction
+
+    sqlite can not return the inserted rows, the pks are read back from the
+    newest rows instead, the table is write locked by then so no other
+    connection can insert in between
+    """
+    objs = list(objs)
+    if not objs:
+        return objs
+
+    if connection.features.can_return_rows_from_bulk_insert:
+        return _Model.objects.bulk_create(objs)
+
+    if connection.vendor == 'sqlite':
+        _Model.objects.bulk_create(objs)
+        pks = _Model.objects.order_by('-pk').values_list('pk', flat=True)[:len(objs)]
+        for obj, pk in zip(objs, reversed(pks)):
+            obj.pk = pk
+        return objs
+
+    # inserted rows can interleave with other connections, save one by one
+    for obj in objs:
+        obj.save(force_insert=True)
+    return objs
+
+
+def bulk_add(relation, pairs):
+    """
+    insert the through rows of a many to many relation with one query,
+    pairs are (source pk, target pk) and relation is the field descriptor (Ex. SelectElement.data)
+
+    m2m_changed is not sent
+    """
+    through = relation.through
+    source_column = relation.field.m2m_column_name()
+    target_column = relation.field.m2m_reverse_name()
+
+    through.objects.bulk_create([through(**{source_column: source_pk, target_column: target_pk})
+                                 for source_pk, target_pk in pairs])
+
+
+def create_elements(_Model, elements_data):
+    """
+    create template elements of one type with their data and values,
+    elements_data is a list of validated element data with nested "data" and "values" lists
+
+    returns the created elements, the caller bumps the structure version of the templates
+    """
+    with transaction.atomic():
+        data_lists = [element_data.pop('data', []) for element_data in elements_data]
+        value_lists = [element_data.pop('values', []) if _Model.value_field == 'values' else []
+                       for element_data in elements_data]
+
+        objs = bulk_create_with_pks(_Model, [_Model(**element_data) for element_data in elements_data])
+        add_data(_Model, objs, data_lists, value_lists)
+        sync_elements(_Model, objs)
+
+    return objs
+
+
+def add_data(_Model, objs, data_lists, value_lists=None):
+    """ bulk create the data (and values) of the given elements and attach them """
+    attach(_Model.data, Data, objs, data_lists)
+
+    if value_lists and _Model.value_field == 'values':
+        attach(_Model.values, CharField, objs, value_lists)
+
+
+def attach(relation, _Target, objs, target_lists):
+    """ create one _Target per item of target_lists and add them to the matching object of objs """
+    targets = bulk_create_with_pks(_Target, [_Target(**item) for target_list in target_lists for item in target_list])
+
+    pairs, position = [], 0
+    for obj, target_list in zip(objs, target_lists):
+        pairs += [(obj.pk, target.pk) for target in targets[position:position + len(target_list)]]
+        position += len(target_list)
+
+    bulk_add(relation, pairs)
+    return targets
+
+
+def delete_unused_data(data_pks):
+    """
+    delete the given Data objects that are no longer used by any element,
+    the delete signals are not sent, callers bump the structure version themselves
+    """
+    unused = Data.objects.filter(pk__in=data_pks, **{'%s__isnull' % _Element._meta.model_name: True
+                                                     for _Element in elements.values()})
+    unused._raw_delete(unused.db)
+
+
+def remove_data(_Model, element):
+    """ detach and delete all data of the given element with a fixed number of queries """
+    relation = _Model.data
+    through_rows = relation.through.objects.filter(**{relation.field.m2m_column_name(): element.pk})
+
+    data_pks = list(through_rows.values_list(relation.field.m2m_reverse_name(), flat=True))
+    through_rows.delete()
+    delete_unused_data(data_pks)
+
+
+def add_options(_Model, element, options, replace=False):
+    """ bulk add data to the given element, existing data are removed first on replace """
+    with transaction.atomic():
+        if replace:
+            remove_data(_Model, element)
+
+        data = attach(_Model.data, Data, [element], [options])
+
+        # bulk inserts send no signals
+        if element.field_id is not None:
+            bump_structure_version(Template.objects.filter(sub_forms__fields=element.field_id))
+
+    return data
@@ -0,0 +1,85 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from core.models import CacheVersion, CacheInvalidation
+
+# local caches are checked against the version table at most once per interval
+POLL_INTERVAL_MS = getattr(settings, 'CACHE_COHERENCE_POLL_INTERVAL_MS', 1000)
+
+# invalidated tags are kept for this many versions of their group, slower processes clear the whole group
+KEEP_INVALIDATIONS = getattr(settings, 'CACHE_COHERENCE_KEEP_INVALIDATIONS', 1000)
+
+_caches = {}
+_known_versions = {}
+_polled = False
+_last_poll = 0.0
+_lock = threading.Lock()
+
+
+def register(name, local_cache):
+    """ drop the entries of local_cache whenever the group with the given name is invalidated """
+    with _lock:
+        _caches.setdefault(name, []).append(local_cache)
+
+
+def clear_local(name, tags=None):
+    for local_cache in _caches.get(name, []):
+        if tags is None:
+            local_cache.clear()
+        else:
+            local_cache.delete_tagged(tags)
+
+
+def invalidate(name, tags=None):
+    """
+    bump the version of the group, other processes clear their local caches on their next poll,
+    only the entries of the given tags are dropped if tags are given
+    """
+    if not CacheVersion.objects.filter(name=name).update(version=F('version') + 1):
+        CacheVersion.objects.get_or_create(name=name)
+        CacheVersion.objects.filter(name=name).update(version=F('version') + 1)
+
+    if tags is not None:
+        # the row is locked by the update above until the transaction ends
+        version = CacheVersion.objects.values_list('version', flat=True).get(name=name)
+        CacheInvalidation.objects.bulk_create([CacheInvalidation(name=name, version=version, tag=tag)
+                                               for tag in set(tags)])
+        if version % KEEP_INVALIDATIONS == 0:
+            CacheInvalidation.objects.filter(name=name, version__lte=version - KEEP_INVALIDATIONS).delete()
+
+    # entries cached before the commit may hold old data, this process stops using them right away
+    clear_local(name, tags)
+    transaction.on_commit(lambda: clear_local(name, tags))
+
+
+def get_invalidated_tags(name, known_version, version):
+    """ tags invalidated by the versions after known_version, None if one of them invalidated the whole group """
+    invalidations = list(CacheInvalidation.objects.filter(name=name, version__gt=known_version,
+                                                          version__lte=version).values_list('version', 'tag'))
+    if len({invalidation_version for invalidation_version, tag in invalidations}) != version - known_version:
+        return None
+    return [tag for invalidation_version, tag in invalidations]
+
+
+def check_versions():
+    """ clear the local caches whose group version changed since the last poll """
+    global _last_poll, _polled
+
+    now = time.monotonic()
+    with _lock:
+        if (now - _last_poll) * 1000 < POLL_INTERVAL_MS:
+            return
+        _last_poll = now
+
+    for name, version in CacheVersion.objects.values_list('name', 'version'):
+        # the row of a group is created by its first invalidation, a group first seen after a poll
+        # was invalidated since then and starts from version 0
+        known_version = _known_versions.get(name, 0 if _polled else version)
+        if known_version != version:
+            clear_local(name, get_invalidated_tags(name, known_version, version))
+        _known_versions[name] = version
+    _polled = True
@@ -0,0 +1,244 @@
+from collections import deque
+
+from core.form_export import get_answers_of_forms
+from core.local_cache import LocalLRUCache
+from core.models import SubForm, Field, elements
+
+SUB_FORM = "sub_form"
+FIELD = "field"
+
+# number of compiled graphs kept in each process
+GRAPH_CACHE_SIZE = 256
+
+
+def node_name(node):
+    """ sub_form3, field7, select12, ... elements are named after their uid """
+    return "%s%d" % node
+
+
+def condition_matches(value, expected):
+    """ check an answer value against the condition value stored as a string """
+    if value is None or value == []:
+        return False
+
+    if expected is None:
+        # no condition value, any answer satisfies the condition
+        return True
+
+    if isinstance(value, list):
+        return any(condition_matches(v, expected) for v in value)
+
+    if isinstance(value, bool):
+        return str(value).lower() == str(expected).lower()
+
+    if isinstance(value, (int, float)):
+        try:
+            return float(value) == float(expected)
+        except ValueError:
+            return False
+
+    return str(value) == str(expected)
+
+
+class ConditionGraph:
+    """
+    Dependency graph of the sub forms, fields and elements of a template
+
+    a node is visible when its parent (sub form of a field, field of an element) is visible
+    and its condition element is visible and answered with the condition value
+    """
+
+    def __init__(self, template_id, version, nodes):
+        """ nodes is {node: (parent node, (type, pk, value) condition or None)} """
+        self.template_id = template_id
+        self.version = version
+        self.nodes = nodes
+
+        self.dependents = {node: [] for node in nodes}
+        for node, (parent, condition) in nodes.items():
+            for source in self.sources_of(node):
+                self.dependents[source].append(node)
+
+        self.order, self.cycles = self.sort()
+        self.positions = {node: index for index, node in enumerate(self.order)}
+
+    def sources_of(self, node):
+        """ nodes that the visibility of the given node depends on """
+        parent, condition = self.nodes[node]
+        sources = []
+        if parent is not None and parent in self.nodes:
+            sources.append(parent)
+        if condition is not None and condition[:2] in self.nodes:
+            sources.append(condition[:2])
+        return sources
+
+    @property
+    def condition_elements(self):
+        """ (type, pk) of every element used in a condition """
+        return {condition[:2] for parent, condition in self.nodes.values() if condition is not None}
+
+    def sort(self):
+        """ topological order of the nodes, nodes on or behind a cycle are returned separately """
+        in_degree = {node: len(self.sources_of(node)) for node in self.nodes}
+        queue = deque(node for node, degree in in_degree.items() if degree == 0)
+
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for dependent in self.dependents[node]:
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    queue.append(dependent)
+
+        cycles = [node for node, degree in in_degree.items() if degree > 0]
+        return order, cycles
+
+    def is_node_visible(self, node, answers, visibility):
+        """ visibility of a single node, its sources must already be in visibility """
+        parent, condition = self.nodes[node]
+
+        if parent is not None and not visibility.get(parent, True):
+            return False
+
+        if condition is None:
+            return True
+
+        source = condition[:2]
+        if not visibility.get(source, True):
+            return False
+
+        return condition_matches(answers.get(source), condition[2])
+
+    def evaluate(self, answers):
+        """ returns {node: visible} for the given {(type, pk): value} answers """
+        visibility = {node: False for node in self.cycles}
+        for node in self.order:
+            visibility[node] = self.is_node_visible(node, answers, visibility)
+        return visibility
+
+    def is_visible(self, node, answers, memo):
+        """ visibility of a single node, resolving only the nodes it depends on """
+        if node not in memo:
+            if node not in self.positions:
+                # node is on or behind a cycle
+                memo[node] = False
+            else:
+                for source in self.sources_of(node):
+                    self.is_visible(source, answers, memo)
+                memo[node] = self.is_node_visible(node, answers, memo)
+        return memo[node]
+
+    def downstream(self, node):
+        """ nodes whose visibility depends on the given node, in topological order """
+        seen = set()
+        queue = deque(self.dependents.get(node, []))
+        while queue:
+            dependent = queue.popleft()
+            if dependent not in seen:
+                seen.add(dependent)
+                queue.extend(self.dependents[dependent])
+
+        return sorted((n for n in seen if n in self.positions), key=self.positions.get)
+
+    def visibility_delta(self, node, old_answers, new_answers):
+        """ nodes whose visibility flipped when the answer of the given element changed """
+        old_memo, new_memo = {}, {}
+        shown, hidden = [], []
+
+        for dependent in self.downstream(node):
+            was_visible = self.is_visible(dependent, old_answers, old_memo)
+            is_visible = self.is_visible(dependent, new_answers, new_memo)
+
+            if was_visible != is_visible:
+                (shown if is_visible else hidden).append(dependent)
+
+        return {'shown': self.describe(shown), 'hidden': self.describe(hidden)}
+
+    @staticmethod
+    def describe(nodes):
+        """ group nodes as sub form pks, field pks and element uids """
+        described = {'sub_forms': [], 'fields': [], 'elements': []}
+        for node in nodes:
+            if node[0] == SUB_FORM:
+                described['sub_forms'].append(node[1])
+            elif node[0] == FIELD:
+                described['fields'].append(node[1])
+            else:
+                described['elements'].append(node_name(node))
+        return described
+
+    def visible_set(self, visibility):
+        visible = self.describe(node for node in self.order if visibility[node])
+        visible['cycles'] = [node_name(node) for node in self.cycles]
+        return visible
+
+
+def get_condition(obj_values):
+    condition_type, condition_pk, condition_value = obj_values
+    if not condition_type or condition_pk is None:
+        return None
+    return condition_type, condition_pk, condition_value
+
+
+def compile_condition_graph(template):
+    """ read the structure of the template with one query per table """
+    condition_fields = ['condition_element_type', 'condition_element_pk', 'condition_element_value']
+    nodes = {}
+
+    for pk, *condition in SubForm.objects.filter(template=template).values_list('pk', *condition_fields):
+        nodes[(SUB_FORM, pk)] = (None, get_condition(condition))
+
+    for pk, sub_form_id, *condition in Field.objects.filter(sub_form__template=template) \
+            .values_list('pk', 'sub_form_id', *condition_fields):
+        nodes[(FIELD, pk)] = ((SUB_FORM, sub_form_id), get_condition(condition))
+
+    for element_type, _Element in elements.items():
+        for pk, field_id, *condition in _Element.objects.filter(field__sub_form__template=template) \
+                .values_list('pk', 'field_id', *condition_fields):
+            nodes[(element_type, pk)] = ((FIELD, field_id), get_condition(condition))
+
+    return ConditionGraph(template.pk, template.structure_version, nodes)
+
+
+# graphs are checked against the structure version of the template
+local_graphs = LocalLRUCache(GRAPH_CACHE_SIZE)
+
+
+def get_condition_graph(template):
+    """ compiled graph of the template, recompiled when the structure version changes """
+    graph = local_graphs.get(template.pk)
+    if graph is not None and graph.version == template.structure_version:
+        return graph
+
+    graph = compile_condition_graph(template)
+    local_graphs.set(template.pk, graph)
+    return graph
+
+
+def get_condition_answers(form, graph):
+    """ answers of the form to the condition elements of the graph, keyed by (type, pk) """
+    answers = get_answers_of_forms([form.pk], graph.condition_elements)
+    return {(element_type, element_pk): value for (form_id, element_type, element_pk), value in answers.items()}
+
+
+def get_form_visibility(form):
+    """ returns the graph and {node: visible} of the given form """
+    graph = get_condition_graph(form.template)
+    return graph, graph.evaluate(get_condition_answers(form, graph))
+
+
+def get_visibility_delta(form, element_type, element_pk, old_value):
+    """ visibility changes caused by replacing old_value with the current answer of the given element """
+    graph = get_condition_graph(form.template)
+    node = (element_type, element_pk)
+
+    if node not in graph.condition_elements:
+        # nothing depends on this element
+        return {'shown': graph.describe([]), 'hidden': graph.describe([])}
+
+    new_answers = get_condition_answers(form, graph)
+    old_answers = dict(new_answers)
+    old_answers[node] = old_value
+
+    return graph.visibility_delta(node, old_answers, new_answers)
@@ -0,0 +1,35 @@
+import hashlib
+import json
+
+from core.element_types import element_types
+from core.models import elements
+
+_metadata = None
+
+
+def build_element_types_metadata():
+    """ filters, value field and display name of every element type """
+    types = []
+    for element_type, display in element_types:
+        _Element = elements.get(element_type)
+        types.append({'type': element_type,
+                      'display': str(display),
+                      'value_field': _Element.value_field,
+                      'multi_valued': _Element.value_field == 'values',
+                      'filters': _Element.filters})
+
+    # the metadata only changes with the code, its hash is the version
+    version = hashlib.sha1(json.dumps(types, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return {'version': version, 'types': types}
+
+
+def get_element_types_metadata():
+    """ metadata of the element types, built once per process """
+    global _metadata
+    if _metadata is None:
+        _metadata = build_element_types_metadata()
+    return _metadata
+
+
+def get_element_types_version_tag():
+    return '"element-types-%s"' % get_element_types_metadata()['version']
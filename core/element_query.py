@@ -0,0 +1,233 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Cast
+
+from core.models import elements, CheckboxElement, UnifiedElement
+
+# element storage layouts, see settings.ELEMENT_STORAGE
+TABLES = "tables"
+SINGLE_TABLE = "single_table"
+
+# checkbox pks per values query
+VALUES_BATCH_SIZE = 900
+
+# typed value columns of the union, every element table fills the column of its value type
+VALUE_COLUMNS = {
+    'value_text': models.TextField(),
+    'value_int': models.IntegerField(),
+    'value_float': models.FloatField(),
+    'value_bool': models.BooleanField(),
+    'value_date': models.DateField(),
+    'value_time': models.TimeField(),
+    'value_datetime': models.DateTimeField(),
+}
+
+# value column of each model field type, file names are stored as text
+value_columns_of_fields = {
+    'CharField': 'value_text',
+    'TextField': 'value_text',
+    'FileField': 'value_text',
+    'IntegerField': 'value_int',
+    'FloatField': 'value_float',
+    'BooleanField': 'value_bool',
+    'DateField': 'value_date',
+    'TimeField': 'value_time',
+    'DateTimeField': 'value_datetime',
+}
+
+COMMON_COLUMNS = ['pk', 'title', 'order', 'field_id', 'form_id', 'answer_of_id',
+                  'condition_element_type', 'condition_element_pk', 'condition_element_value', 'disabled']
+
+COLUMNS = ['element_type'] + COMMON_COLUMNS + list(VALUE_COLUMNS)
+
+# columns of the single element table in COLUMNS order
+UNIFIED_COLUMNS = ['element_type', 'element_pk', 'title', 'order', 'field_id', 'form_id', 'answer_of_pk',
+                   'condition_element_type', 'condition_element_pk', 'condition_element_value', 'disabled'] + \
+                  list(VALUE_COLUMNS)
+
+# lookups of the element tables and their name on the single element table
+unified_lookups = {
+    'pk': 'element_pk',
+    'answer_of_id': 'answer_of_pk',
+    'answer_of__pk': 'answer_of_pk',
+    'answer_of__field': 'answer_of_field',
+    'answer_of__field_id': 'answer_of_field_id',
+}
+
+unified_prefixes = ['title', 'order', 'field', 'field_id', 'form', 'form_id', 'disabled',
+                    'condition_element_type', 'condition_element_pk', 'condition_element_value']
+
+
+def get_storage():
+    """ storage layout elements are read from """
+    return getattr(settings, 'ELEMENT_STORAGE', TABLES)
+
+
+def get_unified_lookup(lookup):
+    """ the given element lookup on the single element table, None if it can not be translated """
+    for name in sorted(unified_lookups, key=len, reverse=True):
+        if lookup == name or lookup.startswith(name + "__"):
+            return unified_lookups[name] + lookup[len(name):]
+
+    if lookup.split("__")[0] in unified_prefixes:
+        return lookup
+
+    return None
+
+
+def get_value_column(_Element):
+    """ union column holding the value of the given element model, None for multi valued elements """
+    if _Element.value_field != 'value':
+        return None
+    return value_columns_of_fields[_Element._meta.get_field('value').get_internal_type()]
+
+
+class ElementRow(namedtuple('ElementRow', COLUMNS + ['values'])):
+    """ one element of any type, read from the union of the element tables """
+    __slots__ = ()
+
+    @property
+    def type(self):
+        return self.element_type
+
+    @property
+    def value_field(self):
+        return elements.get(self.element_type).value_field
+
+    @property
+    def value(self):
+        column = get_value_column(elements.get(self.element_type))
+        return getattr(self, column) if column else None
+
+    @property
+    def answer_value(self):
+        """ value or values, the shape the element serializers use """
+        return self.values if self.value_field == 'values' else self.value
+
+    @property
+    def uid(self):
+        return str(self.element_type) + str(self.pk)
+
+
+class ElementRowQuery:
+    """
+    elements of all types with one UNION ALL query, ordered by order in SQL
+
+    all_elements.filter(field_id=1) -> template elements of a field
+    all_elements.filter(form_id=1).with_values() -> answers of a form, checkbox values included
+
+    with the single table storage the rows are read from UnifiedElement with one plain query,
+    lookups the single table can not answer fall back to the union
+    """
+
+    def __init__(self, filters=None, types=None, values=False, storage=None):
+        self.filters = filters or {}
+        self.types = types
+        self.values = values
+        self.storage = storage
+
+    def clone(self, **kwargs):
+        attrs = dict(filters=self.filters, types=self.types, values=self.values, storage=self.storage)
+        attrs.update(kwargs)
+        return ElementRowQuery(**attrs)
+
+    def filter(self, **filters):
+        return self.clone(filters=dict(self.filters, **filters))
+
+    def of_types(self, *types):
+        return self.clone(types=[element_type for element_type in types if element_type in elements])
+
+    def with_values(self):
+        """ also read the values of multi valued (checkbox) elements, one extra query """
+        return self.clone(values=True)
+
+    def using_storage(self, storage):
+        """ read from the given storage layout instead of settings.ELEMENT_STORAGE """
+        return self.clone(storage=storage)
+
+    def get_unified_filters(self):
+        """ filters on the single element table, None if some lookup can not be translated """
+        filters = {}
+        for lookup, value in self.filters.items():
+            unified_lookup = get_unified_lookup(lookup)
+            if unified_lookup is None:
+                return None
+            filters[unified_lookup] = value
+        return filters
+
+    def get_unified_queryset(self, filters):
+        queryset = UnifiedElement.objects.filter(**filters)
+        if self.types is not None:
+            queryset = queryset.filter(element_type__in=self.types)
+
+        return queryset.order_by('order', 'element_type', 'element_pk').values_list(*UNIFIED_COLUMNS, 'values')
+
+    def get_element_queryset(self, element_type):
+        _Element = elements.get(element_type)
+        value_column = get_value_column(_Element)
+
+        annotations = {'element_type': Value(element_type, output_field=models.CharField())}
+        for column, output_field in VALUE_COLUMNS.items():
+            if column == value_column:
+                annotations[column] = Cast(F('value'), output_field) if column == 'value_text' else F('value')
+            else:
+                annotations[column] = Cast(Value(None), output_field)
+
+        return _Element.objects.filter(**self.filters).annotate(**annotations).values_list(*COLUMNS)
+
+    def get_queryset(self):
+        types = self.types if self.types is not None else list(elements)
+        if not types:
+            return None
+
+        querysets = [self.get_element_queryset(element_type) for element_type in types]
+        return querysets[0].union(*querysets[1:], all=True).order_by('order', 'element_type', 'pk')
+
+    def __iter__(self):
+        if (self.storage or get_storage()) == SINGLE_TABLE:
+            filters = self.get_unified_filters()
+            if filters is not None:
+                if self.types is not None and not self.types:
+                    return iter([])
+                return iter([ElementRow(*row[:-1], row[-1] if self.values else None)
+                             for row in self.get_unified_queryset(filters)])
+
+        queryset = self.get_queryset()
+        if queryset is None:
+            return iter([])
+
+        rows = [ElementRow(*row, None) for row in queryset]
+
+        if self.values:
+            rows = self.add_values(rows)
+
+        return iter(rows)
+
+    @staticmethod
+    def add_values(rows):
+        checkbox_pks = [row.pk for row in rows if row.element_type == CheckboxElement.type]
+        if not checkbox_pks:
+            return rows
+
+        values = {pk: [] for pk in checkbox_pks}
+        # batches stay below the bind parameter limit of sqlite
+        for start in range(0, len(checkbox_pks), VALUES_BATCH_SIZE):
+            for checkbox_pk, pk, value in CheckboxElement.values.through.objects \
+                    .filter(checkboxelement_id__in=checkbox_pks[start:start + VALUES_BATCH_SIZE]).order_by('pk') \
+                    .values_list('checkboxelement_id', 'charfield_id', 'charfield__value'):
+                values[checkbox_pk].append({'pk': pk, 'value': value})
+
+        return [row._replace(values=values[row.pk]) if row.element_type == CheckboxElement.type else row
+                for row in rows]
+
+
+all_elements = ElementRowQuery()
+
+
+def get_form_answers(form, **filters):
+    """ {(type, template element pk): value or values} of the answers of the given form, two queries at most """
+    return {(row.element_type, row.answer_of_id): row.answer_value
+            for row in all_elements.filter(form_id=form.pk, **filters).with_values()}
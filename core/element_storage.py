@@ -0,0 +1,129 @@
+from django.db import transaction
+
+from core.element_query import SINGLE_TABLE, get_storage, get_value_column
+from core.models import elements, UnifiedElement
+
+# rows copied per insert by copy_elements
+COPY_BATCH_SIZE = 1000
+
+# columns written by sync_elements, the type and pk identify the row
+UPSERT_FIELDS = [field.name for field in UnifiedElement._meta.concrete_fields
+                 if not field.primary_key and field.name not in ('element_type', 'element_pk')]
+
+
+def is_single_table():
+    return get_storage() == SINGLE_TABLE
+
+
+def get_values(_Element, element_pks):
+    """ {element pk: [{"pk":, "value":}, ...]} of multi valued elements, ordered like the union query """
+    values = {pk: [] for pk in element_pks}
+    relation = _Element.values.field
+    for element_pk, pk, value in _Element.values.through.objects \
+            .filter(**{relation.m2m_column_name() + '__in': element_pks}).order_by('pk') \
+            .values_list(relation.m2m_column_name(), relation.m2m_reverse_name(), 'charfield__value'):
+        values[element_pk].append({'pk': pk, 'value': value})
+    return values
+
+
+def row_of_element(element, values=None, answer_of_field_id=None):
+    """ UnifiedElement row of the given element of any type """
+    _Element = type(element)
+
+    row = UnifiedElement(element_type=_Element.type, element_pk=element.pk,
+                         title=element.title, order=element.order,
+                         field_id=element.field_id, form_id=element.form_id,
+                         answer_of_pk=element.answer_of_id, answer_of_field_id=answer_of_field_id,
+                         condition_element_type=element.condition_element_type,
+                         condition_element_pk=element.condition_element_pk,
+                         condition_element_value=element.condition_element_value,
+                         disabled=element.disabled)
+
+    value_column = get_value_column(_Element)
+    if value_column is not None:
+        value = element.value
+        # files are stored by name
+        setattr(row, value_column, value.name if hasattr(value, 'name') else value)
+    else:
+        row.values = values or []
+
+    return row
+
+
+def get_answer_of_fields(_Element, objs):
+    """ {template element pk: field pk} of the template elements the given answers belong to """
+    answer_of_pks = {obj.answer_of_id for obj in objs if obj.answer_of_id is not None}
+    if not answer_of_pks:
+        return {}
+    return dict(_Element.objects.filter(pk__in=answer_of_pks).values_list('pk', 'field_id'))
+
+
+def get_rows(_Element, objs):
+    objs = list(objs)
+    values = get_values(_Element, [obj.pk for obj in objs]) if _Element.value_field == 'values' else {}
+    answer_of_fields = get_answer_of_fields(_Element, objs)
+
+    return [row_of_element(obj, values.get(obj.pk), answer_of_fields.get(obj.answer_of_id)) for obj in objs]
+
+
+def sync_elements(_Element, objs):
+    """ write the given elements of one type to the single element table, a no op with the tables storage """
+    objs = list(objs)
+    if not objs or not is_single_table():
+        return
+
+    rows = get_rows(_Element, objs)
+    with transaction.atomic():
+        # an upsert, rows written by a concurrent sync are updated instead of failing the unique constraint
+        UnifiedElement.objects.bulk_create(rows, ignore_conflicts=True)
+        row_pks = dict(UnifiedElement.objects.filter(element_type=_Element.type,
+                                                     element_pk__in=[row.element_pk for row in rows])
+                       .values_list('element_pk', 'pk'))
+        for row in rows:
+            row.pk = row_pks[row.element_pk]
+        UnifiedElement.objects.bulk_update(rows, UPSERT_FIELDS)
+
+        # answers of template elements keep the field of their template element
+        template_pks_of_fields = {}
+        for obj in objs:
+            if obj.answer_of_id is None and obj.form_id is None:
+                template_pks_of_fields.setdefault(obj.field_id, []).append(obj.pk)
+        for field_id, template_pks in template_pks_of_fields.items():
+            UnifiedElement.objects.filter(element_type=_Element.type, answer_of_pk__in=template_pks) \
+                .exclude(answer_of_field_id=field_id).update(answer_of_field_id=field_id)
+
+
+def forget_element(element):
+    if is_single_table():
+        UnifiedElement.objects.filter(element_type=type(element).type, element_pk=element.pk).delete()
+
+
+def copy_elements(batch_size=COPY_BATCH_SIZE):
+    """
+    rebuild the single element table from the element tables
+
+    run after switching settings.ELEMENT_STORAGE to "single_table", returns the number of copied rows
+    """
+    count = 0
+    with transaction.atomic():
+        UnifiedElement.objects.all().delete()
+
+        for _Element in elements.values():
+            queryset = _Element.objects.order_by('pk')
+            for start in range(0, queryset.count(), batch_size):
+                rows = get_rows(_Element, queryset[start:start + batch_size])
+                UnifiedElement.objects.bulk_create(rows)
+                count += len(rows)
+
+    return count
+
+
+def compare_storages():
+    """ {type: (rows in the element table, rows in the single table)} of the types whose counts differ """
+    differences = {}
+    for element_type, _Element in elements.items():
+        counts = (_Element.objects.count(), UnifiedElement.objects.filter(element_type=element_type).count())
+        if counts[0] != counts[1]:
+            differences[element_type] = counts
+    return differences
+
@@ -0,0 +1,97 @@
+import os
+import traceback
+
+from django.conf import settings
+import datetime
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.form_export import get_export_elements, get_export_header, iter_export_rows, write_xlsx, iter_csv, \
+    EXPORT_CHUNK_SIZE
+from core.form_query import filter_forms
+from core.models import ExportJob
+
+# directory of the export files, relative to MEDIA_ROOT
+EXPORTS_DIR = "exports"
+
+
+def get_job_timeout():
+    """ seconds a running job may go without a heartbeat before it is considered abandoned """
+    return getattr(settings, 'EXPORT_JOB_TIMEOUT', 600)
+
+
+def get_job_max_attempts():
+    return getattr(settings, 'EXPORT_JOB_MAX_ATTEMPTS', 3)
+
+
+def requeue_stale_jobs():
+    """
+    put running jobs whose worker stopped sending heartbeats back in the queue,
+    jobs that already used all their attempts fail instead
+
+    returns the number of requeued jobs
+    """
+    stale = ExportJob.objects.filter(status=ExportJob.RUNNING,
+                                     heartbeat_date__lt=timezone.now() - datetime.timedelta(seconds=get_job_timeout()))
+
+    stale.filter(attempts__gte=get_job_max_attempts()) \
+        .update(status=ExportJob.FAILED, error="the export worker stopped responding", finished_date=timezone.now())
+
+    return stale.filter(attempts__lt=get_job_max_attempts()).update(status=ExportJob.PENDING, progress=0)
+
+
+def claim_pending_jobs(limit):
+    """ mark up to limit pending jobs as running and return their ids,
+    locked rows are skipped so several workers can drain the same queue """
+    with transaction.atomic():
+        jobs = list(ExportJob.objects.select_for_update(skip_locked=True)
+                    .filter(status=ExportJob.PENDING).order_by('pk').values_list('pk', flat=True)[:limit])
+
+        now = timezone.now()
+        ExportJob.objects.filter(pk__in=jobs).update(status=ExportJob.RUNNING, started_date=now, heartbeat_date=now,
+                                                     attempts=F('attempts') + 1)
+
+    return jobs
+
+
+def track_progress(job, rows):
+    """ pass rows through and store the number of written rows and a heartbeat once per chunk """
+    for index, row in enumerate(rows, start=1):
+        yield row
+
+        if index % EXPORT_CHUNK_SIZE == 0:
+            ExportJob.objects.filter(pk=job.pk).update(progress=index, heartbeat_date=timezone.now())
+
+
+def run_export_job(job_id):
+    """ write the export file of the given job to MEDIA_ROOT """
+    job = ExportJob.objects.select_related('template').get(pk=job_id)
+
+    try:
+        forms = filter_forms(job.template, job.query)
+        export_elements = get_export_elements(job.template, job.elements)
+
+        total = forms.count()
+        ExportJob.objects.filter(pk=job.pk).update(total=total)
+
+        file_name = os.path.join(EXPORTS_DIR, "job_%d.%s" % (job.pk, job.file_format))
+        file_path = os.path.join(settings.MEDIA_ROOT, file_name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        header = get_export_header(export_elements)
+        rows = track_progress(job, iter_export_rows(forms, export_elements))
+
+        if job.file_format == ExportJob.CSV:
+            with open(file_path, 'w', newline='', encoding='utf-8') as _file:
+                for line in iter_csv(header, rows):
+                    _file.write(line)
+        else:
+            write_xlsx(file_path, header, rows)
+
+        ExportJob.objects.filter(pk=job.pk).update(status=ExportJob.DONE, progress=total, file=file_name,
+                                                   finished_date=timezone.now())
+    except Exception:
+        ExportJob.objects.filter(pk=job.pk).update(status=ExportJob.FAILED, error=traceback.format_exc(),
+                                                   finished_date=timezone.now())
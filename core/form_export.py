@@ -0,0 +1,138 @@
+import csv
+import datetime
+
+import xlsxwriter
+
+from core.models import elements, CheckboxElement
+from core.template_structure import get_structure_elements
+
+# number of forms whose answers are fetched together
+EXPORT_CHUNK_SIZE = 500
+
+
+def get_template_elements(template):
+    """ return the elements of the given template in display order, titles need no extra queries """
+    return get_structure_elements(template)
+
+
+def get_export_elements(template, elements_query=None):
+    """
+    return the template elements that should be exported
+
+    elements_query is a list of {"type":, "pk":} objects, an empty query means all elements
+    """
+    _elements = get_template_elements(template)
+
+    if not elements_query:
+        return _elements
+
+    requested = {(e.get('type'), int(e.get('pk'))) for e in elements_query}
+    return [e for e in _elements if (e.type, e.pk) in requested]
+
+
+def get_export_header(export_elements):
+    return ['description'] + [element.display_title_full for element in export_elements]
+
+
+def to_cell(value):
+    """ convert an answer value to a plain csv/xlsx cell value """
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ', '.join(str(v) for v in value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+
+def get_answers_of_forms(form_ids, element_keys):
+    """
+    fetch the answers of the given forms to the given (type, pk) template elements,
+    one query per element type
+
+    returns {(form_id, element_type, element_pk): value}
+    """
+    element_pks = {}
+    for element_type, element_pk in element_keys:
+        element_pks.setdefault(element_type, []).append(element_pk)
+
+    answers = {}
+    for element_type, pks in element_pks.items():
+        _Element = elements.get(element_type)
+
+        if _Element.value_field == 'values':
+            rows = _Element.objects.filter(form_id__in=form_ids, answer_of_id__in=pks) \
+                .values_list('pk', 'form_id', 'answer_of_id')
+            answer_keys = {pk: (form_id, element_type, answer_of_id) for pk, form_id, answer_of_id in rows}
+
+            for answer_key in answer_keys.values():
+                answers[answer_key] = []
+
+            values = CheckboxElement.values.through.objects.filter(checkboxelement_id__in=answer_keys.keys()) \
+                .order_by('pk').values_list('checkboxelement_id', 'charfield__value')
+            for answer_pk, value in values:
+                answers[answer_keys[answer_pk]].append(value)
+        else:
+            rows = _Element.objects.filter(form_id__in=form_ids, answer_of_id__in=pks) \
+                .values_list('form_id', 'answer_of_id', 'value')
+            for form_id, answer_of_id, value in rows:
+                answers[(form_id, element_type, answer_of_id)] = value
+
+    return answers
+
+
+def iter_export_rows(forms, export_elements, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    yield one row per form, forms are read with a database cursor
+    and their answers are fetched in chunks so memory stays bounded
+    """
+    form_rows = forms.order_by('pk').values_list('pk', 'description').iterator(chunk_size=chunk_size)
+
+    chunk = []
+    for form_row in form_rows:
+        chunk.append(form_row)
+        if len(chunk) >= chunk_size:
+            yield from _rows_of_chunk(chunk, export_elements)
+            chunk = []
+
+    if chunk:
+        yield from _rows_of_chunk(chunk, export_elements)
+
+
+def _rows_of_chunk(chunk, export_elements):
+    answers = get_answers_of_forms([pk for pk, _ in chunk], [(e.type, e.pk) for e in export_elements])
+
+    for form_pk, description in chunk:
+        yield [description] + [to_cell(answers.get((form_pk, element.type, element.pk)))
+                               for element in export_elements]
+
+
+def write_xlsx(file, header, rows):
+    """ write the rows to the given file as an xlsx workbook, rows are flushed one by one """
+    workbook = xlsxwriter.Workbook(file, {'constant_memory': True})
+    worksheet = workbook.add_worksheet()
+
+    worksheet.write_row(0, 0, header)
+    for index, row in enumerate(rows, start=1):
+        worksheet.write_row(index, 0, row)
+
+    workbook.close()
+
+
+class Echo:
+    """ file like object that returns the written value instead of buffering it """
+
+    @staticmethod
+    def write(value):
+        return value
+
+
+def iter_csv(header, rows):
+    """ yield the header and the rows as csv lines """
+    writer = csv.writer(Echo())
+
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
@@ -0,0 +1,132 @@
+import operator
+from functools import reduce
+
+from django.db import connection
+from django.db.models import Q
+from rest_framework import serializers
+
+from core.answer_documents import is_document_storage, get_uid, to_document_value
+from core.models import elements
+from core.serializers.FormSerializers.create_serializers import get_raw_converter_serializer
+from core.text_search import SEARCH, search_q
+
+operator_table = {
+    'and': lambda a, b: a & b,
+    'or': lambda a, b: a | b
+}
+
+
+def set_filter_on_field(field, filter_name):
+    """ append the given lookup to the field name, an empty lookup means exact match """
+    if filter_name == '':
+        return field
+
+    return "%s__%s" % (field, filter_name)
+
+
+def validate_group(group):
+    """ raise a validation error for groups the parser can not read """
+    if not isinstance(group, dict) or group.get('matchType') not in operator_table \
+            or not isinstance(group.get('rules'), list):
+        raise serializers.ValidationError("a query group needs a matchType (and, or) and a list of rules")
+
+    for rule in group['rules']:
+        if not isinstance(rule, dict):
+            raise serializers.ValidationError("query rules should be objects")
+
+
+def validate_rule(rule):
+    """ raise a validation error for rules the parser can not read """
+    if rule.get('type') not in elements or not isinstance(rule.get('filter'), str):
+        raise serializers.ValidationError("a query rule needs a known element type and a filter")
+
+    try:
+        int(rule.get('pk'))
+    except (TypeError, ValueError):
+        raise serializers.ValidationError("a query rule needs the pk of a template element")
+
+
+def parse_document_rule(rule, value):
+    """
+    Q expression on the answers document of forms,
+    exact matches use JSON containment so PostgreSQL can answer them from the GIN index
+    """
+    uid = get_uid(rule['type'], rule['pk'])
+    value = to_document_value(value)
+
+    if rule['filter'] == '' and connection.features.supports_json_field_contains:
+        return Q(answers__contains={uid: value})
+
+    return Q(**{set_filter_on_field("answers__%s" % uid, rule['filter']): value})
+
+
+def parse_rule(rule):
+    """ convert a single query rule to a Q expression on forms """
+    validate_rule(rule)
+
+    # get element model
+    _Element = elements.get(rule['type'])
+
+    # get value field through related name of the element
+    _related_field_name_value = "%s__%s" % (_Element.related_name_to_form(),
+                                            _Element.value_field)
+
+    # to insure that the retrieved element answer corresponds to the queried element
+    _relate_filed_name_pk = "%s__answer_of__pk" % _Element.related_name_to_form()
+
+    # serialize the query element, this process converts query json to native types
+    # that can be used in object filtering
+    _Serializer = get_raw_converter_serializer(rule['type'])
+    serializer = _Serializer(data=rule)
+    serializer.is_valid(raise_exception=True)
+    _converted_value = serializer.validated_data.get(_Element.value_field)
+
+    if rule['filter'] == SEARCH:
+        # served by the text search indexes of the answer tables
+        match_Q = search_q(_Element, _Element.related_name_to_form(), _converted_value)
+    elif is_document_storage() and _Element.value_field != "values":
+        return parse_document_rule(rule, _converted_value)
+    elif _Element.value_field == "values":
+        # clear the _converted_value
+        _converted_value = [v['value'] for v in _converted_value]
+        match_Q = reduce(operator.and_,
+                         (Q(
+                             **{
+                                 set_filter_on_field(_related_field_name_value,
+                                                     rule['filter']): x
+                             }
+                         ) for x in _converted_value))
+    else:
+        match_Q = Q(**{
+            set_filter_on_field(_related_field_name_value,
+                                rule['filter']): _converted_value,
+        })
+
+    _pk_filter = {
+        _relate_filed_name_pk: rule['pk']
+    }
+    return match_Q & Q(**_pk_filter)
+
+
+def parse_group(group):
+    """ convert a (nested) query group to a Q expression on forms """
+    if not group:
+        return Q()
+
+    validate_group(group)
+    matchType = group['matchType']
+
+    val = Q()
+
+    for rule in group['rules']:
+
+        if rule.get('qtype') == 'group':
+            val = operator_table[matchType](val, parse_group(rule))
+        else:
+            val = operator_table[matchType](val, parse_rule(rule))
+    return val
+
+
+def filter_forms(template, query):
+    """ return the forms of the given template that match the query """
+    return template.forms.filter(parse_group(query)).distinct()
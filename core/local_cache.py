@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalLRUCache:
+    """
+    Process local least recently used cache,
+    entries older than ttl seconds are treated as missing
+
+    entries may be tagged, delete_tagged drops the entries of the given tags and every untagged entry
+    """
+
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            value, expires, tags = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags=()):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+
+        with self._lock:
+            self._entries[key] = (value, expires, frozenset(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def delete_tagged(self, tags):
+        tags = set(tags)
+        with self._lock:
+            for key in [key for key, (value, expires, entry_tags) in self._entries.items()
+                        if not entry_tags or entry_tags & tags]:
+                del self._entries[key]
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
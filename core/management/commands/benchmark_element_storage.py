@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from core.element_query import all_elements, TABLES, SINGLE_TABLE
+from core.element_storage import copy_elements, compare_storages
+from core.form_export import get_template_elements
+from core.models import Template, elements
+
+
+def timed(function, repeat):
+    """ mean seconds of one call """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+class Command(BaseCommand):
+    help = "Compare template and form read and write times of the element storage layouts, nothing is kept"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--template', type=int, required=True, help="id of the template to read and write")
+        parser.add_argument('--repeat', type=int, default=20, help="runs of every measurement")
+
+    def handle(self, *args, **options):
+        template = Template.objects.get(pk=options['template'])
+        form_pks = list(template.forms.values_list('pk', flat=True))
+        repeat = options['repeat']
+
+        # every write below is rolled back, the single table is filled for the run if needed
+        with transaction.atomic():
+            if compare_storages():
+                copy_elements()
+
+            for storage in (TABLES, SINGLE_TABLE):
+                with override_settings(ELEMENT_STORAGE=storage):
+                    self.benchmark(storage, template, form_pks, repeat)
+
+            transaction.set_rollback(True)
+
+    def benchmark(self, storage, template, form_pks, repeat):
+        query = all_elements.using_storage(storage)
+        template_elements = get_template_elements(template)
+        answers = [answer for _Element in elements.values() for answer in _Element.objects.filter(form_id__in=form_pks)]
+
+        def read_template():
+            list(query.filter(field__sub_form__template=template.pk))
+
+        def read_forms():
+            for form_pk in form_pks:
+                list(query.filter(form_id=form_pk).with_values())
+
+        def write_template():
+            for element in template_elements:
+                element.save()
+
+        def write_forms():
+            for answer in answers:
+                answer.save()
+
+        self.stdout.write("%s: template read %.2f ms, %d form reads %.2f ms, "
+                          "%d element writes %.2f ms, %d answer writes %.2f ms" % (
+                              storage,
+                              timed(read_template, repeat) * 1000,
+                              len(form_pks), timed(read_forms, repeat) * 1000,
+                              len(template_elements), timed(write_template, repeat) * 1000,
+                              len(answers), timed(write_forms, repeat) * 1000,
+                          ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.answer_documents import build_documents
+from core.models import Form
+
+# forms rebuilt per transaction
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Rebuild the answers document of every form from the stored answers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--template', type=int, action='append', dest='templates',
+                            help="id of a template whose forms are rebuilt, may be repeated, defaults to all forms")
+
+    def handle(self, *args, **options):
+        forms = Form.objects.order_by('pk')
+        if options['templates']:
+            forms = forms.filter(template__in=options['templates'])
+
+        count = 0
+        for start in range(0, forms.count(), BATCH_SIZE):
+            count += build_documents(forms[start:start + BATCH_SIZE])
+
+        self.stdout.write("rebuilt the answers documents of %d forms" % count)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.element_storage import copy_elements, compare_storages, COPY_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Copy the elements of every type into the single element table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=COPY_BATCH_SIZE,
+                            help="rows inserted per query")
+        parser.add_argument('--check', action='store_true',
+                            help="only compare the row counts of both storages")
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            count = copy_elements(options['batch_size'])
+            self.stdout.write("copied %d elements" % count)
+
+        differences = compare_storages()
+        for element_type, (tables, single_table) in differences.items():
+            self.stderr.write("%s: %d rows in the element table, %d in the single table"
+                              % (element_type, tables, single_table))
+
+        if differences:
+            raise CommandError("element storages differ")
+
+        self.stdout.write("element storages match")
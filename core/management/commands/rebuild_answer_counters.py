@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.answer_counters import rebuild_counters
+from core.form_export import get_template_elements
+from core.models import Template
+
+
+class Command(BaseCommand):
+    help = "Recompute the per element answer counters from the stored answers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--template', type=int, action='append', dest='templates',
+                            help="id of a template to rebuild, may be repeated, defaults to all templates")
+
+    def handle(self, *args, **options):
+        templates = Template.objects.all()
+        if options['templates']:
+            templates = templates.filter(pk__in=options['templates'])
+
+        for template in templates:
+            rebuild_counters(get_template_elements(template))
+            self.stdout.write("rebuilt answer counters of template %d" % template.pk)
@@ -0,0 +1,61 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.export_jobs import claim_pending_jobs, run_export_job, requeue_stale_jobs
+
+# connections inherited from the parent, referenced so their finalizers never run in the worker
+inherited_connections = []
+
+
+def init_worker():
+    """
+    each forked worker process opens its own database connections,
+    closing an inherited connection would end the session of the parent on the shared socket
+    """
+    for connection in connections.all():
+        if connection.connection is not None:
+            inherited_connections.append(connection.connection)
+            connection.connection = None
+
+
+class Command(BaseCommand):
+    help = "Process queued export jobs with a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                            help="number of worker processes")
+        parser.add_argument('--poll-interval', type=float, default=2,
+                            help="seconds to wait between queue checks")
+        parser.add_argument('--once', action='store_true',
+                            help="process the pending jobs and exit")
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('fork'),
+                                 initializer=init_worker) as executor:
+            running = set()
+
+            while True:
+                running = {future for future in running if not future.done()}
+
+                # jobs of crashed workers go back to the queue
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    self.stdout.write("%d stale export jobs requeued" % requeued)
+
+                for job_id in claim_pending_jobs(processes - len(running)):
+                    self.stdout.write("export job %d started" % job_id)
+                    # submit may fork a worker, which must not inherit an open connection of this process
+                    connections.close_all()
+                    running.add(executor.submit(run_export_job, job_id))
+
+                if options['once'] and not running:
+                    break
+
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,12 @@
+from core.cache_coherence import check_versions
+
+
+class CacheCoherenceMiddleware:
+    """ Drop process local caches that were invalidated by other processes or hosts """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        check_versions()
+        return self.get_response(request)
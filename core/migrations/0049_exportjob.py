@@ -0,0 +1,33 @@
+# Generated by Django 3.1 on 2026-10-19 07:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0048_template_is_paginated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.JSONField(blank=True, default=dict)),
+                ('elements', models.JSONField(blank=True, default=list)),
+                ('file_format', models.CharField(choices=[('csv', 'csv'), ('xlsx', 'xlsx')], default='xlsx', max_length=16)),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], db_index=True, default='pending', max_length=16)),
+                ('progress', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('file', models.FileField(blank=True, null=True, upload_to='exports/')),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('started_date', models.DateTimeField(blank=True, null=True)),
+                ('finished_date', models.DateTimeField(blank=True, null=True)),
+                ('creator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='core.userprofile')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='core.template')),
+            ],
+        ),
+    ]
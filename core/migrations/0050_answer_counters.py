@@ -0,0 +1,41 @@
+# Generated by Django 3.1 on 2026-10-19 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0049_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerOptionCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('element_type', models.CharField(max_length=255)),
+                ('element_pk', models.IntegerField()),
+                ('value', models.CharField(max_length=1024)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('element_type', 'element_pk', 'value')},
+            },
+        ),
+        migrations.CreateModel(
+            name='AnswerNumericSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('element_type', models.CharField(max_length=255)),
+                ('element_pk', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('sum', models.FloatField(default=0)),
+                ('min', models.FloatField(blank=True, null=True)),
+                ('max', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('element_type', 'element_pk')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-19 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0050_answer_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='template',
+            name='structure_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
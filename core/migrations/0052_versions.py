@@ -0,0 +1,23 @@
+# Generated by Django 3.1 on 2026-10-19 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0051_template_structure_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='form',
+            name='answers_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='template',
+            name='last_structure_change',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
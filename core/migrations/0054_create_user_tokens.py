@@ -0,0 +1,31 @@
+# Generated by Django 3.1 on 2026-10-19 07:40
+
+import binascii
+import os
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_user_tokens(apps, schema_editor):
+    """ issue tokens to the existing users, new users get theirs when they are created """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Token = apps.get_model('authtoken', 'Token')
+
+    Token.objects.bulk_create([
+        Token(key=binascii.hexlify(os.urandom(20)).decode(), user_id=user_id)
+        for user_id in User.objects.filter(auth_token__isnull=True).values_list('pk', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('authtoken', '0002_auto_20160226_1747'),
+        ('core', '0053_cacheversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_user_tokens, migrations.RunPython.noop),
+    ]
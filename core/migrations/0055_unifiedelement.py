@@ -0,0 +1,52 @@
+# Generated by Django 3.1 on 2026-10-19 07:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0054_create_user_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnifiedElement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('element_type', models.CharField(max_length=255)),
+                ('element_pk', models.IntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('order', models.IntegerField(default=0)),
+                ('answer_of_pk', models.IntegerField(blank=True, null=True)),
+                ('condition_element_type', models.CharField(blank=True, max_length=255, null=True)),
+                ('condition_element_pk', models.IntegerField(blank=True, null=True)),
+                ('condition_element_value', models.CharField(blank=True, max_length=255, null=True)),
+                ('disabled', models.BooleanField(default=False)),
+                ('value_text', models.TextField(blank=True, null=True)),
+                ('value_int', models.IntegerField(blank=True, null=True)),
+                ('value_float', models.FloatField(blank=True, null=True)),
+                ('value_bool', models.BooleanField(blank=True, null=True)),
+                ('value_date', models.DateField(blank=True, null=True)),
+                ('value_time', models.TimeField(blank=True, null=True)),
+                ('value_datetime', models.DateTimeField(blank=True, null=True)),
+                ('values', models.JSONField(blank=True, null=True)),
+                ('answer_of_field', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.field')),
+                ('field', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.field')),
+                ('form', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.form')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='unifiedelement',
+            index=models.Index(fields=['field', 'order'], name='core_unifie_field_i_f2a8e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unifiedelement',
+            index=models.Index(fields=['form', 'order'], name='core_unifie_form_id_a6fde5_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='unifiedelement',
+            unique_together={('element_type', 'element_pk')},
+        ),
+    ]
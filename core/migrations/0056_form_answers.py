@@ -0,0 +1,30 @@
+# Generated by Django 3.1 on 2026-10-19 07:44
+
+from django.db import migrations, models
+
+
+def create_answers_index(apps, schema_editor):
+    """ GIN index for containment filters on the answers document, other databases use plain key lookups """
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE INDEX core_form_answers_gin ON core_form USING gin (answers jsonb_path_ops)")
+
+
+def drop_answers_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS core_form_answers_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0055_unifiedelement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='form',
+            name='answers',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(create_answers_index, drop_answers_index),
+    ]
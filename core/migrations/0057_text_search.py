@@ -0,0 +1,91 @@
+# Generated by Django 3.1 on 2026-10-19 07:47
+
+from django.db import migrations, models
+
+# answer tables searched by the literal filters and the search filter
+TEXT_TABLES = ['core_input', 'core_textarea']
+
+
+# SQLite runs AlterField and most other schema changes by rebuilding the table, which drops its triggers.
+# A later migration altering core_input or core_textarea on SQLite must call create_fts_triggers for the
+# table after its schema operations, for instance as a RunPython of
+#   text_search = importlib.import_module('core.migrations.0057_text_search')
+#   text_search.create_fts_triggers(schema_editor, 'core_input')
+# the FTS5 table itself is not touched by the rebuild.
+
+def create_fts_triggers(schema_editor, table):
+    """ (re)create the triggers keeping the FTS5 table of table in step and rebuild its index, SQLite only """
+    drop_fts_triggers(schema_editor, table)
+    schema_editor.execute("CREATE TRIGGER %s_fts_insert AFTER INSERT ON %s BEGIN "
+                          "INSERT INTO %s_fts(rowid, value) VALUES (new.id, new.value); END"
+                          % (table, table, table))
+    schema_editor.execute("CREATE TRIGGER %s_fts_delete AFTER DELETE ON %s BEGIN "
+                          "INSERT INTO %s_fts(%s_fts, rowid, value) VALUES ('delete', old.id, old.value); END"
+                          % (table, table, table, table))
+    schema_editor.execute("CREATE TRIGGER %s_fts_update AFTER UPDATE OF value ON %s BEGIN "
+                          "INSERT INTO %s_fts(%s_fts, rowid, value) VALUES ('delete', old.id, old.value); "
+                          "INSERT INTO %s_fts(rowid, value) VALUES (new.id, new.value); END"
+                          % (table, table, table, table, table))
+    # rows written while the triggers were missing
+    schema_editor.execute("INSERT INTO %s_fts(%s_fts) VALUES ('rebuild')" % (table, table))
+
+
+def drop_fts_triggers(schema_editor, table):
+    for action in ('insert', 'delete', 'update'):
+        schema_editor.execute("DROP TRIGGER IF EXISTS %s_fts_%s" % (table, action))
+
+
+def create_text_search_indexes(apps, schema_editor):
+    """
+    PostgreSQL: trigram indexes for the LIKE based literal filters, a full text index for the search filter
+    SQLite: an FTS5 table per answer table kept in step by triggers
+    """
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table in TEXT_TABLES:
+            # startswith / endswith use LIKE on the column, icontains uses LIKE on UPPER(column)
+            schema_editor.execute("CREATE INDEX %s_value_trgm ON %s USING gin (value gin_trgm_ops)" % (table, table))
+            schema_editor.execute("CREATE INDEX %s_value_upper_trgm ON %s USING gin (UPPER(value) gin_trgm_ops)"
+                                  % (table, table))
+            schema_editor.execute("CREATE INDEX %s_value_fts ON %s USING gin "
+                                  "(to_tsvector('simple', coalesce(value, '')))" % (table, table))
+        schema_editor.execute("CREATE INDEX core_form_description_upper_trgm ON core_form "
+                              "USING gin (UPPER(description) gin_trgm_ops)")
+
+    elif vendor == 'sqlite':
+        for table in TEXT_TABLES:
+            schema_editor.execute("CREATE VIRTUAL TABLE %s_fts USING fts5(value, content='%s', content_rowid='id')"
+                                  % (table, table))
+            create_fts_triggers(schema_editor, table)
+
+
+def drop_text_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        for table in TEXT_TABLES:
+            for suffix in ('value_trgm', 'value_upper_trgm', 'value_fts'):
+                schema_editor.execute("DROP INDEX IF EXISTS %s_%s" % (table, suffix))
+        schema_editor.execute("DROP INDEX IF EXISTS core_form_description_upper_trgm")
+
+    elif vendor == 'sqlite':
+        for table in TEXT_TABLES:
+            drop_fts_triggers(schema_editor, table)
+            schema_editor.execute("DROP TABLE IF EXISTS %s_fts" % table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0056_form_answers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='form',
+            index=models.Index(fields=['description'], name='core_form_descrip_177442_idx'),
+        ),
+        migrations.RunPython(create_text_search_indexes, drop_text_search_indexes),
+    ]
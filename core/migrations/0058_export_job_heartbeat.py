@@ -0,0 +1,23 @@
+# Generated by Django 3.1 on 2026-10-19 07:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0057_text_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='heartbeat_date',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
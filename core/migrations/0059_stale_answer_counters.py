@@ -0,0 +1,20 @@
+# Generated by Django 3.1 on 2026-10-19 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0058_export_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaleAnswerCounters',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('template_pk', models.IntegerField(unique=True)),
+            ],
+        ),
+    ]
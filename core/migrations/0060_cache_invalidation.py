@@ -0,0 +1,26 @@
+# Generated by Django 3.1 on 2026-10-19 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0059_stale_answer_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheInvalidation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('version', models.PositiveBigIntegerField()),
+                ('tag', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cacheinvalidation',
+            index=models.Index(fields=['name', 'version'], name='core_cachei_name_ee4c72_idx'),
+        ),
+    ]
@@ -15,9 +15,12 @@ class UserProfile(models.Model):
     access_level = models.PositiveBigIntegerField(default=0)
 
     @property
-    def token(self) -> str:
-        token, created = Token.objects.get_or_create(user=self.user)
-        return str(token.key)
+    def token(self):
+        # tokens are created with the user, select_related('user__auth_token') avoids a query per profile
+        try:
+            return str(self.user.auth_token.key)
+        except Token.DoesNotExist:
+            return None
 
     def __str__(self):
         return str(self.user)
@@ -33,10 +36,24 @@ class Template(models.Model):
 
     is_paginated = models.BooleanField(default=False)
 
+    # incremented whenever the template or one of its sub forms, fields, elements or data changes
+    structure_version = models.PositiveIntegerField(default=0)
+    last_structure_change = models.DateTimeField(blank=True, null=True)
+
+    # only changed with F() updates, see core.versions.bump_structure_version
+    version_fields = ['structure_version', 'last_structure_change']
+
     @property
     def forms_count(self):
         return self.forms.count()
 
+    def save(self, *args, **kwargs):
+        # a full save of an already loaded template would write back its stale version
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.version_fields]
+        super(Template, self).save(*args, **kwargs)
+
     def __str__(self):
         return str(self.title)
 
@@ -51,8 +68,26 @@ class Form(models.Model):
     template = models.ForeignKey(Template, related_name="forms", on_delete=models.CASCADE)
     description = models.CharField(max_length=255, default="")
 
+    # incremented whenever an answer of the form changes
+    answers_version = models.PositiveIntegerField(default=0)
+
+    # {template element uid: value} of every answer, only kept with settings.ANSWER_STORAGE = "document"
+    answers = models.JSONField(default=dict, blank=True)
+
     class Meta:
         unique_together = ['template', 'description']
+        # the unique index starts with template, filtering by description alone needs its own
+        indexes = [models.Index(fields=['description'])]
+
+    # only changed with F() and in place updates, see core.versions.bump_answers_version
+    answer_fields = ['answers_version', 'answers']
+
+    def save(self, *args, **kwargs):
+        # a full save of an already loaded form would write back its stale answers version and document
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.answer_fields]
+        super(Form, self).save(*args, **kwargs)
 
     def __str__(self):
         return "%s - %s" % (str(self.template), str(self.description))
@@ -160,6 +195,8 @@ class Element(models.Model):
         {"value": 'startswith', "display": "شروع میشود با"},
         {"value": 'endswith', "display": "پایان میابد با"}
     ]
+    # full text search over the words of the answer, backed by text search indexes
+    text_filters = literal_filters + [{"value": 'search', "display": "جستجو"}]
 
     @classmethod
     def related_name_to_form(cls):
@@ -196,7 +233,7 @@ class Input(Element):
     """ Simple Text Input """
     value = models.CharField(max_length=1024, blank=True, null=True)
     type = INPUT
-    filters = Element.literal_filters
+    filters = Element.text_filters
 
 
 class FileInput(Element):
@@ -217,7 +254,7 @@ class TextArea(Element):
     """ Simple Text Input """
     value = models.CharField(max_length=10240, blank=True, null=True)
     type = TEXTAREA
-    filters = Element.literal_filters
+    filters = Element.text_filters
 
 
 class DateTimeElement(Element):
@@ -290,6 +327,162 @@ class FloatField(Element):
     filters = Element.quantitative_filters
 
 
+class AnswerOptionCount(models.Model):
+    """ Number of answers of a select, radio, checkbox or boolean element that hold the given value,
+    kept up to date when answers are set """
+    element_type = models.CharField(max_length=255)
+    element_pk = models.IntegerField()
+    value = models.CharField(max_length=1024)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['element_type', 'element_pk', 'value']
+
+    def __str__(self):
+        return "%s%d - %s - %d" % (self.element_type, self.element_pk, self.value, self.count)
+
+
+class AnswerNumericSummary(models.Model):
+    """ Running count, sum, min and max of the answers of a numeric element,
+    kept up to date when answers are set """
+    element_type = models.CharField(max_length=255)
+    element_pk = models.IntegerField()
+    count = models.IntegerField(default=0)
+    sum = models.FloatField(default=0)
+    min = models.FloatField(blank=True, null=True)
+    max = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ['element_type', 'element_pk']
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def __str__(self):
+        return "%s%d - %d" % (self.element_type, self.element_pk, self.count)
+
+
+class StaleAnswerCounters(models.Model):
+    """ Template whose answer counters are rebuilt on the next read, set when answers are deleted in bulk
+    (the template pk is not a foreign key, markers may be written while the template itself is deleted) """
+    template_pk = models.IntegerField(unique=True)
+
+    def __str__(self):
+        return "template %d" % self.template_pk
+
+
+class UnifiedElement(models.Model):
+    """
+    Elements of all types in a single table, a type discriminator and one nullable column per value type
+
+    only read when settings.ELEMENT_STORAGE is "single_table", the element tables stay the source of truth
+    """
+    element_type = models.CharField(max_length=255)
+    element_pk = models.IntegerField()
+
+    title = models.CharField(max_length=255)
+    order = models.IntegerField(default=0)
+    field = models.ForeignKey(Field, related_name="+", on_delete=models.CASCADE, blank=True, null=True)
+    form = models.ForeignKey(Form, related_name="+", on_delete=models.CASCADE, blank=True, null=True)
+    answer_of_pk = models.IntegerField(blank=True, null=True)
+    # field of the template element an answer belongs to, so answers can be filtered by sub form
+    answer_of_field = models.ForeignKey(Field, related_name="+", on_delete=models.CASCADE, blank=True, null=True)
+
+    condition_element_type = models.CharField(max_length=255, blank=True, null=True)
+    condition_element_pk = models.IntegerField(blank=True, null=True)
+    condition_element_value = models.CharField(max_length=255, blank=True, null=True)
+    disabled = models.BooleanField(default=False)
+
+    value_text = models.TextField(blank=True, null=True)
+    value_int = models.IntegerField(blank=True, null=True)
+    value_float = models.FloatField(blank=True, null=True)
+    value_bool = models.BooleanField(blank=True, null=True)
+    value_date = models.DateField(blank=True, null=True)
+    value_time = models.TimeField(blank=True, null=True)
+    value_datetime = models.DateTimeField(blank=True, null=True)
+
+    # [{"pk":, "value":}, ...] of multi valued elements
+    values = models.JSONField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ['element_type', 'element_pk']
+        indexes = [models.Index(fields=['field', 'order']),
+                   models.Index(fields=['form', 'order'])]
+
+    def __str__(self):
+        return "%s%d" % (self.element_type, self.element_pk)
+
+
+class CacheVersion(models.Model):
+    """ Version of a group of process local caches, every process drops its local entries
+    of the group when the version changes """
+    name = models.CharField(max_length=255, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return "%s - %d" % (self.name, self.version)
+
+
+class CacheInvalidation(models.Model):
+    """ Tags invalidated by a version of a cache group, other processes drop only the entries of these tags """
+    name = models.CharField(max_length=255)
+    version = models.PositiveBigIntegerField()
+    tag = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [models.Index(fields=['name', 'version'])]
+
+    def __str__(self):
+        return "%s - %d - %s" % (self.name, self.version, self.tag)
+
+
+class ExportJob(models.Model):
+    """ A queued export of the forms of a template, processed by the export worker """
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    statuses = ((PENDING, "pending"),
+                (RUNNING, "running"),
+                (DONE, "done"),
+                (FAILED, "failed"))
+
+    CSV = "csv"
+    XLSX = "xlsx"
+
+    file_formats = ((CSV, "csv"),
+                    (XLSX, "xlsx"))
+
+    creator = models.ForeignKey(UserProfile, related_name="export_jobs", on_delete=models.CASCADE)
+    template = models.ForeignKey(Template, related_name="export_jobs", on_delete=models.CASCADE)
+
+    # same query and elements as the form filter endpoint
+    query = models.JSONField(default=dict, blank=True)
+    elements = models.JSONField(default=list, blank=True)
+    file_format = models.CharField(max_length=16, choices=file_formats, default=XLSX)
+
+    status = models.CharField(max_length=16, choices=statuses, default=PENDING, db_index=True)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+
+    file = models.FileField(upload_to="exports/", blank=True, null=True)
+
+    created_date = models.DateTimeField(auto_now_add=True)
+    started_date = models.DateTimeField(blank=True, null=True)
+    finished_date = models.DateTimeField(blank=True, null=True)
+
+    # refreshed by the worker while the job runs, running jobs without a recent heartbeat are requeued
+    heartbeat_date = models.DateTimeField(blank=True, null=True)
+    # number of times a worker claimed the job
+    attempts = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return "%s - %s - %s" % (str(self.template), self.file_format, self.status)
+
+
 class Data(models.Model):
     """ Extra data used on select, radio, checkbox elements"""
     value = models.CharField(max_length=255)
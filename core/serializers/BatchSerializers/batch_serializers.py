@@ -0,0 +1,25 @@
+from rest_framework import serializers
+
+# maximum number of operations of a single batch
+MAX_BATCH_OPERATIONS = 500
+
+
+class BatchSerializer(serializers.Serializer):
+    """
+    Ordered list of operations that run in one transaction
+
+    structure of an operation
+
+    operation = {
+    "op": sub_form.create, field.create, element.create, element.condition,
+          element.add_data, element.set_orders or field.set_orders
+    "id": optional name used to reference the result
+    "type": element type of element operations
+    "pk": pk of the updated object
+    "data": request data of the operation
+    }
+
+    {"$ref": "<id or index>"} anywhere in an operation is replaced by the pk of an earlier result
+    """
+    operations = serializers.ListField(child=serializers.DictField(), allow_empty=False,
+                                       max_length=MAX_BATCH_OPERATIONS)
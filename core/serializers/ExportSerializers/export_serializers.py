@@ -0,0 +1,27 @@
+from rest_framework import serializers
+
+from core.form_query import parse_group
+from core.models import ExportJob
+from core.serializers.FormSerializers.common_serializers import validate_element_keys
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """Create an export job and report its status"""
+
+    class Meta:
+        model = ExportJob
+        fields = ['pk', 'template', 'query', 'elements', 'file_format',
+                  'status', 'progress', 'total', 'error',
+                  'created_date', 'started_date', 'finished_date']
+        read_only_fields = ['status', 'progress', 'total', 'error',
+                            'created_date', 'started_date', 'finished_date']
+
+    @staticmethod
+    def validate_query(query):
+        # raises validation errors for malformed rules before the job is queued
+        parse_group(query)
+        return query
+
+    @staticmethod
+    def validate_elements(element_keys):
+        return validate_element_keys(element_keys)
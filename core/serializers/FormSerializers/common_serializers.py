@@ -1,3 +1,5 @@
+import csv
+import io
 import json
 
 from rest_framework import serializers
@@ -13,6 +15,47 @@ class DataSerializer(serializers.ModelSerializer):
         fields = ['pk', 'value', 'display']
 
 
+class BulkDataSerializer(serializers.Serializer):
+    """
+    Options of an element given as a json array or as csv text
+
+    csv lines are "value,display", display defaults to value
+    """
+    options = DataSerializer(many=True, required=False)
+    csv = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+    replace = serializers.BooleanField(default=False)
+
+    def validate_csv(self, text):
+        rows = [row for row in csv.reader(io.StringIO(text)) if row and any(cell.strip() for cell in row)]
+
+        options = [{'value': row[0].strip(), 'display': (row[1] if len(row) > 1 else row[0]).strip()}
+                   for row in rows]
+
+        serializer = DataSerializer(data=options, many=True)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def validate(self, attrs):
+        if 'options' in attrs and 'csv' in attrs:
+            raise serializers.ValidationError("either options or csv should be given, not both")
+
+        attrs['options'] = attrs.get('options', attrs.pop('csv', []))
+        return attrs
+
+
+class ElementKeySerializer(serializers.Serializer):
+    """{"type":, "pk":} reference to a template element, used by the filter, export and statistics bodies"""
+    type = serializers.ChoiceField(choices=list(elements))
+    pk = serializers.IntegerField()
+
+
+def validate_element_keys(element_keys):
+    """ validated list of {"type":, "pk":} objects, raises validation errors for malformed entries """
+    serializer = ElementKeySerializer(data=element_keys, many=True)
+    serializer.is_valid(raise_exception=True)
+    return [dict(element_key) for element_key in serializer.validated_data]
+
+
 class CharFieldSerializer(serializers.ModelSerializer):
     """Create Char field"""
 
@@ -65,22 +108,21 @@ class ElementsSetOrder(serializers.Serializer):
             try:
                 el_pk = int(element_data.get('pk'))
             except (TypeError, ValueError):
-                raise serializers.ValidationError("pk " + element_data.get('pk') + " is not a valid integer")
+                raise serializers.ValidationError("pk %s is not a valid integer" % element_data.get('pk'))
 
             # validate order
             try:
                 el_order = int(element_data.get('order'))
             except (TypeError, ValueError):
-                raise serializers.ValidationError("order " + element_data.get('order') + " is not a valid integer")
+                raise serializers.ValidationError("order %s is not a valid integer" % element_data.get('order'))
 
             try:
                 _element_obj = ElementModel.objects.get(pk=el_pk)
                 _elements.append({'element': _element_obj, 'order': el_order})
 
-            except ElementModel.DoesNotExsit:
+            except ElementModel.DoesNotExist:
                 raise serializers.ValidationError(
-                    "Element with type %s and pk %d does not exist" % (element_data.get('type'),
-                                                                       element_data.get('pk')))
+                    "Element with type %s and pk %d does not exist" % (element_data.get('type'), el_pk))
 
         return _elements
 
@@ -124,19 +166,18 @@ class FieldsSetOrder(serializers.Serializer):
             try:
                 el_pk = int(field_data.get('pk'))
             except (TypeError, ValueError):
-                raise serializers.ValidationError("pk " + field_data.get('pk') + " is not a valid integer")
+                raise serializers.ValidationError("pk %s is not a valid integer" % field_data.get('pk'))
 
             # validate order
             try:
                 el_order = int(field_data.get('order'))
             except (TypeError, ValueError):
-                raise serializers.ValidationError("order " + field_data.get('order') + " is not a valid integer")
+                raise serializers.ValidationError("order %s is not a valid integer" % field_data.get('order'))
 
             try:
                 _element_obj = Field.objects.get(pk=el_pk)
                 _fields.append({'field': _element_obj, 'order': el_order})
 
-            except Field.DoesNotExsit:
-                raise serializers.ValidationError(
-                    "Field with pk %d does not exist" % (field_data.get('pk')))
+            except Field.DoesNotExist:
+                raise serializers.ValidationError("Field with pk %d does not exist" % el_pk)
         return _fields
@@ -1,6 +1,12 @@
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 
+from core.answer_counters import get_answer_values, record_answer_change
+from core.answer_documents import get_answer_changes
+from core.bulk import add_data, create_elements
+from core.element_storage import sync_elements
+from core.versions import bump_answers_version, bump_structure_version
 from core.models import Input, SelectElement, SubForm, DateTimeElement, Data, Field, RadioElement, \
     CheckboxElement, DateElement, TimeElement, Template, IntegerField, FloatField, CharField, TextArea, \
     Form, elements
@@ -36,16 +42,14 @@ class CreateElementWithData(serializers.ModelSerializer):
         _Model = self.Meta.model
 
         data_data = validated_data.pop('data', [])
+        values_data = validated_data.pop('values', [])
 
-        data_objects = [Data(**data_data_) for data_data_ in data_data]
+        with transaction.atomic():
+            _model = _Model(**validated_data)
+            _model.save()
 
-        for data_object in data_objects:
-            data_object.save()
-
-        _model = _Model(**validated_data)
-        _model.save()
-
-        _model.data.add(*data_objects)
+            # data objects, values and their relation rows are inserted in bulk
+            add_data(_Model, [_model], [data_data], [values_data])
 
         return _model
 
@@ -63,25 +67,67 @@ def get_create_serializer(element_type):
             model = elements.get(element_type)
             fields = abstract_element_fields + [model.value_field, ]
 
-        def create(self, validated_data):
-            # if element has multiple values (value filed is "values")
-            # create values objects
+    return _CreateSerializer
 
-            if elements.get(element_type).value_field == "values":
-                values = validated_data.pop('values', [])
-                obj = super(_CreateSerializer, self).create(validated_data)
 
-                # create values
-                for value in values:
-                    _value = CharField.objects.create(**value)
-                    obj.values.add(_value)
+class FieldElementsCreateSerializer(serializers.Serializer):
+    """
+    Create several elements of a field at once
 
-                return obj
-            else:
-                # object is single valued
-                return super(_CreateSerializer, self).create(validated_data)
+    structure of the elements
 
-    return _CreateSerializer
+    elements = [{
+    "type":
+    ... create fields of the element type
+    }]
+    """
+    elements = serializers.ListField(child=serializers.DictField())
+
+    def validate_elements(self, elements_data):
+        _elements = []
+        errors = {}
+
+        for index, element_data in enumerate(elements_data):
+            element_type = element_data.get('type')
+            if element_type not in elements:
+                errors[index] = ["Element with type %s does not exist" % element_type]
+                continue
+
+            serializer = get_create_serializer(element_type)(data=element_data)
+            if not serializer.is_valid():
+                errors[index] = serializer.errors
+                continue
+
+            # the field comes from the url
+            _elements.append((element_type, dict(serializer.validated_data, field=self.context['field'])))
+
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        return _elements
+
+    def create(self, validated_data):
+        elements_data = {}
+        for element_type, element_data in validated_data.get('elements'):
+            elements_data.setdefault(element_type, []).append(element_data)
+
+        created = []
+        with transaction.atomic():
+            # one insert per element type, bulk_create sends no post_save so the version is bumped once here
+            for element_type, _elements_data in elements_data.items():
+                created += create_elements(elements.get(element_type), _elements_data)
+
+            bump_structure_version(Template.objects.filter(sub_forms__fields=self.context['field'].pk))
+
+        for _Element in {type(element) for element in created}:
+            prefetch_related_objects([element for element in created if type(element) is _Element],
+                                     *(['data', 'values'] if _Element.value_field == 'values' else ['data']))
+
+        return {'elements': sorted(created, key=lambda element: element.order)}
+
+    def to_representation(self, instance):
+        return {'elements': [get_create_serializer(element.type)(instance=element).data
+                             for element in instance['elements']]}
 
 
 def get_condition_update_serializer(element_type):
@@ -118,6 +164,8 @@ def get_update_serializer(element_type):
             _values = validated_data.pop('values', [])
 
             with transaction.atomic():
+                old_values = get_answer_values(instance)
+
                 # delete all data
                 for __data in instance.data.all():
                     __data.delete()
@@ -137,8 +185,15 @@ def get_update_serializer(element_type):
                         __value = CharField.objects.create(**_value)
                         instance.values.add(__value)
 
-            self.Meta.model.objects.filter(pk=instance.pk).update(**validated_data)
-            instance.refresh_from_db()
+                self.Meta.model.objects.filter(pk=instance.pk).update(**validated_data)
+                instance.refresh_from_db()
+
+                # answers edited here skip the set value serializer, keep their counters,
+                # the answers version and the answers document of the form in step
+                record_answer_change(instance, old_values, get_answer_values(instance))
+                if instance.form_id is not None:
+                    bump_answers_version(Form.objects.filter(pk=instance.form_id), **get_answer_changes(instance))
+                sync_elements(self.Meta.model, [instance])
 
             return instance
 
@@ -161,24 +216,34 @@ def get_set_value_serializer(element_type):
         def update(self, instance, validated_data):
             values = validated_data.pop('values', [])
 
-            if self.Meta.model.value_field == 'values':
-                # remove old values and set new values
+            with transaction.atomic():
+                old_values = get_answer_values(instance)
+
+                if self.Meta.model.value_field == 'values':
+                    # remove old values and set new values
+
+                    for value in instance.values.all():
+                        value.delete()
 
-                for value in instance.values.all():
-                    value.delete()
+                    # add new values
+                    for value in values:
+                        _value = CharField(**value)
+                        _value.save()
 
-                # add new values
-                for value in values:
-                    _value = CharField(**value)
-                    _value.save()
+                        instance.values.add(_value)
+                else:
+                    instance.value = validated_data.get('value')
+                    instance.save()
 
-                    instance.values.add(_value)
+                # keep the answer counters of the element in the same transaction
+                record_answer_change(instance, old_values, get_answer_values(instance))
+                # the answers document of the form is written by the same update
+                bump_answers_version(Form.objects.filter(pk=instance.form_id), **get_answer_changes(instance))
+                if self.Meta.model.value_field == 'values':
+                    # deleted values leave the checkbox without an m2m_changed signal
+                    sync_elements(self.Meta.model, [instance])
 
-                return instance
-            else:
-                instance.value = validated_data.get('value')
-                instance.save()
-                return instance
+            return instance
 
     return SetValueSerializer
 
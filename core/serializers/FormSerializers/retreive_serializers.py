@@ -1,20 +1,41 @@
 from rest_framework import serializers
 
+from core.condition_graph import SUB_FORM, FIELD
 from core.element_types import INPUT, DATETIME, SELECT, RADIO, CHECKBOX, DATE, TIME, INT, FLOAT, TEXTAREA, BOOLEAN
 from core.models import Input, SelectElement, DateTimeElement, SubForm, Field, CheckboxElement, DateElement, \
     TimeElement, Template, IntegerField, FloatField, TextArea, elements, Form
-from core.serializers.FormSerializers.common_serializers import DataSerializer, CharFieldSerializer
+from core.serializers.FormSerializers.common_serializers import DataSerializer, CharFieldSerializer, \
+    ElementKeySerializer
 from core.serializers.FormSerializers.serializers_headers import base_fields, base_field_fields, abstract_base_fields, \
     abstract_element_fields, base_field_fields_simple
 from core.serializers.UserProfileSerializer.user_profile_serializers import UserProfileCreateSerializer, \
     UserProfilePublicRetrieve
 from core.sub_form_fields import get_related_attrs
+from core.template_structure import prefetch_structure
+from core.answer_documents import get_form_answers
+from core.template_pages import get_page_outline, outline_fields
+
+
+class SparseFieldsetMixin:
+    """
+    Drop the keys left out by context['element_fieldset'] before serialization,
+    the values (and queries) of dropped keys are never computed
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(SparseFieldsetMixin, self).__init__(*args, **kwargs)
+
+        fieldset = self.context.get('element_fieldset')
+        if fieldset is not None:
+            for name in list(self.fields):
+                if not fieldset.keeps(name):
+                    self.fields.pop(name)
 
 
 def get_retrieve_serializer(element_type, simple=False):
     """Return retrieve serializer base od element type"""
 
-    class _RetrieveSerializer(serializers.ModelSerializer):
+    class _RetrieveSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
         data = DataSerializer(many=True)
 
         if not simple:
@@ -46,14 +67,14 @@ class FieldRetrieveSerializer(serializers.ModelSerializer):
         model = Field
         fields = base_field_fields
 
-    @staticmethod
-    def get_elements(instance):
+    def get_elements(self, instance):
         _elements = get_related_attrs(instance)
         _elements_data = []
 
         for _element in _elements:
             _Serializer = get_retrieve_serializer(type(_element).type)
-            _field_data = _Serializer(instance=_element).data
+            _field_data = _Serializer(instance=_element,
+                                      context={'element_fieldset': self.context.get('element_fieldset')}).data
             _elements_data.append(_field_data)
 
         return _elements_data
@@ -72,23 +93,29 @@ class FieldAnswerRetrieveSerializer(serializers.ModelSerializer):
         _elements = get_related_attrs(instance)
         _elements_data = []
 
+        visibility = self.context.get('visibility')
+
         for _element in _elements:
+            if visibility is not None and not visibility.get((_element.type, _element.pk), True):
+                # element is hidden by its condition
+                continue
+
             _Serializer = get_retrieve_serializer(type(_element).type)
-            _element_data = _Serializer(instance=_element).data
+            _element_data = _Serializer(instance=_element,
+                                        context={'element_fieldset': self.context.get('element_fieldset')}).data
 
             if _element.answer_of is None:
                 # this field is not an answer
                 # fined it's answer
 
-                try:
-                    AnswerModel = elements.get(_element.type)
-                    _obj = AnswerModel.objects.get(answer_of=_element, form=self.context.get('form'))
-                    _new_data = _Serializer(instance=_obj).data
+                # answers of the form are read once for the whole payload
+                answers = self.context.get('answers')
+                if answers is None:
+                    answers = get_form_answers(self.context.get('form'))
 
-                    _element_data[type(_element).value_field] = _new_data[type(_element).value_field]
-
-                except AnswerModel.DoesNotExist:
-                    pass
+                key = (_element.type, _element.pk)
+                if type(_element).value_field in _element_data and key in answers:
+                    _element_data[type(_element).value_field] = answers[key]
             else:
                 continue
 
@@ -110,9 +137,19 @@ class SubFormAnswerRetrieveSerializer(serializers.ModelSerializer):
                   'order', 'template', 'fields']
 
     def get_fields_data(self, instance):
-        _serializer = FieldAnswerRetrieveSerializer(instance=instance.fields.all().order_by('order'),
+        # fields may be prefetched already
+        _fields = sorted(instance.fields.all(), key=lambda field: field.order)
+
+        visibility = self.context.get('visibility')
+        if visibility is not None:
+            _fields = [field for field in _fields if visibility.get((FIELD, field.pk), True)]
+
+        _serializer = FieldAnswerRetrieveSerializer(instance=_fields,
                                                     many=True,
-                                                    context={"form": self.context.get('form')})
+                                                    context={"form": self.context.get('form'),
+                                                             "answers": self.context.get('answers'),
+                                                             "visibility": visibility,
+                                                             "element_fieldset": self.context.get('element_fieldset')})
         return _serializer.data
 
 
@@ -141,15 +178,69 @@ class SubFormSimpleRetrieveSerializer(serializers.ModelSerializer):
         fields = ['pk', 'title', 'description', 'order', 'order', 'template']
 
 
-class TemplateRetrieveSerializer(serializers.ModelSerializer):
+class PageSerializerMixin:
+    """
+    Payloads restricted to one page (context['page'] and context['sub_forms'])
+    also carry the page number and the outline of all pages
+    """
+
+    @staticmethod
+    def get_page_template(instance):
+        return instance
+
+    def keeps_element_data(self):
+        fieldset = self.context.get('element_fieldset')
+        return fieldset is None or fieldset.keeps('data')
+
+    def to_representation(self, instance):
+        data = super(PageSerializerMixin, self).to_representation(instance)
+
+        if 'page' in self.context:
+            data['page'] = self.context['page']
+            data['pages'] = get_page_outline(self.get_page_template(instance))
+
+        return data
+
+
+class TemplateRetrieveSerializer(PageSerializerMixin, serializers.ModelSerializer):
     """Retrieve form info with filler info and detailed sub_form info"""
-    sub_forms = SubFormRetrieveSerializer(many=True, read_only=True)
+    sub_forms = serializers.SerializerMethodField()
     creator = UserProfilePublicRetrieve(read_only=True)
 
     class Meta:
         model = Template
         fields = ['pk', 'creator', "sub_forms", "title", 'forms_count', 'access_level', 'is_paginated']
 
+    def get_sub_forms(self, instance):
+        # sub forms of the requested page only
+        _sub_forms = self.context.get('sub_forms', instance.sub_forms.all())
+
+        # load fields, elements and their data with one query per table
+        _sub_forms = prefetch_structure(_sub_forms, with_data=self.keeps_element_data())
+        return SubFormRetrieveSerializer(instance=_sub_forms, many=True,
+                                         context={'element_fieldset': self.context.get('element_fieldset')}).data
+
+
+class SubFormOutlineSerializer(serializers.ModelSerializer):
+    """Sub form without its fields"""
+
+    class Meta:
+        model = SubForm
+        fields = outline_fields
+
+
+class TemplateOutlineSerializer(serializers.ModelSerializer):
+    """Template info with the sub forms (pages) but without their fields"""
+    sub_forms = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Template
+        fields = ['pk', "title", "sub_forms", 'access_level', 'is_paginated']
+
+    @staticmethod
+    def get_sub_forms(instance):
+        return get_page_outline(instance)
+
 
 class TemplateSimpleRetrieveSerializer(serializers.ModelSerializer):
     """Retrieve form info with filler info and detailed sub_form info"""
@@ -160,7 +251,7 @@ class TemplateSimpleRetrieveSerializer(serializers.ModelSerializer):
         fields = ['pk', 'creator', "title", 'forms_count', 'access_level', 'is_paginated']
 
 
-class FormRetrieveSerializer(serializers.ModelSerializer):
+class FormRetrieveSerializer(PageSerializerMixin, serializers.ModelSerializer):
     """Retrieve form info with filler info and detailed sub_form info"""
     sub_forms = serializers.SerializerMethodField()
 
@@ -172,12 +263,28 @@ class FormRetrieveSerializer(serializers.ModelSerializer):
         fields = ['pk', 'filler', 'fork_date', "sub_forms", 'template', 'description']
 
     @staticmethod
-    def get_sub_forms(instance):
-        _serializers = SubFormAnswerRetrieveSerializer(instance=instance.template.sub_forms.all().order_by('order'),
+    def get_page_template(instance):
+        return instance.template
+
+    def get_sub_forms(self, instance):
+        # sub forms of the requested page only
+        _sub_forms = self.context.get('sub_forms', instance.template.sub_forms.all().order_by('order'))
+        _sub_forms = prefetch_structure(_sub_forms, with_data=self.keeps_element_data())
+
+        # visibility of the template nodes, only set if hidden nodes should be pruned
+        visibility = self.context.get('visibility')
+        if visibility is not None:
+            _sub_forms = [sub_form for sub_form in _sub_forms if visibility.get((SUB_FORM, sub_form.pk), True)]
+
+        _serializers = SubFormAnswerRetrieveSerializer(instance=_sub_forms,
                                                        many=True,
-                                                       context={"form": instance})
+                                                       context={"form": instance,
+                                                                "answers": get_form_answers(instance),
+                                                                "visibility": visibility,
+                                                                "element_fieldset": self.context.get('element_fieldset')})
         return _serializers.data
 
+
 class FormSimpleRetrieveSerializer(serializers.ModelSerializer):
     """Retrieve form info with filler info and detailed sub_form info"""
     filler = UserProfilePublicRetrieve(read_only=True)
@@ -191,7 +298,8 @@ class FormSimpleRetrieveSerializer(serializers.ModelSerializer):
 
 class FormFilterSerializer(serializers.Serializer):
     query = serializers.JSONField(write_only=True, required=True)
-    elements = serializers.JSONField(write_only=True, required=True)
+    # an empty list means every element of the template
+    elements = ElementKeySerializer(many=True, write_only=True, required=True)
 
     @staticmethod
     def validate_query(query):
@@ -199,8 +307,8 @@ class FormFilterSerializer(serializers.Serializer):
             serializers.ValidationError("Empty filter query")
         return query
 
-    @staticmethod
-    def validate_elements(element):
-        if not element:
-            serializers.ValidationError("Empty elements query")
-        return element
+
+class StatisticsFilterSerializer(serializers.Serializer):
+    """Optional filter query and element list of the statistics endpoint"""
+    query = serializers.JSONField(write_only=True, required=False)
+    elements = ElementKeySerializer(many=True, write_only=True, required=False)
@@ -1,5 +1,7 @@
 from abc import ABC
 
+from core.authentication import AUTH, user_tag
+from core.cache_coherence import invalidate
 from core.models import UserProfile
 from django.contrib.auth.models import User
 from rest_framework import serializers
@@ -79,6 +81,9 @@ class UserProfileUpdateSerializer(serializers.ModelSerializer):
         # update user profile
         UserProfile.objects.filter(pk=instance.pk).update(**validated_data)
 
+        # queryset updates send no signals, drop cached authentication results explicitly
+        invalidate(AUTH, [user_tag(instance.user_id)])
+
         instance.refresh_from_db()
 
         return instance
@@ -0,0 +1,132 @@
+from django.db.models.signals import pre_delete, post_save, post_delete, m2m_changed
+
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+
+from core.answer_counters import forget_element_counters, mark_counters_stale
+from core.answer_documents import get_answer_changes
+from core.authentication import AUTH, user_tag
+from core.cache_coherence import invalidate
+from core.element_storage import sync_elements, forget_element
+from core.models import elements, SubForm, Field, Template, Form, Data, UserProfile
+from core.versions import bump_structure_version, bump_answers_version, templates_of_data
+
+
+def create_user_token(sender, instance, created, **kwargs):
+    # issue the auth token once, when the user is created
+    if created:
+        Token.objects.get_or_create(user=instance)
+
+
+def credentials_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    # nothing is cached for new users and tokens, new profiles replace a cached missing profile
+    if created and sender is not UserProfile:
+        return
+
+    # logins only write last_login, which is never read from the cached users
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+
+    # password, active flag, access level or token of this user may have changed
+    invalidate(AUTH, [user_tag(instance.pk if sender is User else instance.user_id)])
+
+
+def form_pre_delete(sender, instance, **kwargs):
+    # the answers go with the form, the counters are rebuilt once instead of per answer
+    mark_counters_stale([instance.template_id])
+
+
+def template_changed(sender, instance, **kwargs):
+    bump_structure_version(Template.objects.filter(pk=instance.pk))
+
+
+def sub_form_changed(sender, instance, **kwargs):
+    bump_structure_version(Template.objects.filter(pk=instance.template_id))
+
+
+def field_changed(sender, instance, **kwargs):
+    bump_structure_version(Template.objects.filter(sub_forms=instance.sub_form_id))
+
+
+def element_changed(sender, instance, created=False, **kwargs):
+    if instance.form_id is not None:
+        # answer values are saved through the set value serializer,
+        # only creation and deletion of answers are tracked here
+        if created:
+            bump_answers_version(Form.objects.filter(pk=instance.form_id))
+        elif kwargs.get('signal') is post_delete:
+            # the answer leaves the answers document of its form with the same update
+            bump_answers_version(Form.objects.filter(pk=instance.form_id),
+                                 **get_answer_changes(instance, remove=True))
+        return
+
+    if instance.field_id is not None:
+        bump_structure_version(Template.objects.filter(sub_forms__fields=instance.field_id))
+
+    if kwargs.get('signal') is post_delete:
+        forget_element_counters(instance)
+
+
+def element_data_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if reverse:
+        # data.<element>_set.add(...), instance is the data object
+        if action == 'pre_clear':
+            bump_structure_version(templates_of_data(instance.pk))
+        elif action in ('post_add', 'post_remove'):
+            field_ids = model.objects.filter(pk__in=pk_set, form__isnull=True).values('field_id')
+            bump_structure_version(Template.objects.filter(sub_forms__fields__in=field_ids))
+
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        element_changed(type(instance), instance)
+
+
+def element_stored(sender, instance, **kwargs):
+    # keep the single element table in step, does nothing with the tables storage
+    if kwargs.get('signal') is post_delete:
+        forget_element(instance)
+    else:
+        sync_elements(sender, [instance])
+
+
+def element_values_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        sync_elements(type(instance), [instance])
+
+
+def data_changed(sender, instance, created=False, **kwargs):
+    # new data objects are not attached to any element yet
+    if not created:
+        bump_structure_version(templates_of_data(instance.pk))
+
+
+post_save.connect(create_user_token, sender=User, dispatch_uid="create_user_token")
+
+for _signal in (post_save, post_delete):
+    for _Model in (User, UserProfile, Token):
+        _signal.connect(credentials_changed, sender=_Model, dispatch_uid="credentials_%s" % _Model.__name__)
+
+post_save.connect(template_changed, sender=Template, dispatch_uid="structure_version_template")
+
+pre_delete.connect(form_pre_delete, sender=Form, dispatch_uid="answer_counters_form")
+
+for _signal in (post_save, post_delete):
+    _signal.connect(sub_form_changed, sender=SubForm, dispatch_uid="structure_version_sub_form")
+    _signal.connect(field_changed, sender=Field, dispatch_uid="structure_version_field")
+
+post_save.connect(data_changed, sender=Data, dispatch_uid="structure_version_data")
+pre_delete.connect(data_changed, sender=Data, dispatch_uid="structure_version_data")
+
+for _Element in elements.values():
+
+    for _signal in (post_save, post_delete):
+        _signal.connect(element_changed, sender=_Element, dispatch_uid="structure_version_%s" % _Element.type)
+
+    m2m_changed.connect(element_data_changed, sender=_Element.data.through,
+                        dispatch_uid="structure_version_data_%s" % _Element.type)
+
+    for _signal in (post_save, post_delete):
+        _signal.connect(element_stored, sender=_Element, dispatch_uid="element_storage_%s" % _Element.type)
+
+    if _Element.value_field == 'values':
+        m2m_changed.connect(element_values_changed, sender=_Element.values.through,
+                            dispatch_uid="element_storage_values_%s" % _Element.type)
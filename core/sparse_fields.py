@@ -0,0 +1,73 @@
+import hashlib
+
+from rest_framework import serializers
+
+from core.models import elements
+
+FIELDS_PARAM = "fields"
+OMIT_PARAM = "omit"
+
+# filters are served once per type by the element types metadata endpoint,
+# ?inline_filters=true (or naming them in ?fields=) puts them back into every element
+INLINE_FILTERS_PARAM = "inline_filters"
+FILTERS = "filters"
+
+_element_field_names = None
+
+
+def get_element_field_names():
+    """ keys of the element payloads of every type, read once per process """
+    global _element_field_names
+    if _element_field_names is None:
+        # the serializers import the models of the whole app
+        from core.serializers.FormSerializers.retreive_serializers import get_retrieve_serializer
+
+        _element_field_names = frozenset(name for element_type in elements
+                                         for name in get_retrieve_serializer(element_type)().fields)
+    return _element_field_names
+
+
+def parse_names(value, param):
+    """ element keys of the given query parameter, unknown keys are rejected """
+    names = {name.strip() for name in value.split(',') if name.strip()} if value else set()
+
+    unknown = names - get_element_field_names()
+    if unknown:
+        raise serializers.ValidationError({param: "unknown element keys %s" % ", ".join(sorted(unknown))})
+    return names
+
+
+class ElementFieldset:
+    """
+    Keys of the element payloads requested with ?fields=pk,value and/or ?omit=filters,display_title
+
+    keys are dropped from the serializer before it runs, so their properties are never computed
+    """
+
+    def __init__(self, fields=None, omit=None):
+        self.fields = fields or None
+        self.omit = omit or set()
+
+    def keeps(self, name):
+        return (self.fields is None or name in self.fields) and name not in self.omit
+
+    @property
+    def variant(self):
+        """ part of cache keys and etags that tells fieldsets apart, a short hash of the sorted keys """
+        names = "fields=%s;omit=%s" % (",".join(sorted(self.fields or [])), ",".join(sorted(self.omit)))
+        return "fieldset-%s" % hashlib.sha1(names.encode('utf-8')).hexdigest()[:12]
+
+
+def get_element_fieldset(request):
+    """ fieldset of the request, element filters are left out unless asked for """
+    fields = parse_names(request.query_params.get(FIELDS_PARAM), FIELDS_PARAM)
+    omit = parse_names(request.query_params.get(OMIT_PARAM), OMIT_PARAM)
+
+    if request.query_params.get(INLINE_FILTERS_PARAM) not in ('1', 'true') and FILTERS not in fields:
+        omit.add(FILTERS)
+
+    return ElementFieldset(fields, omit)
+
+
+def get_fieldset_variant(fieldset):
+    return fieldset.variant if fieldset is not None else ""
@@ -0,0 +1,80 @@
+import struct
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from core.local_cache import LocalLRUCache
+
+# number of payloads kept in each process
+LOCAL_CACHE_SIZE = getattr(settings, 'TEMPLATE_PAYLOAD_LOCAL_CACHE_SIZE', 128)
+
+# seconds a payload is kept in the shared cache, keys change with the template version anyway
+SHARED_CACHE_TIMEOUT = getattr(settings, 'TEMPLATE_PAYLOAD_CACHE_TIMEOUT', 24 * 60 * 60)
+
+# store a gzip compressed copy of every payload
+PRECOMPRESS = getattr(settings, 'TEMPLATE_PAYLOAD_GZIP', True)
+
+# zlib level of the precompressed payloads, the default of gzip.compress
+COMPRESS_LEVEL = 9
+
+# keys include the structure version, entries of old versions are never read again
+local_payloads = LocalLRUCache(LOCAL_CACHE_SIZE)
+
+
+def get_payload_cache_key(template, variant=None):
+    return "template-payload:%d:%d:%s" % (template.pk, template.structure_version, variant or "")
+
+
+def deflate(data, final):
+    """ raw deflate blocks of data, blocks of a later call never refer back to this one """
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_FULL_FLUSH)
+
+
+def add_head(payload, head):
+    """
+    (json bytes, gzip bytes or None) of a cached payload with the keys of head in front,
+    the cached compressed blocks are sent as they are after the blocks of the new keys
+    """
+    rest, compressed_rest = payload
+    head = b'{' + JSONRenderer().render(head)[1:-1] + (b',' if head and rest != b'}' else b'')
+    body = head + rest
+
+    if compressed_rest is None:
+        return body, None
+
+    # gzip header without file name or modification time, deflate blocks, crc and size of the whole body
+    compressed = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff' + deflate(head, final=False) + compressed_rest + \
+        struct.pack('<II', zlib.crc32(body), len(body) & 0xffffffff)
+    return body, compressed
+
+
+def get_template_payload(template, head, render, variant=None):
+    """
+    return (json bytes, gzip bytes or None) of the template payload,
+    render is only called when neither the local nor the shared cache has the current version
+
+    the cached payload leaves out the keys of head, which change without the structure version
+    (Ex. the forms count and the creator) and are added in front of it on every request,
+    variant separates representations of the same template version (Ex. pages)
+    """
+    key = get_payload_cache_key(template, variant)
+
+    payload = local_payloads.get(key)
+    if payload is None:
+        payload = cache.get(key)
+        if payload is None:
+            data = render()
+            for name in head:
+                data.pop(name, None)
+
+            # the body without its opening brace, add_head puts the keys of head in front
+            rest = JSONRenderer().render(data)[1:]
+            payload = (rest, deflate(rest, final=True) if PRECOMPRESS else None)
+            cache.set(key, payload, SHARED_CACHE_TIMEOUT)
+
+        local_payloads.set(key, payload)
+
+    return add_head(payload, head)
@@ -0,0 +1,68 @@
+from rest_framework.exceptions import NotFound
+
+# every sub form of a paginated template is a page, pages are numbered from 1 in sub form order
+FIRST_PAGE = 1
+
+# ?page=all returns every sub form of a paginated template
+ALL_PAGES = "all"
+
+outline_fields = ['pk', 'title', 'description', 'order',
+                  'condition_element_type',
+                  'condition_element_pk',
+                  'condition_element_value']
+
+
+def get_pages(template):
+    """ sub forms of the template in page order """
+    return template.sub_forms.order_by('order', 'pk')
+
+
+def get_page_outline(template):
+    """ lightweight description of every page, one query """
+    return list(get_pages(template).values(*outline_fields))
+
+
+def get_requested_page(request, template):
+    """
+    page number asked by ?page=, None means all sub forms
+
+    without ?page= every template is sent whole, paginated templates are only split when a page is asked for
+    """
+    page = request.query_params.get('page')
+
+    if page is None or page == ALL_PAGES:
+        return None
+
+    try:
+        page = int(page)
+    except ValueError:
+        raise NotFound("Invalid page.")
+
+    if page < FIRST_PAGE:
+        raise NotFound("Invalid page.")
+
+    return page
+
+
+def get_page_sub_forms(template, page):
+    """ sub forms shown on the given page, a template without sub forms has an empty first page """
+    sub_forms = list(get_pages(template)[page - FIRST_PAGE:page])
+    if not sub_forms and page != FIRST_PAGE:
+        raise NotFound("Invalid page.")
+    return sub_forms
+
+
+def get_page_context(template, page):
+    """
+    serializer context restricting a template or form payload to the given page,
+    the payload then also carries the page number and the outline of all pages
+    """
+    if page is None:
+        return {}
+
+    return {'page': page, 'sub_forms': get_page_sub_forms(template, page)}
+
+
+def get_page_variant(page):
+    """ part of cache keys and etags that tells pages apart """
+    return ALL_PAGES if page is None else "page-%d" % page
@@ -0,0 +1,46 @@
+from django.db.models import Prefetch, prefetch_related_objects
+
+from core.models import Field, elements
+from core.sub_form_fields import get_related_attrs
+
+
+def get_structure_lookups(with_data=False):
+    """
+    prefetch lookups of the fields and elements of sub forms, one query per table
+
+    prefetched elements keep a reference to their field and fields to their sub form,
+    so display titles are built without extra queries
+    """
+    lookups = [Prefetch('fields', queryset=Field.objects.order_by('order', 'pk'))]
+
+    for _Element in elements.values():
+        related_name = 'fields__elements_%s' % _Element._meta.model_name
+        lookups.append(related_name)
+
+        if with_data:
+            lookups.append(related_name + '__data')
+            if _Element.value_field == 'values':
+                lookups.append(related_name + '__values')
+
+    return lookups
+
+
+def prefetch_structure(sub_forms, with_data=False):
+    """ load the fields and elements of the given sub forms """
+    sub_forms = list(sub_forms)
+    prefetch_related_objects(sub_forms, *get_structure_lookups(with_data))
+    return sub_forms
+
+
+def get_structure(template, with_data=False):
+    """ sub forms of the template in order, with their fields and elements loaded """
+    return prefetch_structure(template.sub_forms.order_by('order', 'pk'), with_data)
+
+
+def get_structure_elements(template, with_data=False):
+    """ elements of the template in display order """
+    _elements = []
+    for sub_form in get_structure(template, with_data):
+        for field in sub_form.fields.all():
+            _elements += get_related_attrs(field)
+    return _elements
@@ -1,3 +1,1224 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import gzip
+import html
+import importlib
+import io
+import re
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, connection
+from django.db.models import F
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from core.answer_counters import rebuild_counters, get_counter_summary
+from core.answer_statistics import get_option_frequencies
+from core.answer_documents import build_documents
+from core.authentication import AUTH, local_tokens, local_credentials, user_tag
+from core.batch import batch_operations
+from core.cache_coherence import check_versions
+from core.condition_graph import local_graphs
+from core.element_query import get_form_answers
+from core.element_storage import copy_elements, compare_storages, sync_elements
+from core.export_jobs import claim_pending_jobs, requeue_stale_jobs
+from core.management.commands import run_export_worker
+from core.form_export import get_template_elements
+from core.models import UserProfile, Input, Template, SubForm, Field, SelectElement, IntegerField, CheckboxElement, \
+    Data, Form, CharField, ExportJob, CacheVersion, CacheInvalidation, UnifiedElement, AnswerNumericSummary, \
+    StaleAnswerCounters, AnswerOptionCount
+from core.serializers.FormSerializers.retreive_serializers import FormRetrieveSerializer
+from core.template_cache import local_payloads
+from core.text_search import search_q
+from core.versions import bump_answers_version
+
+
+class FormFixtureTestCase(APITestCase):
+    """ a template with a select, a conditioned integer and a checkbox and one answered form """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.user_profile = UserProfile.objects.create(user=cls.user, access_level=10)
+
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        cls.other_profile = UserProfile.objects.create(user=other, access_level=1)
+
+        cls.template = Template.objects.create(creator=cls.user_profile, title="template")
+        cls.sub_form = SubForm.objects.create(template=cls.template, title="sub form", order=0)
+        cls.field = Field.objects.create(sub_form=cls.sub_form, title="field", order=0)
+
+        cls.select = SelectElement.objects.create(field=cls.field, title="select", order=0)
+        cls.data = Data.objects.create(value="a", display="A")
+        cls.select.data.add(cls.data, Data.objects.create(value="b", display="B"))
+
+        cls.integer = IntegerField.objects.create(field=cls.field, title="integer", order=1,
+                                                  condition_element_type="select",
+                                                  condition_element_pk=cls.select.pk,
+                                                  condition_element_value="a")
+        cls.checkbox = CheckboxElement.objects.create(field=cls.field, title="checkbox", order=2)
+
+        cls.form = Form.objects.create(template=cls.template, filler=cls.user_profile, description="form")
+        SelectElement.objects.create(answer_of=cls.select, form=cls.form, value="a")
+        IntegerField.objects.create(answer_of=cls.integer, form=cls.form, value=5)
+        answer = CheckboxElement.objects.create(answer_of=cls.checkbox, form=cls.form)
+        answer.values.add(CharField.objects.create(value="x"))
+
+        cls.export_job = ExportJob.objects.create(creator=cls.user_profile, template=cls.template)
+
+    def setUp(self):
+        # local caches outlive the rolled back test data
+        for local_cache in (local_tokens, local_credentials, local_graphs, local_payloads):
+            local_cache.clear()
+        cache.clear()
+
+        # no cache coherence polls during the tests
+        patcher = mock.patch('core.cache_coherence.POLL_INTERVAL_MS', float('inf'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+
+        # warm the token cache
+        self.client.get('/api/v1/element-types/list/')
+
+    def assertQueries(self, count, method, url, data=None, status=200):
+        with self.assertNumQueries(count):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, status, getattr(response, 'data', None))
+        return response
+
+
+class QueryCountTestCase(FormFixtureTestCase):
+    """
+    Number of queries of every endpoint in core/urls.py for a warm, token authenticated request
+
+    authentication, including the user profile, must not add any query
+    """
+
+    # user profile endpoints
+
+    def test_create_user_profile(self):
+        self.assertQueries(10, 'post', '/api/v1/user-profile/create/',
+                           {'user': {'username': 'new', 'password': 'password'}}, status=201)
+
+    def test_my_user_profile_info(self):
+        self.assertQueries(0, 'get', '/api/v1/user-profile/my-info/retrieve-update-delete/')
+
+    def test_user_profile_info(self):
+        self.assertQueries(3, 'get', '/api/v1/user-profile/%d/retrieve-update-delete/' % self.other_profile.pk)
+
+    def test_user_profile_list(self):
+        self.assertQueries(1, 'get', '/api/v1/user-profile/list/')
+
+    def test_auth_token(self):
+        self.client.credentials()
+        self.assertQueries(1, 'post', '/api/v1/auth/', {'username': 'admin', 'password': 'password'})
+
+    # template endpoints
+
+    def test_create_template(self):
+        self.assertQueries(2, 'post', '/api/v1/template/create/', {'title': "new"}, status=201)
+
+    def test_template_retrieve(self):
+        self.assertQueries(21, 'get', '/api/v1/template/%d/' % self.template.pk)
+
+    def test_template_retrieve_cached(self):
+        self.client.get('/api/v1/template/%d/' % self.template.pk)
+        self.assertQueries(2, 'get', '/api/v1/template/%d/' % self.template.pk)
+
+    def test_template_retrieve_page(self):
+        Template.objects.filter(pk=self.template.pk).update(is_paginated=True)
+        SubForm.objects.create(template=self.template, title="second page", order=1)
+
+        response = self.assertQueries(22, 'get', '/api/v1/template/%d/?page=1' % self.template.pk)
+        self.assertEqual(len(response.json()['sub_forms']), 1)
+        self.assertEqual(len(response.json()['pages']), 2)
+
+    def test_template_retrieve_sparse(self):
+        response = self.assertQueries(17, 'get', '/api/v1/template/%d/?fields=pk,type,value' % self.template.pk)
+        element = response.json()['sub_forms'][0]['fields'][0]['elements'][0]
+        self.assertEqual(set(element), {'pk', 'type', 'value'})
+
+    def test_template_outline(self):
+        self.assertQueries(2, 'get', '/api/v1/template/%d/outline/' % self.template.pk)
+
+    def test_template_element_list(self):
+        self.assertQueries(19, 'get', '/api/v1/template/%d/elements/list/' % self.template.pk)
+
+    def test_template_element_list_of_larger_template(self):
+        # the structure is loaded per table, more fields and elements do not add queries
+        for order in range(1, 6):
+            field = Field.objects.create(sub_form=self.sub_form, title="field %d" % order, order=order)
+            IntegerField.objects.create(field=field, title="integer", order=0)
+            SelectElement.objects.create(field=field, title="select", order=1).data.add(self.data)
+
+        self.assertQueries(19, 'get', '/api/v1/template/%d/elements/list/' % self.template.pk)
+
+    def test_template_list(self):
+        self.assertQueries(4, 'get', '/api/v1/template/list/')
+
+    # form endpoints
+
+    def test_form_retrieve(self):
+        self.assertQueries(23, 'get', '/api/v1/form/%d/' % self.form.pk)
+
+    @override_settings(ANSWER_STORAGE="document")
+    def test_form_retrieve_document(self):
+        build_documents(Form.objects.all())
+        self.assertQueries(21, 'get', '/api/v1/form/%d/' % self.form.pk)
+
+    def test_form_retrieve_not_modified(self):
+        response = self.client.get('/api/v1/form/%d/' % self.form.pk)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/form/%d/' % self.form.pk, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_form_outline(self):
+        self.assertQueries(17, 'get', '/api/v1/form/%d/outline/' % self.form.pk)
+
+    def test_form_sub_form_retrieve(self):
+        self.assertQueries(22, 'get', '/api/v1/form/%d/sub-form/%d/' % (self.form.pk, self.sub_form.pk))
+
+    @override_settings(ELEMENT_STORAGE="single_table")
+    def test_form_sub_form_retrieve_single_table(self):
+        copy_elements()
+        self.assertQueries(21, 'get', '/api/v1/form/%d/sub-form/%d/' % (self.form.pk, self.sub_form.pk))
+
+    def test_form_visibility(self):
+        self.assertQueries(16, 'get', '/api/v1/form/%d/visibility/' % self.form.pk)
+
+    def test_form_filter(self):
+        query = {'matchType': 'and', 'rules': [{'qtype': 'rule', 'type': 'select', 'pk': self.select.pk,
+                                                'filter': '', 'value': 'a'}]}
+        self.assertQueries(4, 'post', '/api/v1/template/%d/filter/' % self.template.pk,
+                           {'query': query, 'elements': []})
+
+    @override_settings(ELEMENT_STORAGE="single_table")
+    def test_form_filter_single_table(self):
+        copy_elements()
+        query = {'matchType': 'and', 'rules': [{'qtype': 'rule', 'type': 'select', 'pk': self.select.pk,
+                                                'filter': '', 'value': 'a'}]}
+        self.assertQueries(3, 'post', '/api/v1/template/%d/filter/' % self.template.pk,
+                           {'query': query, 'elements': []})
+
+    def test_form_filter_search(self):
+        text = Input.objects.create(field=self.field, title="text", order=3)
+        Input.objects.create(answer_of=text, form=self.form, value="quick brown fox")
+        query = {'matchType': 'and', 'rules': [{'qtype': 'rule', 'type': 'input', 'pk': text.pk,
+                                                'filter': 'search', 'value': 'fox quick'}]}
+        response = self.assertQueries(4, 'post', '/api/v1/template/%d/filter/' % self.template.pk,
+                                      {'query': query, 'elements': []})
+        self.assertEqual([form['description'] for form in response.data], [self.form.description])
+
+    @override_settings(ANSWER_STORAGE="document")
+    def test_form_filter_document(self):
+        build_documents(Form.objects.all())
+        query = {'matchType': 'and', 'rules': [{'qtype': 'rule', 'type': 'select', 'pk': self.select.pk,
+                                                'filter': '', 'value': 'a'}]}
+        self.assertQueries(2, 'post', '/api/v1/template/%d/filter/' % self.template.pk,
+                           {'query': query, 'elements': []})
+
+    @override_settings(ANSWER_STORAGE="document")
+    def test_answer_element_of_form_document(self):
+        build_documents(Form.objects.all())
+        self.assertQueries(35, 'put', '/api/v1/form/%d/set-value/int/%d/' % (self.form.pk, self.integer.pk),
+                           {'value': 7})
+        self.assertEqual(Form.objects.get(pk=self.form.pk).answers.get('int%d' % self.integer.pk), 7)
+
+    def test_template_statistics(self):
+        self.assertQueries(19, 'get', '/api/v1/template/%d/stats/' % self.template.pk)
+
+    def test_template_statistics_summary(self):
+        self.assertQueries(18, 'get', '/api/v1/template/%d/stats/summary/' % self.template.pk)
+
+    def test_export_xlsx(self):
+        self.assertQueries(20, 'post', '/api/v1/template/%d/export/xlsx/' % self.template.pk,
+                           {'query': {}, 'elements': []})
+
+    def test_export_csv(self):
+        response = self.assertQueries(15, 'get', '/api/v1/template/%d/export/csv/' % self.template.pk)
+
+        # rows are produced while the response is consumed
+        with self.assertNumQueries(5):
+            b''.join(response.streaming_content)
+
+    # export jobs
+
+    def test_create_export_job(self):
+        self.assertQueries(2, 'post', '/api/v1/export-job/create/', {'template': self.template.pk}, status=201)
+
+    def test_export_job_retrieve(self):
+        self.assertQueries(1, 'get', '/api/v1/export-job/%d/' % self.export_job.pk)
+
+    def test_export_job_download_pending(self):
+        self.assertQueries(1, 'get', '/api/v1/export-job/%d/download/' % self.export_job.pk, status=400)
+
+    # form lists
+
+    def test_create_form_from_template(self):
+        self.assertQueries(3, 'post', '/api/v1/create-form-from-template/',
+                           {'template': self.template.pk, 'description': "new"}, status=201)
+
+    def test_answer_element_of_form(self):
+        self.assertQueries(36, 'put', '/api/v1/form/%d/set-value/select/%d/' % (self.form.pk, self.select.pk),
+                           {'value': 'b'})
+
+    def test_forms_of_template(self):
+        self.assertQueries(7, 'get', '/api/v1/forms-of-template/%d/' % self.template.pk)
+
+    def test_forms_of_user_profile(self):
+        self.assertQueries(7, 'get', '/api/v1/forms-of/%d/' % self.user_profile.pk)
+
+    def test_forms_i_filled(self):
+        self.assertQueries(7, 'get', '/api/v1/forms-I-filled/list/')
+
+    def test_forms_list(self):
+        self.assertQueries(7, 'get', '/api/v1/forms/list/')
+
+    # sub form, field and element endpoints
+
+    def test_create_sub_form(self):
+        self.assertQueries(3, 'post', '/api/v1/sub-form/create/', {'template': self.template.pk, 'title': "new"},
+                           status=201)
+
+    def test_sub_form_retrieve(self):
+        self.assertQueries(18, 'get', '/api/v1/sub-form/%d/' % self.sub_form.pk)
+
+    def test_create_field(self):
+        self.assertQueries(3, 'post', '/api/v1/field/create/', {'sub_form': self.sub_form.pk, 'title': "new"},
+                           status=201)
+
+    def test_update_field(self):
+        self.assertQueries(3, 'patch', '/api/v1/field/%d/' % self.field.pk, {'title': "renamed"})
+
+    def test_create_element(self):
+        self.assertQueries(9, 'post', '/api/v1/element/select/create/',
+                           {'field': self.field.pk, 'title': "new", 'data': [{'value': 'a', 'display': 'A'}]},
+                           status=201)
+
+    def test_create_elements_of_field(self):
+        options = [{'value': str(i), 'display': str(i)} for i in range(100)]
+        self.assertQueries(24, 'post', '/api/v1/field/%d/elements/create/' % self.field.pk,
+                           {'elements': [{'type': 'select', 'title': "new", 'data': options},
+                                         {'type': 'checkbox', 'title': "new", 'data': options,
+                                          'values': [{'value': 'x'}]}]},
+                           status=201)
+
+    def test_update_element(self):
+        self.assertQueries(2, 'get', '/api/v1/element/select/%d/update-retrieve/' % self.select.pk)
+
+    def test_condition_update_element(self):
+        self.assertQueries(3, 'patch', '/api/v1/element/int/%d/condition/update/' % self.integer.pk,
+                           {'condition_element_value': 'b'})
+
+    def test_add_data(self):
+        self.assertQueries(7, 'post', '/api/v1/element/select/%d/add/data/' % self.select.pk,
+                           {'value': 'c', 'display': 'C'}, status=201)
+
+    def test_add_data_bulk(self):
+        self.assertQueries(10, 'post', '/api/v1/element/select/%d/add/data/bulk/' % self.select.pk,
+                           {'csv': "\n".join("%d,option %d" % (i, i) for i in range(100)), 'replace': True},
+                           status=201)
+
+    def test_data_rud(self):
+        self.assertQueries(1, 'get', '/api/v1/data/%d/' % self.data.pk)
+
+    def test_element_types_list(self):
+        self.assertQueries(0, 'get', '/api/v1/element-types/list/')
+
+    def test_element_types_metadata(self):
+        response = self.assertQueries(0, 'get', '/api/v1/element-types/metadata/')
+
+        response = self.client.get('/api/v1/element-types/metadata/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_set_element_orders(self):
+        self.assertQueries(3, 'put', '/api/v1/set-element-orders/',
+                           {'elements_data': [{'type': 'select', 'pk': self.select.pk, 'order': 3}]})
+
+    def test_set_field_orders(self):
+        self.assertQueries(5, 'put', '/api/v1/set-field-orders/',
+                           {'fields_data': [{'pk': self.field.pk, 'order': 3}]})
+
+    def test_batch(self):
+        operations = [
+            {'op': 'sub_form.create', 'id': 'sub_form', 'data': {'template': self.template.pk, 'title': "new"}},
+            {'op': 'field.create', 'id': 'field', 'data': {'sub_form': {'$ref': 'sub_form'}, 'title': "new"}},
+            {'op': 'element.create', 'id': 'select', 'type': 'select',
+             'data': {'field': {'$ref': 'field'}, 'title': "new", 'data': [{'value': 'a', 'display': 'A'}]}},
+            {'op': 'element.condition', 'type': 'select', 'pk': {'$ref': 'select'},
+             'data': {'condition_element_type': 'select', 'condition_element_pk': self.select.pk,
+                      'condition_element_value': 'a'}},
+            {'op': 'element.add_data', 'type': 'select', 'pk': {'$ref': 'select'}, 'data': {'csv': "b,B\nc,C"}},
+        ]
+        self.assertQueries(27, 'post', '/api/v1/batch/', {'operations': operations})
+
+
+def read_xlsx_cells(content):
+    """ {cell name: text} of the first worksheet, strings are written inline in constant memory mode """
+    with zipfile.ZipFile(io.BytesIO(content)) as workbook:
+        sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+
+    return {name: html.unescape(inline) if inline else number
+            for name, inline, number in re.findall(r'<c r="([A-Z]+\d+)"[^>]*>(?:<is><t[^>]*>(.*?)</t></is>|<v>(.*?)</v>)</c>',
+                                                   sheet)}
+
+
+class ExportTestCase(FormFixtureTestCase):
+    """ contents of the xlsx and csv exports """
+
+    def test_export_xlsx_contents(self):
+        response = self.client.post('/api/v1/template/%d/export/xlsx/' % self.template.pk,
+                                    {'query': {}, 'elements': [{'type': 'select', 'pk': self.select.pk},
+                                                               {'type': 'int', 'pk': self.integer.pk}]},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+
+        cells = read_xlsx_cells(b''.join(response.streaming_content))
+        self.assertEqual(cells, {'A1': 'description', 'B1': self.select.display_title_full,
+                                 'C1': self.integer.display_title_full,
+                                 'A2': 'form', 'B2': 'a', 'C2': '5'})
+
+    def test_export_csv_contents(self):
+        second = Form.objects.create(template=self.template, filler=self.user_profile, description="second")
+        IntegerField.objects.create(answer_of=self.integer, form=second, value=9)
+
+        response = self.client.get('/api/v1/template/%d/export/csv/' % self.template.pk)
+        self.assertEqual(response.status_code, 200)
+
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows, [['description', self.select.display_title_full, self.integer.display_title_full,
+                                 self.checkbox.display_title_full],
+                                ['form', 'a', '5', 'x'],
+                                ['second', '', '9', '']])
+
+    def test_export_xlsx_malformed_elements(self):
+        for elements_query in ([{'type': 'select'}], [{'type': 'select', 'pk': 'x'}], [{'type': 'nope', 'pk': 1}],
+                               ['select']):
+            response = self.client.post('/api/v1/template/%d/export/xlsx/' % self.template.pk,
+                                        {'query': {}, 'elements': elements_query}, format='json')
+            self.assertEqual(response.status_code, 400, elements_query)
+
+
+class ExportJobTestCase(FormFixtureTestCase):
+    """ queueing, claiming and requeueing of export jobs """
+
+    def test_create_export_job_malformed_query(self):
+        for query in ({'matchType': 'and', 'rules': [{'qtype': 'rule'}]},
+                      {'matchType': 'and', 'rules': [{'qtype': 'rule', 'type': 'select', 'filter': ''}]},
+                      {'matchType': 'xor', 'rules': []},
+                      {'matchType': 'and', 'rules': 'select'}):
+            response = self.client.post('/api/v1/export-job/create/', {'template': self.template.pk, 'query': query},
+                                        format='json')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_claim_pending_jobs(self):
+        self.assertEqual(claim_pending_jobs(10), [self.export_job.pk])
+
+        job = ExportJob.objects.get(pk=self.export_job.pk)
+        self.assertEqual((job.status, job.attempts), (ExportJob.RUNNING, 1))
+        self.assertIsNotNone(job.heartbeat_date)
+
+        self.assertEqual(claim_pending_jobs(10), [])
+
+    @override_settings(EXPORT_JOB_TIMEOUT=60, EXPORT_JOB_MAX_ATTEMPTS=2)
+    def test_requeue_stale_jobs(self):
+        stale = timezone.now() - datetime.timedelta(seconds=120)
+        retried = self.export_job
+        exhausted = ExportJob.objects.create(creator=self.user_profile, template=self.template)
+        alive = ExportJob.objects.create(creator=self.user_profile, template=self.template)
+
+        ExportJob.objects.filter(pk=retried.pk).update(status=ExportJob.RUNNING, heartbeat_date=stale, attempts=1)
+        ExportJob.objects.filter(pk=exhausted.pk).update(status=ExportJob.RUNNING, heartbeat_date=stale, attempts=2)
+        ExportJob.objects.filter(pk=alive.pk).update(status=ExportJob.RUNNING, heartbeat_date=timezone.now(),
+                                                     attempts=1)
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+
+        statuses = dict(ExportJob.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {retried.pk: ExportJob.PENDING, exhausted.pk: ExportJob.FAILED,
+                                    alive.pk: ExportJob.RUNNING})
+        self.assertEqual(claim_pending_jobs(10), [retried.pk])
+
+    def test_run_export_worker_once(self):
+        calls = []
+
+        class InlineExecutor:
+            """ runs the jobs in the test process, where the test database lives """
+
+            def __init__(self, max_workers, mp_context, initializer):
+                pass
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def submit(self, function, *args):
+                calls.append('submit')
+                future = Future()
+                future.set_result(function(*args))
+                return future
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        stdout = io.StringIO()
+        with override_settings(MEDIA_ROOT=media_root), \
+                mock.patch.object(run_export_worker, 'ProcessPoolExecutor', InlineExecutor), \
+                mock.patch.object(run_export_worker.connections, 'close_all',
+                                  side_effect=lambda: calls.append('close_all')):
+            call_command('run_export_worker', '--once', '--processes', '2', '--poll-interval', '0', stdout=stdout)
+
+        self.assertEqual(stdout.getvalue(), "export job %d started\n" % self.export_job.pk)
+        self.assertEqual(ExportJob.objects.get(pk=self.export_job.pk).status, ExportJob.DONE)
+        # the connections of the parent are closed before a worker may be forked
+        self.assertEqual(calls, ['close_all', 'submit'])
+
+    def test_init_worker_keeps_inherited_connections_open(self):
+        inherited = mock.Mock()
+        alias = mock.Mock(connection=inherited)
+        with mock.patch.object(run_export_worker.connections, 'all', return_value=[alias]), \
+                mock.patch.object(run_export_worker, 'inherited_connections', []):
+            run_export_worker.init_worker()
+            self.assertEqual(run_export_worker.inherited_connections, [inherited])
+
+        self.assertIsNone(alias.connection)
+        alias.close.assert_not_called()
+        inherited.close.assert_not_called()
+
+
+class StatisticsTestCase(FormFixtureTestCase):
+    """ values of the statistics endpoint """
+
+    def test_numeric_summary(self):
+        second = IntegerField.objects.create(field=self.field, title="second", order=3)
+        for index, (value, second_value) in enumerate([(1, 10), (9, 20), (None, 40), (7, 30)]):
+            form = Form.objects.create(template=self.template, filler=self.user_profile, description=str(index))
+            IntegerField.objects.create(answer_of=self.integer, form=form, value=value)
+            IntegerField.objects.create(answer_of=second, form=form, value=second_value)
+
+        # the same number of queries as a single numeric element, quantiles are read once per type
+        with self.assertNumQueries(19):
+            response = self.client.get('/api/v1/template/%d/stats/' % self.template.pk)
+        statistics = {(row['type'], row['pk']): row for row in response.data}
+
+        # answers 1, 5, 7, 9 and 10, 20, 30, 40
+        integer = statistics[('int', self.integer.pk)]
+        self.assertEqual((integer['count'], integer['min'], integer['max'], integer['mean']), (4, 1, 9, 5.5))
+        self.assertEqual(integer['quantiles'], {'0.25': 5, '0.5': 7, '0.75': 7})
+        self.assertEqual(statistics[('int', second.pk)]['quantiles'], {'0.25': 20, '0.5': 30, '0.75': 30})
+
+        self.assertEqual(statistics[('select', self.select.pk)]['frequencies'], [{'value': 'a', 'count': 1}])
+        self.assertEqual(statistics[('checkbox', self.checkbox.pk)]['frequencies'], [{'value': 'x', 'count': 1}])
+
+
+class CounterTestCase(FormFixtureTestCase):
+    """ values of the statistics summary, kept by the answer counters """
+
+    def setUp(self):
+        super().setUp()
+        # the fixture answers are created without the counters
+        rebuild_counters(get_template_elements(self.template))
+
+    def get_summary(self):
+        response = self.client.get('/api/v1/template/%d/stats/summary/' % self.template.pk)
+        return {(row['type'], row['pk']): row for row in response.data}
+
+    def get_frequencies(self, summary, element):
+        return {row['value']: row['count'] for row in summary[(element.type, element.pk)]['frequencies']}
+
+    def set_value(self, form, element, data):
+        response = self.client.put('/api/v1/form/%d/set-value/%s/%d/' % (form.pk, element.type, element.pk), data,
+                                   format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def test_set_value(self):
+        form = Form.objects.create(template=self.template, filler=self.user_profile, description="second")
+        self.set_value(form, self.select, {'value': 'a'})
+        self.set_value(self.form, self.select, {'value': 'b'})
+        self.set_value(form, self.checkbox, {'values': [{'value': 'x'}, {'value': 'y'}]})
+        self.set_value(form, self.integer, {'value': 2})
+
+        summary = self.get_summary()
+        self.assertEqual(self.get_frequencies(summary, self.select), {'a': 1, 'b': 1})
+        self.assertEqual(self.get_frequencies(summary, self.checkbox), {'x': 2, 'y': 1})
+        integer = summary[('int', self.integer.pk)]
+        self.assertEqual((integer['count'], integer['sum'], integer['min'], integer['max']), (2, 7, 2, 5))
+
+        # replacing the maximum reads the new extremes from the answers
+        self.set_value(self.form, self.integer, {'value': 1})
+        integer = self.get_summary()[('int', self.integer.pk)]
+        self.assertEqual((integer['count'], integer['sum'], integer['min'], integer['max']), (2, 3, 1, 2))
+
+    def test_update_answer(self):
+        answer = SelectElement.objects.get(form=self.form, answer_of=self.select)
+        response = self.client.put('/api/v1/element/select/%d/update-retrieve/' % answer.pk,
+                                   {'title': "select", 'order': 0, 'value': 'b', 'data': []}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.assertEqual(self.get_summary()[('select', self.select.pk)]['frequencies'], [{'value': 'b', 'count': 1}])
+
+    def test_delete_answer(self):
+        answer = IntegerField.objects.get(form=self.form, answer_of=self.integer)
+        response = self.client.delete('/api/v1/element/int/%d/update-retrieve/' % answer.pk)
+        self.assertEqual(response.status_code, 204)
+
+        integer = self.get_summary()[('int', self.integer.pk)]
+        self.assertEqual((integer['count'], integer['sum'], integer['min'], integer['max']), (0, 0, None, None))
+
+    def test_delete_form(self):
+        form = Form.objects.create(template=self.template, filler=self.user_profile, description="second")
+        self.set_value(form, self.select, {'value': 'b'})
+        self.set_value(form, self.integer, {'value': 9})
+
+        # the answers go with the form without touching the counters, which are rebuilt on the next read
+        with mock.patch('core.answer_counters.rebuild_counters', wraps=rebuild_counters) as rebuild:
+            Form.objects.get(pk=self.form.pk).delete()
+            summary = self.get_summary()
+        self.assertEqual(rebuild.call_count, 1)
+
+        self.assertEqual(summary[('select', self.select.pk)]['frequencies'], [{'value': 'b', 'count': 1}])
+        self.assertEqual(summary[('checkbox', self.checkbox.pk)]['frequencies'], [])
+        integer = summary[('int', self.integer.pk)]
+        self.assertEqual((integer['count'], integer['sum'], integer['min'], integer['max']), (1, 9, 9, 9))
+
+        # the next read uses the counters again
+        with mock.patch('core.answer_counters.rebuild_counters') as rebuild:
+            self.get_summary()
+        rebuild.assert_not_called()
+
+    def test_summary_reads_counters_of_the_template(self):
+        other = SelectElement.objects.create(title="other template", order=0)
+        AnswerOptionCount.objects.create(element_type='select', element_pk=other.pk, value='a', count=5)
+
+        template_elements = list(get_template_elements(self.template))
+        with CaptureQueriesContext(connection) as queries:
+            summary = get_counter_summary(template_elements)
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertIn('"element_pk" IN', query['sql'])
+        self.assertNotIn(other.pk, [row['pk'] for row in summary if row['type'] == 'select'])
+
+    def test_rebuild_with_concurrent_counter(self):
+        AnswerOptionCount.objects.filter(element_type='select', element_pk=self.select.pk).delete()
+        AnswerOptionCount.objects.create(element_type='select', element_pk=self.select.pk, value='gone', count=3)
+
+        def frequencies_and_set_value(element_type, pks):
+            # a set value creating the counter of a new value while the rebuild reads the answers
+            AnswerOptionCount.objects.get_or_create(element_type=element_type, element_pk=self.select.pk, value='a')
+            return get_option_frequencies(element_type, pks)
+
+        # the counter the rebuild would insert already exists, the rebuild does not fail on it
+        with mock.patch('core.answer_counters.get_option_frequencies', side_effect=frequencies_and_set_value):
+            rebuild_counters([self.select])
+
+        counts = dict(AnswerOptionCount.objects.filter(element_type='select', element_pk=self.select.pk)
+                      .values_list('value', 'count'))
+        self.assertEqual((set(counts), counts['gone']), ({'gone', 'a'}, 0))
+
+    def test_counter_names(self):
+        summary = AnswerNumericSummary.objects.get(element_type='int', element_pk=self.integer.pk)
+        self.assertEqual(str(summary), "int%d - 1" % self.integer.pk)
+        self.assertEqual(str(StaleAnswerCounters(template_pk=self.template.pk)), "template %d" % self.template.pk)
+
+
+class VisibilityTestCase(FormFixtureTestCase):
+    """ sub forms, fields and elements shown by the answers of a form """
+
+    def test_visible_set(self):
+        response = self.client.get('/api/v1/form/%d/visibility/' % self.form.pk)
+        self.assertEqual((response.data['sub_forms'], response.data['fields'], response.data['cycles']),
+                         ([self.sub_form.pk], [self.field.pk], []))
+        self.assertCountEqual(response.data['elements'], ['select%d' % self.select.pk, 'int%d' % self.integer.pk,
+                                                          'checkbox%d' % self.checkbox.pk])
+
+        # the integer is shown only when the select is "a"
+        SelectElement.objects.filter(form=self.form, answer_of=self.select).update(value="b")
+        response = self.client.get('/api/v1/form/%d/visibility/' % self.form.pk)
+        self.assertCountEqual(response.data['elements'], ['select%d' % self.select.pk, 'checkbox%d' % self.checkbox.pk])
+
+    def set_value(self, element, data):
+        response = self.client.put('/api/v1/form/%d/set-value/%s/%d/' % (self.form.pk, element.type, element.pk),
+                                   data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['visibility_delta']
+
+    def test_visibility_delta(self):
+        # hidden with the integer it depends on
+        dependent = Input.objects.create(field=self.field, title="dependent", order=3,
+                                         condition_element_type="int", condition_element_pk=self.integer.pk,
+                                         condition_element_value="5")
+        dependents = ['int%d' % self.integer.pk, 'input%d' % dependent.pk]
+        nothing = {'sub_forms': [], 'fields': [], 'elements': []}
+
+        delta = self.set_value(self.select, {'value': 'b'})
+        self.assertEqual(delta['shown'], nothing)
+        self.assertCountEqual(delta['hidden']['elements'], dependents)
+
+        delta = self.set_value(self.select, {'value': 'a'})
+        self.assertCountEqual(delta['shown']['elements'], dependents)
+        self.assertEqual(delta['hidden'], nothing)
+
+        # answers nothing depends on change nothing
+        self.assertEqual(self.set_value(self.checkbox, {'values': [{'value': 'y'}]}),
+                         {'shown': nothing, 'hidden': nothing})
+
+
+class ConditionalRetrieveTestCase(FormFixtureTestCase):
+    """ etags of the form payload """
+
+    def get_form(self, **headers):
+        return self.client.get('/api/v1/form/%d/' % self.form.pk, **headers)
+
+    def test_etag_changes_after_answer(self):
+        etag = self.get_form()['ETag']
+        self.assertEqual(self.get_form(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.put('/api/v1/form/%d/set-value/select/%d/' % (self.form.pk, self.select.pk),
+                                   {'value': 'b'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.get_form(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_changes_after_answer_update(self):
+        etag = self.get_form()['ETag']
+
+        answer = SelectElement.objects.get(form=self.form, answer_of=self.select)
+        response = self.client.put('/api/v1/element/select/%d/update-retrieve/' % answer.pk,
+                                   {'title': "select", 'order': 0, 'value': 'b', 'data': []}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.assertEqual(self.get_form(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_form_update_keeps_answers_version(self):
+        form = Form.objects.get(pk=self.form.pk)
+        answers_version = form.answers_version
+
+        # an answer saved while the form update request runs
+        bump_answers_version(Form.objects.filter(pk=self.form.pk))
+
+        serializer = FormRetrieveSerializer(form, data={'description': "renamed"}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        form = Form.objects.get(pk=self.form.pk)
+        self.assertEqual((form.description, form.answers_version), ("renamed", answers_version + 1))
+
+    def test_full_save_keeps_answers(self):
+        form = Form.objects.get(pk=self.form.pk)
+        answers_version = form.answers_version
+
+        # an answer saved while the form is loaded, the admin saves every field
+        bump_answers_version(Form.objects.filter(pk=self.form.pk), answers={'int1': 5})
+
+        form.description = "renamed"
+        form.save()
+
+        form = Form.objects.get(pk=self.form.pk)
+        self.assertEqual((form.description, form.answers_version, form.answers),
+                         ("renamed", answers_version + 1, {'int1': 5}))
+
+
+class TemplatePayloadTestCase(FormFixtureTestCase):
+    """ cached template payloads """
+
+    def get_template(self, **headers):
+        response = self.client.get('/api/v1/template/%d/' % self.template.pk, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_forms_count_added_to_cached_payload(self):
+        self.assertEqual(self.get_template().json()['forms_count'], 1)
+        Form.objects.create(template=self.template, filler=self.user_profile, description="second")
+
+        # a new form changes the count but leaves the cached payload in place
+        with mock.patch('core.views.form_views.TemplateRetrieveView.render_payload') as render_payload:
+            response = self.get_template()
+            compressed = self.get_template(HTTP_ACCEPT_ENCODING='gzip')
+        render_payload.assert_not_called()
+
+        self.assertEqual(response.json()['forms_count'], 2)
+        self.assertEqual(response.json()['title'], "template")
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), response.content)
+
+    def test_creator_added_to_cached_payload(self):
+        etag = self.get_template()['ETag']
+
+        # profile edits leave the structure version and the cached payload in place
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = "renamed"
+        user.save()
+
+        with mock.patch('core.views.form_views.TemplateRetrieveView.render_payload') as render_payload:
+            response = self.get_template(HTTP_IF_NONE_MATCH=etag)
+            compressed = self.get_template(HTTP_ACCEPT_ENCODING='gzip')
+        render_payload.assert_not_called()
+
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['creator']['user']['first_name'], "renamed")
+        self.assertEqual(gzip.decompress(compressed.content), response.content)
+
+    def test_form_etag_changes_with_filler(self):
+        url = '/api/v1/form/%d/' % self.form.pk
+        etag = self.client.get(url)['ETag']
+
+        user = User.objects.get(pk=self.user.pk)
+        user.email = "renamed@example.com"
+        user.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['filler']['user']['email'], "renamed@example.com")
+
+    def test_stale_save_keeps_structure_version(self):
+        template = Template.objects.get(pk=self.template.pk)
+        SubForm.objects.create(template=self.template, title="second page", order=1)
+        structure_version = Template.objects.get(pk=self.template.pk).structure_version
+
+        template.title = "renamed"
+        template.save()
+
+        template = Template.objects.get(pk=self.template.pk)
+        self.assertEqual(template.title, "renamed")
+        # the save itself is a structure change
+        self.assertEqual(template.structure_version, structure_version + 1)
+
+
+class CacheCoherenceTestCase(FormFixtureTestCase):
+    """ process local caches dropped through the version table """
+
+    def setUp(self):
+        super().setUp()
+        for patcher in (mock.patch('core.cache_coherence.POLL_INTERVAL_MS', 0),
+                        mock.patch('core.cache_coherence._polled', False),
+                        mock.patch.dict('core.cache_coherence._known_versions', clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_other_process_invalidation(self):
+        CacheVersion.objects.get_or_create(name=AUTH)
+        check_versions()
+        self.assertTrue(local_tokens.keys())
+
+        # the version bumped by another process, its on_commit hook never runs here
+        CacheVersion.objects.filter(name=AUTH).update(version=F('version') + 1)
+        check_versions()
+        self.assertEqual(local_tokens.keys(), [])
+
+    def test_other_process_first_invalidation(self):
+        CacheVersion.objects.filter(name=AUTH).delete()
+        check_versions()
+        self.assertTrue(local_tokens.keys())
+
+        # the first invalidation of the group by another process creates its row
+        CacheVersion.objects.create(name=AUTH, version=1)
+        check_versions()
+        self.assertEqual(local_tokens.keys(), [])
+
+    def test_structure_change_skips_version_table(self):
+        versions = list(CacheVersion.objects.values_list('name', 'version'))
+        SubForm.objects.create(template=self.template, title="second page", order=1)
+        self.assertEqual(list(CacheVersion.objects.values_list('name', 'version')), versions)
+
+
+class UserTokenTestCase(FormFixtureTestCase):
+    """ tokens issued with the user """
+
+    def test_token_issued_on_create(self):
+        response = self.client.post('/api/v1/user-profile/create/', {'user': {'username': 'new', 'password': 'password'}},
+                                    format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        key = Token.objects.get(user__username='new').key
+        self.assertEqual(response.data['token'], key)
+
+        self.client.credentials()
+        response = self.client.post('/api/v1/auth/', {'username': 'new', 'password': 'password'}, format='json')
+        self.assertEqual(response.data['token'], key)
+
+    def test_token_in_user_list(self):
+        # the list leaves out the current user
+        response = self.client.get('/api/v1/user-profile/list/')
+        self.assertEqual([(row['pk'], row['token']) for row in response.data],
+                         [(self.other_profile.pk, Token.objects.get(user=self.other_profile.user).key)])
+
+
+class TokenCacheTestCase(FormFixtureTestCase):
+    """ cached token authentication """
+
+    def test_revoked_token(self):
+        Token.objects.filter(user=self.user).delete()
+        response = self.client.get('/api/v1/element-types/list/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_other_users_keep_cached_tokens(self):
+        key = Token.objects.get(user=self.user).key
+        other = User.objects.get(pk=self.other_profile.user_id)
+        other.set_password("changed")
+        other.save()
+
+        self.assertEqual(local_tokens.keys(), [key])
+        self.assertQueries(0, 'get', '/api/v1/element-types/list/')
+
+    def test_login_keeps_cached_token(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+
+        self.assertQueries(0, 'get', '/api/v1/element-types/list/')
+
+    def test_deactivated_user(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        # queryset updates send no signals, the serializers invalidate explicitly
+        self.assertEqual(self.client.get('/api/v1/element-types/list/').status_code, 200)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.save()
+        self.assertEqual(self.client.get('/api/v1/element-types/list/').status_code, 401)
+
+    def test_other_process_invalidation(self):
+        for patcher in (mock.patch('core.cache_coherence.POLL_INTERVAL_MS', 0),
+                        mock.patch('core.cache_coherence._polled', False),
+                        mock.patch.dict('core.cache_coherence._known_versions', clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        CacheVersion.objects.get_or_create(name=AUTH)
+        check_versions()
+
+        def invalidate_in_other_process(user_pk):
+            CacheVersion.objects.filter(name=AUTH).update(version=F('version') + 1)
+            CacheInvalidation.objects.create(name=AUTH, version=CacheVersion.objects.get(name=AUTH).version,
+                                             tag=user_tag(user_pk))
+
+        # tags invalidated by another process drop only the entries of that user
+        invalidate_in_other_process(self.other_profile.user_id)
+        check_versions()
+        self.assertTrue(local_tokens.keys())
+
+        invalidate_in_other_process(self.user.pk)
+        check_versions()
+        self.assertEqual(local_tokens.keys(), [])
+
+
+class BasicCredentialCacheTestCase(FormFixtureTestCase):
+    """ cached basic authentication """
+
+    def setUp(self):
+        super().setUp()
+        self.use_password('password')
+        self.assertEqual(self.client.get('/api/v1/element-types/list/').status_code, 200)
+
+    def use_password(self, password):
+        credentials = base64.b64encode(('admin:%s' % password).encode()).decode()
+        self.client.credentials(HTTP_AUTHORIZATION='Basic ' + credentials)
+
+    def test_cached_credentials(self):
+        self.assertQueries(0, 'get', '/api/v1/element-types/list/')
+
+    def test_password_change(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('changed')
+        user.save()
+
+        self.assertEqual(self.client.get('/api/v1/element-types/list/').status_code, 401)
+        self.use_password('changed')
+        self.assertEqual(self.client.get('/api/v1/element-types/list/').status_code, 200)
+
+    def test_other_users_keep_cached_credentials(self):
+        other = User.objects.get(pk=self.other_profile.user_id)
+        other.set_password('changed')
+        other.save()
+
+        self.assertQueries(0, 'get', '/api/v1/element-types/list/')
+
+
+class BulkDataTestCase(FormFixtureTestCase):
+    """ options added in bulk """
+
+    def add_data(self, data):
+        response = self.client.post('/api/v1/element/select/%d/add/data/bulk/' % self.select.pk, data, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response
+
+    def get_options(self):
+        return list(self.select.data.order_by('pk').values_list('value', 'display'))
+
+    def test_add_csv(self):
+        response = self.add_data({'csv': "c,C\n\nd\n"})
+        self.assertEqual([(row['value'], row['display']) for row in response.data], [('c', 'C'), ('d', 'd')])
+        self.assertEqual(self.get_options(), [('a', 'A'), ('b', 'B'), ('c', 'C'), ('d', 'd')])
+
+    def test_replace(self):
+        # options shared with another element are kept, the others are deleted
+        self.checkbox.data.add(self.data)
+        self.add_data({'options': [{'value': 'x', 'display': 'X'}], 'replace': True})
+
+        self.assertEqual(self.get_options(), [('x', 'X')])
+        self.assertEqual(list(Data.objects.filter(value__in=['a', 'b']).values_list('pk', flat=True)), [self.data.pk])
+
+    def test_options_and_csv(self):
+        response = self.client.post('/api/v1/element/select/%d/add/data/bulk/' % self.select.pk,
+                                    {'csv': "c", 'options': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get_options(), [('a', 'A'), ('b', 'B')])
+
+
+class BatchTestCase(FormFixtureTestCase):
+    """ operations of the batch endpoint """
+
+    def run_batch(self, operations, status=200):
+        response = self.client.post('/api/v1/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status, response.data)
+        return response.json()
+
+    def test_references(self):
+        results = self.run_batch([
+            {'op': 'sub_form.create', 'id': 'sub_form', 'data': {'template': self.template.pk, 'title': "new"}},
+            {'op': 'field.create', 'data': {'sub_form': {'$ref': 'sub_form'}, 'title': "new"}},
+            {'op': 'element.create', 'type': 'select', 'data': {'field': {'$ref': 1}, 'title': "new"}},
+        ])['results']
+
+        sub_form = SubForm.objects.get(pk=results[0]['result']['pk'])
+        field = Field.objects.get(pk=results[1]['result']['pk'])
+        select = SelectElement.objects.get(pk=results[2]['result']['pk'])
+        self.assertEqual((field.sub_form_id, select.field_id), (sub_form.pk, field.pk))
+
+    def assertRolledBack(self, operations, index):
+        sub_forms = SubForm.objects.count()
+        errors = self.run_batch([{'op': 'sub_form.create', 'data': {'template': self.template.pk, 'title': "new"}}]
+                                + operations, status=400)
+
+        self.assertEqual(errors['index'], str(index))
+        self.assertEqual(SubForm.objects.count(), sub_forms)
+
+    def test_unknown_reference(self):
+        self.assertRolledBack([{'op': 'field.create', 'data': {'sub_form': {'$ref': 'missing'}, 'title': "new"}}], 1)
+
+    def test_missing_object(self):
+        self.assertRolledBack([{'op': 'element.condition', 'type': 'select', 'pk': 0, 'data': {}}], 1)
+
+    def test_missing_object_in_orders(self):
+        self.assertRolledBack([{'op': 'element.set_orders',
+                                'data': {'elements_data': [{'type': 'select', 'pk': 0, 'order': 1}]}}], 1)
+
+    def test_database_errors(self):
+        def failing_operation(error):
+            def handler(request, operation):
+                raise error
+            return handler
+
+        for error in (IntegrityError("duplicate key"), DjangoValidationError({'order': ["invalid"]})):
+            with mock.patch.dict(batch_operations, {'test.fail': failing_operation(error)}):
+                self.assertRolledBack([{'op': 'test.fail'}], 1)
+
+
+class FormVariantTestCase(FormFixtureTestCase):
+    """ representations of the same template and form versions """
+
+    def test_paginated_template_sent_whole(self):
+        Template.objects.filter(pk=self.template.pk).update(is_paginated=True)
+        SubForm.objects.create(template=self.template, title="second page", order=1)
+
+        for url in ('/api/v1/template/%d/' % self.template.pk, '/api/v1/form/%d/' % self.form.pk):
+            self.assertEqual(len(self.client.get(url).json()['sub_forms']), 2)
+            self.assertEqual(len(self.client.get(url, {'page': 2}).json()['sub_forms']), 1)
+
+    def get_elements(self, url, **params):
+        response = self.client.get(url, params)
+        # the form payload holds sub forms, the sub form payload its fields
+        data = response.json()
+        fields = data['sub_forms'][0]['fields'] if 'sub_forms' in data else data['fields']
+        return response['ETag'], [element['title'] for element in fields[0]['elements']]
+
+    def test_prune_hidden(self):
+        SelectElement.objects.filter(form=self.form, answer_of=self.select).update(value="b")
+
+        for url in ('/api/v1/form/%d/' % self.form.pk,
+                    '/api/v1/form/%d/sub-form/%d/' % (self.form.pk, self.sub_form.pk)):
+            etag, elements = self.get_elements(url)
+            pruned_etag, pruned_elements = self.get_elements(url, prune_hidden='true')
+
+            self.assertNotEqual(etag, pruned_etag)
+            self.assertEqual(elements, ["select", "integer", "checkbox"])
+            self.assertEqual(pruned_elements, ["select", "checkbox"])
+
+    def test_fieldset_variant(self):
+        url = '/api/v1/template/%d/' % self.template.pk
+        etag = self.client.get(url, {'fields': 'pk,value'})['ETag']
+
+        # the keys are sorted and hashed, never copied into the etag
+        self.assertEqual(self.client.get(url, {'fields': ' value , pk'})['ETag'], etag)
+        self.assertNotIn('value', etag)
+        self.assertNotEqual(self.client.get(url, {'fields': 'pk'})['ETag'], etag)
+
+        response = self.client.get(url, {'fields': 'pk,"%s"' % ("x" * 1000)})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(url, {'omit': 'bogus'}).status_code, 400)
+
+
+class FormFilterTestCase(FormFixtureTestCase):
+    """ answers of the forms matched by the filter endpoint """
+
+    def test_many_forms(self):
+        # a pk list of this many forms, repeated for every element table, exceeds the bind parameter limit of sqlite
+        forms = Form.objects.bulk_create([Form(template=self.template, filler=self.user_profile, description=str(i))
+                                          for i in range(3000)])
+        forms = Form.objects.filter(template=self.template).exclude(pk=self.form.pk).order_by('pk')
+        SelectElement.objects.bulk_create([SelectElement(answer_of=self.select, form=form, value="b")
+                                           for form in forms])
+
+        if connection.vendor == 'sqlite':
+            # the default limit of sqlite builds, some distributions raise it
+            connection.ensure_connection()
+            limit = connection.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 32766)
+            self.addCleanup(connection.connection.setlimit, sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
+
+        response = self.client.post('/api/v1/template/%d/filter/' % self.template.pk,
+                                    {'query': {}, 'elements': []}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3001)
+
+        select = 'select_%d' % self.select.pk
+        self.assertEqual([row[select] for row in response.data].count("b"), 3000)
+
+
+@override_settings(ELEMENT_STORAGE="single_table")
+class SingleTableTestCase(FormFixtureTestCase):
+    """ the single element table kept in step with the element tables """
+
+    def setUp(self):
+        super().setUp()
+        copy_elements()
+
+    def test_moved_element(self):
+        field = Field.objects.create(sub_form=self.sub_form, title="second field", order=1)
+        response = self.client.put('/api/v1/element/select/%d/update-retrieve/' % self.select.pk,
+                                   {'title': "select", 'order': 0, 'field': field.pk, 'data': []}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        # the answers are found by the field of their template element
+        answers = get_form_answers(Form.objects.get(pk=self.form.pk), answer_of__field=field)
+        self.assertEqual(answers, {('select', self.select.pk): "a"})
+        self.assertEqual(compare_storages(), {})
+
+    def test_sync_existing_rows(self):
+        select = SelectElement.objects.get(pk=self.select.pk)
+        select.title = "renamed"
+        sync_elements(SelectElement, [select])
+        sync_elements(SelectElement, [select])
+
+        rows = UnifiedElement.objects.filter(element_type='select', element_pk=self.select.pk)
+        self.assertEqual([row.title for row in rows], ["renamed"])
+
+
+@override_settings(ANSWER_STORAGE="document")
+class AnswerDocumentTestCase(FormFixtureTestCase):
+    """ answers documents written in place by the database """
+
+    def setUp(self):
+        super().setUp()
+        build_documents(Form.objects.all())
+
+    def get_document(self):
+        return Form.objects.get(pk=self.form.pk).answers
+
+    def test_set_value(self):
+        # a key written by a concurrent request is kept
+        Form.objects.filter(pk=self.form.pk).update(answers=dict(self.get_document(), other=1))
+
+        response = self.client.put('/api/v1/form/%d/set-value/checkbox/%d/' % (self.form.pk, self.checkbox.pk),
+                                   {'values': [{'value': 'y'}]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        document = self.get_document()
+        self.assertEqual([value['value'] for value in document['checkbox%d' % self.checkbox.pk]], ['y'])
+        self.assertEqual((document['select%d' % self.select.pk], document['other']), ("a", 1))
+
+    def test_update_answer(self):
+        answers_version = Form.objects.get(pk=self.form.pk).answers_version
+        answer = SelectElement.objects.get(form=self.form, answer_of=self.select)
+        response = self.client.put('/api/v1/element/select/%d/update-retrieve/' % answer.pk,
+                                   {'title': "select", 'order': 0, 'value': 'b', 'data': []}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        form = Form.objects.get(pk=self.form.pk)
+        self.assertEqual((form.answers['select%d' % self.select.pk], form.answers_version), ("b", answers_version + 1))
+
+    def test_delete_answer(self):
+        answer = SelectElement.objects.get(form=self.form, answer_of=self.select)
+        response = self.client.delete('/api/v1/element/select/%d/update-retrieve/' % answer.pk)
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(set(self.get_document()), {'int%d' % self.integer.pk, 'checkbox%d' % self.checkbox.pk})
+
+    def test_form_update_keeps_document(self):
+        form = Form.objects.get(pk=self.form.pk)
+        Form.objects.filter(pk=self.form.pk).update(answers={})
+
+        serializer = FormRetrieveSerializer(form, data={'description': "renamed"}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        self.assertEqual(self.get_document(), {})
+
+
+class TextSearchTestCase(FormFixtureTestCase):
+    """ the search filter matches whole words with the text search indexes and without them """
+
+    def setUp(self):
+        super().setUp()
+        self.text = Input.objects.create(field=self.field, title="text", order=3)
+        Input.objects.create(answer_of=self.text, form=self.form, value="the quick fox, jumps")
+        self.other_form = Form.objects.create(template=self.template, filler=self.user_profile, description="other")
+        Input.objects.create(answer_of=self.text, form=self.other_form, value="quickly foxes")
+
+    def search(self, text):
+        return set(Form.objects.filter(search_q(Input, Input.related_name_to_form(), text))
+                   .values_list('description', flat=True))
+
+    def test_search(self):
+        self.assertEqual(self.search("fox quick"), {self.form.description})
+        self.assertEqual(self.search("FOX"), {self.form.description})
+        self.assertEqual(self.search("fox,"), {self.form.description})
+        self.assertEqual(self.search("foxes"), {"other"})
+        self.assertEqual(self.search("fo"), set())
+
+    def test_search_without_index(self):
+        with mock.patch('core.text_search.get_search_pks', return_value=None):
+            self.test_search()
+
+    def test_create_fts_triggers(self):
+        # the sqlite schema editor can not be opened inside the test transaction, the helpers only execute sql
+        text_search = importlib.import_module('core.migrations.0057_text_search')
+        with connection.cursor() as cursor:
+            text_search.drop_fts_triggers(cursor, 'core_input')
+        answer = Input.objects.get(form=self.other_form)
+        answer.value = "lazy dog"
+        answer.save()
+        self.assertEqual(self.search("dog"), set())
+
+        with connection.cursor() as cursor:
+            text_search.create_fts_triggers(cursor, 'core_input')
+        self.assertEqual(self.search("dog"), {"other"})
+
+        answer.value = "lazy cat"
+        answer.save()
+        self.assertEqual((self.search("dog"), self.search("cat")), (set(), {"other"}))
@@ -0,0 +1,72 @@
+import operator
+import re
+from functools import reduce
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework import serializers
+
+from core.element_types import INPUT, TEXTAREA
+
+# filter name of the full text search over text answers
+SEARCH = "search"
+
+# element types whose answer tables have text search indexes, see migration 0057
+text_search_types = [INPUT, TEXTAREA]
+
+
+# a word is a run of letters, digits and underscores, like the tokens of the text search indexes
+word_pattern = re.compile(r'\w+')
+
+
+def get_words(text):
+    return word_pattern.findall(text or "")
+
+
+def get_word_regex(word):
+    """ regex matching the word as a whole token, words never hold regex special characters """
+    return r'(^|\W)%s(\W|$)' % word
+
+
+def get_fts5_query(words):
+    """ every word quoted, FTS5 matches rows containing all of them """
+    return " ".join('"%s"' % word.replace('"', '""') for word in words)
+
+
+def get_search_pks(_Element, words):
+    """
+    subquery of the pks of the elements whose value contains all the given words,
+    None when the database has no text search index
+    """
+    table = _Element._meta.db_table
+
+    if connection.vendor == 'postgresql':
+        return RawSQL("SELECT id FROM %s WHERE to_tsvector('simple', coalesce(value, '')) "
+                      "@@ plainto_tsquery('simple', %%s)" % table, [" ".join(words)])
+
+    if connection.vendor == 'sqlite':
+        return RawSQL("SELECT rowid FROM %s_fts WHERE %s_fts MATCH %%s" % (table, table), [get_fts5_query(words)])
+
+    return None
+
+
+def search_q(_Element, field_name, text):
+    """
+    Q expression matching the elements whose value contains all the words of text,
+    field_name is the path to the elements (Ex. answers_input),
+    other databases match each word as a whole token with iregex, the same as the text search indexes
+    """
+    if _Element.type not in text_search_types:
+        raise serializers.ValidationError({'filter': "%s elements can not be searched" % _Element.type})
+
+    words = get_words(text)
+    if not words:
+        return Q()
+
+    pks = get_search_pks(_Element, words)
+    if pks is None:
+        return reduce(operator.and_, (Q(**{"%s__value__iregex" % field_name: get_word_regex(word)})
+                                      for word in words))
+
+    return Q(**{"%s__pk__in" % field_name: pks})
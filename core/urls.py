@@ -2,8 +2,12 @@ from django.urls import path
 from core.views.form_views import RetrieveSubFormView, CreateRawSubForm, AddFieldToSubForm, AddElementToField, \
     ElementTypesList, TemplateRetrieveView, CreateFormFromTemplate, CreateTemplateView, ListTemplatesView, FormsIFilled, \
     FormsOfTemplate, UpdateElement, FormRetrieveView, AnswerElementOfForm, DataRUDView, AddDataView, UpdateField, \
-    FormsOfUserProfile, FormFilterView, TemplateElementListView, FormsListView, SetElementOrders, SetFieldOrders, \
-    ConditionUpdateElement
+    AddDataBulkView, FormsOfUserProfile, FormFilterView, TemplateElementListView, FormsListView, SetElementOrders, \
+    SetFieldOrders, ConditionUpdateElement, FormExportXlsxView, FormExportCsvView, TemplateStatisticsView, \
+    TemplateStatisticsSummaryView, FormVisibilityView, AddElementsToField, TemplateOutlineView, FormOutlineView, \
+    FormSubFormRetrieveView, ElementTypesMetadata
+from core.views.batch_views import BatchView
+from core.views.export_views import CreateExportJobView, ExportJobRetrieveView, ExportJobDownloadView
 from core.views.user_profile_views import CreateUserProfileView, MyUserProfileInfo, UserProfileInfo, UserProfileList, \
     AuthToken
 
@@ -19,9 +23,22 @@ urlpatterns = [
     path('template/create/', CreateTemplateView.as_view()),
     path('template/<int:template_id>/', TemplateRetrieveView.as_view()),
     path('template/<int:template_id>/elements/list/', TemplateElementListView.as_view()),
+    path('template/<int:template_id>/outline/', TemplateOutlineView.as_view()),
     
     path('form/<int:form_id>/', FormRetrieveView.as_view()),
+    path('form/<int:form_id>/outline/', FormOutlineView.as_view()),
+    path('form/<int:form_id>/sub-form/<int:sub_form_id>/', FormSubFormRetrieveView.as_view()),
+    path('form/<int:form_id>/visibility/', FormVisibilityView.as_view()),
     path('template/<int:template_id>/filter/', FormFilterView.as_view()),
+    path('template/<int:template_id>/stats/', TemplateStatisticsView.as_view()),
+    path('template/<int:template_id>/stats/summary/', TemplateStatisticsSummaryView.as_view()),
+    path('template/<int:template_id>/export/xlsx/', FormExportXlsxView.as_view()),
+    path('template/<int:template_id>/export/csv/', FormExportCsvView.as_view()),
+
+    # background exports
+    path('export-job/create/', CreateExportJobView.as_view()),
+    path('export-job/<int:job_id>/', ExportJobRetrieveView.as_view()),
+    path('export-job/<int:job_id>/download/', ExportJobDownloadView.as_view()),
 
     path('create-form-from-template/', CreateFormFromTemplate.as_view()),
     path('form/<int:form_id>/set-value/<element_type>/<int:element_id>/', AnswerElementOfForm.as_view()),
@@ -43,16 +60,22 @@ urlpatterns = [
     path('field/create/', AddFieldToSubForm.as_view()),  # create field for todo: template
     path('field/<int:field_id>/', UpdateField.as_view()),  # update a todo: templates field
 
+    path('field/<int:field_id>/elements/create/', AddElementsToField.as_view()),
     path('element/<element_type>/create/', AddElementToField.as_view()),  # create element for todo: template
     path('element/<element_type>/<int:element_id>/update-retrieve/', UpdateElement.as_view()),
     path('element/<element_type>/<int:element_id>/condition/update/', ConditionUpdateElement.as_view()),
     path('element/<element_type>/<int:element_id>/add/data/', AddDataView.as_view()),
+    path('element/<element_type>/<int:element_id>/add/data/bulk/', AddDataBulkView.as_view()),
     path('data/<int:data_id>/', DataRUDView.as_view()),
     path('element-types/list/', ElementTypesList.as_view()),
+    path('element-types/metadata/', ElementTypesMetadata.as_view()),
 
     path('set-element-orders/', SetElementOrders.as_view()),
     path('set-field-orders/', SetFieldOrders.as_view()),
 
+    # several builder operations in one request
+    path('batch/', BatchView.as_view()),
+
 
 
 ]
@@ -0,0 +1,51 @@
+import hashlib
+
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Template, elements
+
+
+def bump_structure_version(templates):
+    """ mark the structure of the given templates queryset as changed,
+    local caches of template data are keyed or checked by the version and need no invalidation """
+    templates.update(structure_version=F('structure_version') + 1, last_structure_change=timezone.now())
+
+
+def bump_answers_version(forms, **changes):
+    """ mark the answers of the given forms queryset as changed, changes are written by the same update """
+    forms.update(answers_version=F('answers_version') + 1, last_change_date=timezone.now(), **changes)
+
+
+def templates_of_data(data_pk):
+    """ templates whose elements use the given Data object """
+    template_pks = set()
+    for _Element in elements.values():
+        template_pks.update(_Element.objects.filter(data=data_pk, field__isnull=False)
+                            .values_list('field__sub_form__template_id', flat=True))
+    return Template.objects.filter(pk__in=template_pks)
+
+
+def get_profiles_tag(profiles):
+    """ etag part of the given serialized user profiles, profiles have no version of their own """
+    if not profiles:
+        return ""
+    return "-" + hashlib.sha1(JSONRenderer().render(profiles)).hexdigest()[:12]
+
+
+def get_template_version_tag(template, forms_count, variant=None, profiles=None):
+    """ etag and last modified date of the template payload, variant tells representations apart (Ex. pages),
+    profiles are the serialized user profiles in the payload """
+    etag = '"template-%d-%d-%d%s%s"' % (template.pk, template.structure_version, forms_count,
+                                        get_profiles_tag(profiles), "-%s" % variant if variant else "")
+    return etag, template.last_structure_change
+
+
+def get_form_version_tag(form, forms_count, variant=None, profiles=None):
+    """ etag and last modified date of the form payload, the template structure is included """
+    etag = '"form-%d-%d-%s-%d-%d%s%s"' % (form.pk, form.answers_version, form.last_change_date.timestamp(),
+                                          form.template.structure_version, forms_count,
+                                          get_profiles_tag(profiles), "-%s" % variant if variant else "")
+    last_modified = max(filter(None, [form.last_change_date, form.template.last_structure_change]))
+    return etag, last_modified
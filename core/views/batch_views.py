@@ -0,0 +1,18 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.batch import run_batch
+from core.permissions import IsLoggedIn, IsSuperuser
+from core.serializers.BatchSerializers.batch_serializers import BatchSerializer
+
+
+class BatchView(APIView):
+    """ Run a list of template builder operations in one request and one transaction """
+    permission_classes = [IsLoggedIn, IsSuperuser]
+    serializer_class = BatchSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return Response({'results': run_batch(request, serializer.validated_data.get('operations'))})
@@ -0,0 +1,50 @@
+from django.http import FileResponse
+from rest_framework.generics import CreateAPIView, RetrieveAPIView, get_object_or_404
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.models import ExportJob
+from core.permissions import IsLoggedIn
+from core.serializers.ExportSerializers.export_serializers import ExportJobSerializer
+
+
+def get_export_jobs(request):
+    """ super users see all jobs, other users only see their own jobs """
+    if request.user.is_superuser:
+        return ExportJob.objects.all()
+    return ExportJob.objects.filter(creator=request.user.user_profile)
+
+
+class CreateExportJobView(CreateAPIView):
+    """Queue an export of the forms matching the given query"""
+    permission_classes = [IsLoggedIn, ]
+    serializer_class = ExportJobSerializer
+
+    def perform_create(self, serializer):
+        serializer.save(creator=self.request.user.user_profile)
+
+
+class ExportJobRetrieveView(RetrieveAPIView):
+    """Status and progress of an export job"""
+    permission_classes = [IsLoggedIn, ]
+    serializer_class = ExportJobSerializer
+
+    lookup_field = 'pk'
+    lookup_url_kwarg = 'job_id'
+
+    def get_queryset(self):
+        return get_export_jobs(self.request)
+
+
+class ExportJobDownloadView(APIView):
+    """Download the file of a finished export job"""
+    permission_classes = [IsLoggedIn, ]
+
+    def get(self, request, *args, **kwargs):
+        job = get_object_or_404(get_export_jobs(request), pk=self.kwargs.get('job_id'))
+
+        if job.status != ExportJob.DONE:
+            return Response({'detail': "export job is %s" % job.status}, status=400)
+
+        return FileResponse(job.file.open('rb'), as_attachment=True,
+                            filename="template_%d.%s" % (job.template_id, job.file_format))
@@ -1,32 +1,103 @@
-import operator
-from functools import reduce
+import tempfile
 
-from django.db.models import Q
+from django.db import transaction
+from django.http import FileResponse, StreamingHttpResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from rest_framework.generics import RetrieveAPIView, CreateAPIView, RetrieveUpdateDestroyAPIView, get_object_or_404, \
     ListAPIView, RetrieveUpdateAPIView, UpdateAPIView, GenericAPIView
+from rest_framework.exceptions import NotFound
 from rest_framework.mixins import CreateModelMixin
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core.condition_graph import get_form_visibility, get_visibility_delta
+from core.answer_documents import get_form_answers, is_document_storage
+from core.element_query import all_elements
+from core.element_metadata import get_element_types_metadata, get_element_types_version_tag
 from core.element_types import element_types
+from core.form_export import get_export_elements, get_export_header, iter_export_rows, write_xlsx, iter_csv, \
+    get_template_elements
+from core.bulk import add_options
+from core.answer_counters import get_template_counter_summary, get_answer_values, mark_counters_stale
+from core.answer_statistics import get_template_statistics
+from core.form_query import filter_forms
 from core.permissions import IsLoggedIn, IsSuperuser
-from core.serializers.FormSerializers.common_serializers import CharFieldSerializer, ElementsSetOrder, FieldsSetOrder
+from core.serializers.FormSerializers.common_serializers import DataSerializer, ElementsSetOrder, FieldsSetOrder, \
+    BulkDataSerializer
 from core.serializers.FormSerializers.create_serializers import SubFormRawCreateSerializer, FieldRawCreateSerializer, \
     TemplateRawCreateSerializer, FormCreateSerializer, get_create_serializer, get_update_serializer, \
-    get_set_value_serializer, get_raw_converter_serializer, get_condition_update_serializer
+    get_set_value_serializer, get_condition_update_serializer, \
+    FieldElementsCreateSerializer
 from core.serializers.FormSerializers.retreive_serializers import SubFormRetrieveSerializer, TemplateRetrieveSerializer, \
     FormRetrieveSerializer, get_retrieve_serializer, FormSimpleRetrieveSerializer, FormFilterSerializer, \
-    TemplateSimpleRetrieveSerializer
-from core.models import SubForm, Template, elements, Form, Field, DateElement
+    TemplateSimpleRetrieveSerializer, StatisticsFilterSerializer, TemplateOutlineSerializer, \
+    SubFormAnswerRetrieveSerializer
+from core.serializers.UserProfileSerializer.user_profile_serializers import UserProfilePublicRetrieve
+from core.models import SubForm, Template, elements, Form, Field, Data
 from django_filters.rest_framework import DjangoFilterBackend
 
-from core.sub_form_fields import get_related_attrs
+from core.template_structure import get_structure_elements
+from core.template_cache import get_template_payload
+from core.sparse_fields import get_element_fieldset, get_fieldset_variant
+from core.template_pages import get_requested_page, get_page_context, get_page_variant
+from core.versions import get_template_version_tag, get_form_version_tag
 
 from django.utils import timezone
 
 
-class RetrieveSubFormView(RetrieveUpdateDestroyAPIView):
+class ConditionalRetrieveMixin:
+    """
+    Answer GET requests with 304 Not Modified before any serializer runs
+    when the client already has the current version of the object
+    """
+
+    def get_version_tag(self, instance):
+        """ return (etag, last modified datetime or None) of the instance """
+        raise NotImplementedError
+
+    def retrieve_instance(self, request, instance):
+        return Response(self.get_serializer(instance).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+
+        etag, last_modified = self.get_version_tag(instance)
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = self.retrieve_instance(request, instance)
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class ElementFieldsetMixin:
+    """ pass the ?fields= and ?omit= element keys of the request to the serializers """
+
+    def get_serializer_context(self):
+        context = super(ElementFieldsetMixin, self).get_serializer_context()
+        context['element_fieldset'] = get_element_fieldset(self.request)
+        return context
+
+
+def get_prune_hidden(request):
+    """ ?prune_hidden=true leaves out sub forms, fields and elements hidden by their conditions """
+    return request.query_params.get('prune_hidden') in ('1', 'true')
+
+
+def get_payload_variant(page, fieldset, prune_hidden=False):
+    """ cache key and etag part of a page, element fieldset and pruning """
+    return ":".join(filter(None, [get_page_variant(page), get_fieldset_variant(fieldset),
+                                  "pruned" if prune_hidden else None]))
+
+
+class RetrieveSubFormView(ElementFieldsetMixin, RetrieveUpdateDestroyAPIView):
     """Retrieve basic sub form info with fields data"""
     serializer_class = SubFormRetrieveSerializer
     queryset = SubForm.objects.all()
@@ -35,15 +106,45 @@ class RetrieveSubFormView(RetrieveUpdateDestroyAPIView):
     lookup_url_kwarg = 'sub_form_id'
 
 
-class TemplateRetrieveView(RetrieveUpdateDestroyAPIView):
+class TemplateRetrieveView(ElementFieldsetMixin, ConditionalRetrieveMixin, RetrieveUpdateDestroyAPIView):
     """RUD template"""
     permission_classes = [IsLoggedIn, IsSuperuser]
     serializer_class = TemplateRetrieveSerializer
-    queryset = Template.objects.all()
+    queryset = Template.objects.select_related('creator__user')
 
     lookup_field = 'pk'
     lookup_url_kwarg = 'template_id'
 
+    def get_version_tag(self, instance):
+        # the count and the creator change without the structure version, they are added to the cached payload
+        self.head = {'forms_count': instance.forms_count,
+                     'creator': UserProfilePublicRetrieve(instance.creator).data}
+
+        # paginated templates only send the requested page
+        self.page = get_requested_page(self.request, instance)
+        self.variant = get_payload_variant(self.page, get_element_fieldset(self.request))
+        return get_template_version_tag(instance, self.head['forms_count'], self.variant, [self.head['creator']])
+
+    def render_payload(self, instance):
+        context = self.get_serializer_context()
+        context.update(get_page_context(instance, self.page))
+        return self.get_serializer_class()(instance, context=context).data
+
+    def retrieve_instance(self, request, instance):
+        body, compressed = get_template_payload(instance, self.head,
+                                                lambda: self.render_payload(instance),
+                                                self.variant)
+
+        # payloads are identical for all users, send the precompressed copy if the client accepts it
+        if compressed is not None and 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(compressed, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(body, content_type='application/json')
+
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
 
 class TemplateElementListView(APIView):
     """RUD template"""
@@ -53,25 +154,108 @@ class TemplateElementListView(APIView):
         elements_data = []
         template = get_object_or_404(Template, pk=self.kwargs.get('template_id'))
 
-        for sub_form in template.sub_forms.all():
-            for field in sub_form.fields.all():
-                for element in get_related_attrs(field):
-                    _Serializer = get_retrieve_serializer(element.type)
-                    el_data = _Serializer(instance=element).data
-                    elements_data.append(el_data)
+        # only the keys asked by ?fields= and ?omit= are computed
+        fieldset = get_element_fieldset(request)
+        context = {'element_fieldset': fieldset}
+
+        # the whole structure is loaded with one query per table
+        for element in get_structure_elements(template, with_data=fieldset.keeps('data')):
+            _Serializer = get_retrieve_serializer(element.type)
+            el_data = _Serializer(instance=element, context=context).data
+            elements_data.append(el_data)
 
         return Response(elements_data)
 
 
-class FormRetrieveView(RetrieveUpdateDestroyAPIView):
-    """RUD Form"""
+class FormRetrieveView(ElementFieldsetMixin, ConditionalRetrieveMixin, RetrieveUpdateDestroyAPIView):
+    """RUD Form,
+    sub forms, fields and elements hidden by their conditions are left out with ?prune_hidden=true"""
     permission_classes = [IsLoggedIn, ]
     serializer_class = FormRetrieveSerializer
-    queryset = Form.objects.all()
+    queryset = Form.objects.select_related('template__creator__user', 'filler__user')
 
     lookup_field = 'pk'
     lookup_url_kwarg = 'form_id'
 
+    def get_version_tag(self, instance):
+        # the filler and the template creator change without the form or the template
+        profiles = UserProfilePublicRetrieve([instance.filler, instance.template.creator], many=True).data
+
+        # paginated templates only send the requested page
+        self.page = get_requested_page(self.request, instance.template)
+        return get_form_version_tag(instance, instance.template.forms_count,
+                                    get_payload_variant(self.page, get_element_fieldset(self.request),
+                                                        get_prune_hidden(self.request)), profiles)
+
+    def retrieve_instance(self, request, instance):
+        context = self.get_serializer_context()
+        context.update(get_page_context(instance.template, self.page))
+        if get_prune_hidden(request):
+            graph, context['visibility'] = get_form_visibility(instance)
+
+        serializer = self.get_serializer_class()(instance, context=context)
+        return Response(serializer.data)
+
+
+class TemplateOutlineView(RetrieveAPIView):
+    """Template info with its sub forms (pages) but without fields and elements"""
+    permission_classes = [IsLoggedIn, ]
+    serializer_class = TemplateOutlineSerializer
+    queryset = Template.objects.all()
+
+    lookup_field = 'pk'
+    lookup_url_kwarg = 'template_id'
+
+
+class FormOutlineView(APIView):
+    """Form info with the pages of its template and the pages visible with the current answers"""
+    permission_classes = [IsLoggedIn, ]
+
+    def get(self, request, *args, **kwargs):
+        form = get_object_or_404(Form.objects.select_related('template'), pk=self.kwargs.get('form_id'))
+        graph, visibility = get_form_visibility(form)
+
+        return Response({'pk': form.pk,
+                         'description': form.description,
+                         'fork_date': form.fork_date,
+                         'template': TemplateOutlineSerializer(form.template).data,
+                         'visible_sub_forms': graph.visible_set(visibility)['sub_forms']})
+
+
+class FormSubFormRetrieveView(ConditionalRetrieveMixin, RetrieveAPIView):
+    """One sub form (page) of a form with its fields and answers,
+    hidden fields and elements are left out with ?prune_hidden=true"""
+    permission_classes = [IsLoggedIn, ]
+    serializer_class = SubFormAnswerRetrieveSerializer
+
+    def get_object(self):
+        self.form = get_object_or_404(Form.objects.select_related('template'), pk=self.kwargs.get('form_id'))
+        return get_object_or_404(SubForm, pk=self.kwargs.get('sub_form_id'), template_id=self.form.template_id)
+
+    def get_version_tag(self, instance):
+        return get_form_version_tag(self.form, self.form.template.forms_count,
+                                    ":".join(filter(None, ["sub-form-%d" % instance.pk,
+                                                           get_payload_variant(None, get_element_fieldset(self.request),
+                                                                               get_prune_hidden(self.request))])))
+
+    def retrieve_instance(self, request, instance):
+        context = {'form': self.form, 'visibility': None, 'element_fieldset': get_element_fieldset(request),
+                   'answers': get_form_answers(self.form, answer_of__field__sub_form=instance)}
+        if get_prune_hidden(request):
+            graph, context['visibility'] = get_form_visibility(self.form)
+
+        return Response(self.get_serializer_class()(instance, context=context).data)
+
+
+class FormVisibilityView(APIView):
+    """Visible sub forms, fields and elements of a form based on its answers"""
+    permission_classes = [IsLoggedIn, ]
+
+    def get(self, request, *args, **kwargs):
+        form = get_object_or_404(Form.objects.select_related('template'), pk=self.kwargs.get('form_id'))
+        graph, visibility = get_form_visibility(form)
+        return Response(graph.visible_set(visibility))
+
 
 class CreateFormFromTemplate(CreateAPIView):
     """Create a new form from the given template form,
@@ -94,12 +278,25 @@ class AnswerElementOfForm(UpdateAPIView):
         """Get serializer based on filed type"""
         return get_set_value_serializer(self.kwargs.get('element_type'))
 
+    def update(self, request, *args, **kwargs):
+        response = super(AnswerElementOfForm, self).update(request, *args, **kwargs)
+
+        # sub forms, fields and elements shown or hidden by the new answer
+        response.data['visibility_delta'] = self.visibility_delta
+        return response
+
     def perform_update(self, serializer):
-        serializer.save()
+        old_values = get_answer_values(serializer.instance)
+
+        answer = serializer.save()
         form = get_object_or_404(Form, pk=self.kwargs.get('form_id'))
         form.fork_date = timezone.now()
         form.save()
 
+        if answer.value_field != 'values':
+            old_values = old_values[0] if old_values else None
+        self.visibility_delta = get_visibility_delta(form, answer.type, answer.answer_of_id, old_values)
+
     def get_object(self):
         kwargs = self.kwargs
 
@@ -184,7 +381,8 @@ class FormsIFilled(ListAPIView):
     serializer_class = FormSimpleRetrieveSerializer
     filter_backends = [DjangoFilterBackend, ]
 
-    filterset_fields = ['template', 'description']
+    # ?description__icontains= is served by a trigram index on PostgreSQL
+    filterset_fields = {'template': ['exact'], 'description': ['exact', 'icontains']}
 
     def get_queryset(self):
         return Form.objects.filter(filler=self.request.user.user_profile)
@@ -234,7 +432,27 @@ class AddElementToField(CreateAPIView):
         return get_create_serializer(self.kwargs.get('element_type'))
 
 
-class UpdateElement(RetrieveUpdateDestroyAPIView):
+class AddElementsToField(CreateAPIView):
+    """ Add several elements to a field, elements of the same type are inserted together """
+    permission_classes = [IsLoggedIn, IsSuperuser]
+    serializer_class = FieldElementsCreateSerializer
+
+    def get_serializer_context(self):
+        context = super(AddElementsToField, self).get_serializer_context()
+        context['field'] = get_object_or_404(Field, pk=self.kwargs.get('field_id'))
+        return context
+
+
+class ElementDestroyMixin:
+    """ deleting an answer leaves its counters to be rebuilt on the next summary read """
+
+    def perform_destroy(self, instance):
+        if instance.form_id is not None:
+            mark_counters_stale(Form.objects.filter(pk=instance.form_id).values_list('template_id', flat=True))
+        instance.delete()
+
+
+class UpdateElement(ElementDestroyMixin, RetrieveUpdateDestroyAPIView):
     """ Add a field to sub form """
     permission_classes = [IsLoggedIn, IsSuperuser]
 
@@ -247,7 +465,7 @@ class UpdateElement(RetrieveUpdateDestroyAPIView):
                                  pk=self.kwargs.get('element_id'))
 
 
-class ConditionUpdateElement(RetrieveUpdateDestroyAPIView):
+class ConditionUpdateElement(ElementDestroyMixin, RetrieveUpdateDestroyAPIView):
     """ Update element condition fields """
     permission_classes = [IsLoggedIn, IsSuperuser]
 
@@ -263,93 +481,59 @@ class ConditionUpdateElement(RetrieveUpdateDestroyAPIView):
 class AddDataView(CreateAPIView):
     """ Add a data to element"""
     permission_classes = [IsLoggedIn, IsSuperuser]
-    serializer_class = CharFieldSerializer
+    serializer_class = DataSerializer
 
     def perform_create(self, serializer):
-        data = serializer.save()
-
-        # add to element
+        # get the element first so a missing element does not leave an orphan data
         element = get_object_or_404(elements.get(self.kwargs.get('element_type')),
                                     pk=self.kwargs.get('element_id'))
-        element.data.add(data)
 
+        with transaction.atomic():
+            data = serializer.save()
 
-class DataRUDView(RetrieveUpdateAPIView):
-    """RUD data"""
-    permission_classes = [IsLoggedIn, IsSuperuser]
-    serializer_class = CharFieldSerializer
+            # add to element
+            element.data.add(data)
 
 
-class FormFilterView(APIView):
-    """FormFilterView based on the given query"""
+class AddDataBulkView(APIView):
+    """
+    Add many data to element at once, options are given as a json array or csv text
 
-    serializer_class = FormFilterSerializer
+    when replace is set the current data of the element are removed first
+    """
+    permission_classes = [IsLoggedIn, IsSuperuser]
+    serializer_class = BulkDataSerializer
+
+    def post(self, request, *args, **kwargs):
+        _Element = elements.get(self.kwargs.get('element_type'))
+        if _Element is None:
+            raise NotFound("Element with type %s does not exist" % self.kwargs.get('element_type'))
 
-    operator_table = {
-        'and': lambda a, b: a & b,
-        'or': lambda a, b: a | b
-    }
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-    @staticmethod
-    def set_filter_on_field(field, filter_name):
+        element = get_object_or_404(_Element, pk=self.kwargs.get('element_id'))
 
-        if filter_name == '':
-            return field
+        data = add_options(_Element, element, serializer.validated_data.get('options'),
+                           serializer.validated_data.get('replace'))
 
-        return "%s__%s" % (field, filter_name)
+        return Response(DataSerializer(data, many=True).data, status=201)
 
-    def parse_group(self, group):
-        if not group:
-            return Q()
 
-        matchType = group['matchType']
+class DataRUDView(RetrieveUpdateAPIView):
+    """RUD data"""
+    permission_classes = [IsLoggedIn, IsSuperuser]
+    serializer_class = DataSerializer
+    queryset = Data.objects.all()
 
-        val = Q()
+    lookup_field = 'pk'
+    lookup_url_kwarg = 'data_id'
 
-        for rule in group['rules']:
 
-            if rule['qtype'] == 'group':
-                val = self.operator_table[matchType](val, self.parse_group(rule))
-            else:
+class FormFilterView(APIView):
+    """FormFilterView based on the given query"""
 
-                # get element model
-                _Element = elements.get(rule['type'])
-
-                # get value field through related name of the element
-                _related_field_name_value = "%s__%s" % (_Element.related_name_to_form(),
-                                                        _Element.value_field)
-
-                # to insure that the retrieved element answer corresponds to the queried element
-                _relate_filed_name_pk = "%s__answer_of__pk" % _Element.related_name_to_form()
-
-                # serialize the query element, this process converts query json to native types
-                # that can be used in object filtering
-                _Serializer = get_raw_converter_serializer(rule['type'])
-                serializer = _Serializer(data=rule)
-                serializer.is_valid(raise_exception=True)
-                _converted_value = serializer.validated_data.get(_Element.value_field)
-
-                if _Element.value_field == "values":
-                    # clear the _converted_value
-                    _converted_value = [v['value'] for v in _converted_value]
-                    match_Q = reduce(operator.and_,
-                                     (Q(
-                                         **{
-                                             self.set_filter_on_field(_related_field_name_value,
-                                                                      rule['filter']): x
-                                         }
-                                     ) for x in _converted_value))
-                else:
-                    match_Q = Q(**{
-                        self.set_filter_on_field(_related_field_name_value,
-                                                 rule['filter']): _converted_value,
-                    })
-
-                _pk_filter = {
-                    _relate_filed_name_pk: rule['pk']
-                }
-                val = self.operator_table[matchType](val, match_Q & Q(**_pk_filter))
-        return val
+    serializer_class = FormFilterSerializer
 
     def get_queryset(self):
         # serialize request data
@@ -363,11 +547,9 @@ class FormFilterView(APIView):
         # get the base template
         template = get_object_or_404(Template, pk=self.kwargs.get('template_id'))
 
-        # generate a Q expression from the given query rules
-        _q = self.parse_group(query)
-
         # get all the forms that match the given rules
-        _forms = template.forms.filter(_q).distinct()
+        _forms = filter_forms(template, query)
+        _form_pks = _forms.values('pk')
 
         # data of the individual elements of the filtered forms
         _elements_data = []
@@ -375,18 +557,21 @@ class FormFilterView(APIView):
         # element data of a specific form (temp)
         _one_form_element_data = {}
 
-        for form in _forms:
+        _forms = list(_forms)
 
-            # get all form answers
-            answers = get_related_attrs(form, base_name="answers")
+        # answers of all the forms with one query over the element tables,
+        # the answers documents of the forms are already loaded with the document storage
+        answers = {}
+        if not is_document_storage():
+            # a subquery, a list of pks runs into the bind parameter limit of sqlite with a few thousand forms
+            for row in all_elements.filter(form_id__in=_form_pks).with_values():
+                answers.setdefault(row.form_id, {})[(row.type, row.answer_of_id)] = row.answer_value
 
-            for answer in answers:
+        for form in _forms:
 
-                # todo: only serialize the answer object if it's requested
-                answer_data = get_retrieve_serializer(answer.type, simple=True)(instance=answer).data
-                _one_form_element_data['%s_%d' % (answer.type,
-                                                  answer.answer_of.pk)] = \
-                    answer_data[answer.value_field]
+            form_answers = get_form_answers(form) if is_document_storage() else answers.get(form.pk, {})
+            for (element_type, element_pk), value in form_answers.items():
+                _one_form_element_data['%s_%d' % (element_type, element_pk)] = value
 
             # include the form description
             _one_form_element_data['description'] = form.description
@@ -399,6 +584,97 @@ class FormFilterView(APIView):
         return Response(self.get_queryset())
 
 
+class FormExportXlsxView(APIView):
+    """Export the forms matching the given query as an xlsx file,
+    one row per form and one column per requested element"""
+    permission_classes = [IsLoggedIn, ]
+
+    serializer_class = FormFilterSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        template = get_object_or_404(Template, pk=self.kwargs.get('template_id'))
+
+        _forms = filter_forms(template, serializer.validated_data.get('query'))
+        export_elements = get_export_elements(template, serializer.validated_data.get('elements'))
+
+        # the workbook is written to a temp file on disk, it's removed once the response is closed
+        _file = tempfile.TemporaryFile()
+        write_xlsx(_file, get_export_header(export_elements), iter_export_rows(_forms, export_elements))
+        _file.seek(0)
+
+        return FileResponse(_file, as_attachment=True, filename="template_%d.xlsx" % template.pk)
+
+
+class FormExportCsvView(APIView):
+    """Stream the forms of a template as csv,
+    GET exports all forms, POST exports the forms matching the given query"""
+    permission_classes = [IsLoggedIn, ]
+
+    serializer_class = FormFilterSerializer
+
+    def get(self, request, *args, **kwargs):
+        template = get_object_or_404(Template, pk=self.kwargs.get('template_id'))
+        return self.stream(template, template.forms.all(), get_export_elements(template))
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        template = get_object_or_404(Template, pk=self.kwargs.get('template_id'))
+
+        _forms = filter_forms(template, serializer.validated_data.get('query'))
+        export_elements = get_export_elements(template, serializer.validated_data.get('elements'))
+
+        return self.stream(template, _forms, export_elements)
+
+    @staticmethod
+    def stream(template, forms, export_elements):
+        # rows are produced while the response is being sent
+        response = StreamingHttpResponse(iter_csv(get_export_header(export_elements),
+                                                  iter_export_rows(forms, export_elements)),
+                                         content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="template_%d.csv"' % template.pk
+        return response
+
+
+class TemplateStatisticsView(APIView):
+    """Aggregate statistics of the answers of each template element,
+    GET uses all forms, POST restricts the forms with the given filter query"""
+    permission_classes = [IsLoggedIn, ]
+
+    serializer_class = StatisticsFilterSerializer
+
+    def get(self, request, *args, **kwargs):
+        template = get_object_or_404(Template, pk=self.kwargs.get('template_id'))
+        return Response(get_template_statistics(get_template_elements(template),
+                                                bucket=request.query_params.get('bucket', 'month')))
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        template = get_object_or_404(Template, pk=self.kwargs.get('template_id'))
+
+        _forms = filter_forms(template, serializer.validated_data.get('query'))
+        _elements = get_export_elements(template, serializer.validated_data.get('elements'))
+
+        return Response(get_template_statistics(_elements, _forms,
+                                                bucket=request.query_params.get('bucket', 'month')))
+
+
+class TemplateStatisticsSummaryView(APIView):
+    """Answer counts of option elements and running totals of numeric elements,
+    read from the incrementally maintained counters"""
+    permission_classes = [IsLoggedIn, ]
+
+    def get(self, request, *args, **kwargs):
+        template = get_object_or_404(Template, pk=self.kwargs.get('template_id'))
+        return Response(get_template_counter_summary(template, get_template_elements(template)))
+
+
 class SetElementOrders(UpdateAPIView):
     """
         Receives a json array of elements and sets their orders
@@ -463,3 +739,22 @@ class ElementTypesList(APIView):
     @staticmethod
     def get(request, *args, **kwargs):
         return Response(element_types)
+
+
+class ElementTypesMetadata(APIView):
+    """
+    Filters, value field and multi valued flag of every element type,
+    element payloads only carry their type and refer to this list
+    """
+
+    @staticmethod
+    def get(request, *args, **kwargs):
+        etag = get_element_types_version_tag()
+
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        response = Response(get_element_types_metadata())
+        response['ETag'] = etag
+        return response
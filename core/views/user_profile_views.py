@@ -1,4 +1,5 @@
 from django.db.models import Q
+from rest_framework.authtoken.models import Token
 from rest_framework.generics import CreateAPIView, RetrieveUpdateDestroyAPIView, ListAPIView, GenericAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -44,7 +45,8 @@ class UserProfileList(ListAPIView):
     serializer_class = UserProfileCreateSerializer
 
     def get_queryset(self):
-        return UserProfile.objects.filter(~Q(user=self.request.user)).order_by('-id')
+        return UserProfile.objects.filter(~Q(user=self.request.user)) \
+            .select_related('user', 'user__auth_token').order_by('-id')
 
 
 class AuthToken(GenericAPIView):
@@ -56,10 +58,14 @@ class AuthToken(GenericAPIView):
         password = request.data.get('password')
 
         try:
-            user_profile = UserProfile.objects.get(user__username=username)
+            user_profile = UserProfile.objects.select_related('user', 'user__auth_token').get(user__username=username)
 
             if user_profile.user.check_password(password):
 
+                # users created before tokens were issued on creation get their token on login
+                if user_profile.token is None:
+                    Token.objects.create(user=user_profile.user)
+
                 return Response(UserProfileCreateSerializer(instance=user_profile).data)
 
             raise UserProfile.DoesNotExist
@@ -51,6 +51,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.CacheCoherenceMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -120,10 +121,39 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 CORS_ORIGIN_ALLOW_ALL = True
 
 
+# the profile backend comes first, sessions created with the default backend keep working
+AUTHENTICATION_BACKENDS = [
+    'core.backends.UserProfileModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'core.authentication.CachedTokenAuthentication',
+        'core.authentication.CachedBasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
 }
+
+# process local caches check the cache version table at most once per interval
+CACHE_COHERENCE_POLL_INTERVAL_MS = 1000
+
+# seconds an authenticated token is served from the process local cache
+AUTH_TOKEN_CACHE_TTL = 60
+
+# seconds a verified basic auth username and password pair is remembered
+AUTH_BASIC_CACHE_TTL = 60
+
+# layout elements are read from, "tables" (one table per element type) or "single_table",
+# run "manage.py migrate_element_storage" after switching to "single_table"
+ELEMENT_STORAGE = "tables"
+
+# where answers are read from, "rows" (one element row per answer) or "document"
+# (the answers json of the form, written through on every answer change),
+# run "manage.py build_answer_documents" after switching to "document"
+ANSWER_STORAGE = "rows"
+
+# seconds a running export job may go without a worker heartbeat before it is requeued,
+# a job is failed after EXPORT_JOB_MAX_ATTEMPTS claims
+EXPORT_JOB_TIMEOUT = 600
+EXPORT_JOB_MAX_ATTEMPTS = 3